@@ -1,8 +1,7 @@
 import os
 import sys
 
-from arcade import SpriteList, Window, close_window, get_fps, run
-from pymunk import Space
+from arcade import SpriteList, Window, close_window, run
 
 current = os.path.dirname(os.path.realpath(__file__))
 parent = os.path.dirname(current)
@@ -11,36 +10,72 @@ sys.path.append(parent)
 
 from color import GRASS
 from constants import *
-from key import Q
-from widgets import Container, Label
+from key import F3, Q
+from widgets import Label, container
 
-from units import Unit
+from corpses import CorpseLayer
+from profiler import FrameProfiler, ProfilerOverlay
+from replay import record
+from simulation import BattleSimulation
+from tracer import Tracer
 
 
 class Battlefield(Window):
 
-    def __init__(self):
+    def __init__(self, replay=None, trace=None):
+        """Open the battlefield.
+
+        replay - file the seed and commands of the battle are recorded to
+                 when the window closes, to replay it with replay.py
+        trace - file the latest spans of the battle are written to as trace
+                events when the window closes. Nothing is traced if None.
+
+        parameters: str, str
+        """
+
         Window.__init__(self, WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_TITLE,
                         resizable=True, style=Window.WINDOW_STYLE_DIALOG)
 
-        self.player_list = SpriteList()
-        self.enemy_list = SpriteList()
-        self.projectile_list = SpriteList()
-        self.dead_list = SpriteList(use_spatial_hash=True)
+        # The battle itself runs headless; the window only draws it
+        self.simulation = BattleSimulation(self.width, self.height)
 
-        self.units = []
-        self.images = SpriteList(use_spatial_hash=True)
+        self.replay = replay
+        self.log = record(self.simulation)
+
+        self.player_list = self.simulation.player_list
+        self.enemy_list = self.simulation.enemy_list
+        self.projectile_list = self.simulation.projectile_list
+        self.dead_list = self.simulation.dead_list
+
+        self.corpses = CorpseLayer(self.simulation.width,
+                                   self.simulation.height)
 
-        self.space = Space()
+        self.units = self.simulation.units
 
-        self.player_unit = Unit(player_formation, PLAYER, self.width / 2, 200)
-        self.enemy_unit = Unit(enemy_formation, ENEMY, self.width / 2, 500)
+        # Times every phase of every frame, shown by the overlay on F3
+        self.profiler = FrameProfiler(self.simulation.step)
+        self.simulation.profilers.append(self.profiler)
+
+        self.trace = trace
+        self.tracer = None
+
+        if trace:
+            self.tracer = Tracer(self.simulation)
+            self.simulation.profilers.append(self.tracer)
+            self.simulation.tracers.append(self.tracer)
+
+        self.images = SpriteList(use_spatial_hash=True)
+
+        for unit in self.units:
+            self.push_handlers(unit.on_mouse_press)
 
-        self.current_unit = self.player_unit
+        # Widgets add themselves to the container, which needs the window
+        container.window = self
 
-        self.container = Container()
+        self.container = container
 
         self.fps = Label("", 50, 50, command=close_window)
+        self.tally = Label("", 50, 70)
 
         # self.unit_frame = Frame(self.width - UNIT_FRAME_WIDTH / 2, self.height,
         #                         UNIT_FRAME_WIDTH, UNIT_FRAME_HEIGHT, TOP)
@@ -49,91 +84,107 @@ class Battlefield(Window):
         self.unit_organize_volley = Label("Organize volley", 10, 40,
                                           command=self.command, parameters=["volley"])
 
-        self.container.append(self.fps)
-        self.container.append(self.unit_organize_volley)
+        self.unit_organize_volley.bind(Q)
 
-        self.arrow_soldier_collisions = self.space.add_collision_handler(1, 2)
+        self.overlay = ProfilerOverlay(self.profiler, 10, self.height - 20)
+
+        self.show_profiler = Label("Profiler", 10, 20,
+                                   command=self.overlay.toggle)
+
+        self.show_profiler.bind(F3)
 
-        self.unit_organize_volley.bind(Q)
         self.background_color = GRASS
         self.frames = 0
 
+        self.alpha = 0 # Fraction of a tick drawn between ticks
+
     def command(self, attack):
-        if attack == "volley":
-            self.current_unit.on_volley()
+        self.simulation.command(attack)
+
+    def on_draw(self):
+        span = self.simulation.span
 
-    def on_arrow_soldier_collision(self, arbiter, space, data):
-        # print(arbiter.shapes)
-        # print(arbiter.shapes[1].object)
+        with span("draw"):
+            self.clear()
 
-        soldier = arbiter.shapes[0].object
-        arrow = arbiter.shapes[1].object
+            self.simulation.interpolate(self.alpha)
 
-        if arrow.shooter.allegiance == PLAYER and \
-                soldier.allegiance == ENEMY:
+            # New corpses are baked once, then drawn with the rest in one quad
+            with span("draw corpses"):
+                self.corpses.bake(self.dead_list)
+                self.dead_list.clear()
 
-            damage = abs(max(arrow.force)) / ARROW_DAMAGE_LOSS
-            if not damage:
-                damage = 1  # Even slow arrows cause damage
+                self.corpses.draw()
 
-            soldier.wound(damage * ARROW_DAMAGE)
+            # for image in self.images:
+            #     create_image(*image)
 
-            # if soldier.health:
-            #     arrow = PhysicsObject(
-            #         projectile["arrow"],
-            #         0.7
-            #     )
+            with span("draw players"):
+                self.player_list.draw()
 
-            #     arrow.x, arrow.y = self.x, self.y
-            #     arrow.angle = self.angle
+            with span("draw enemies"):
+                self.enemy_list.draw()
 
-            arrow.remove()
+            with span("draw projectiles"):
+                self.projectile_list.draw()
 
-        if arrow.shooter.allegiance == ENEMY and \
-                soldier.allegiance == PLAYER:
-            damage = abs(max(arrow.force)) / ARROW_DAMAGE_LOSS
-            if not damage:
-                damage = 1  # Even slow arrows cause damage
+            # print(len(self.player_list) + len(self.enemy_list))
+            self.fps.text = f"{int(self.profiler.fps)} fps"
 
-            soldier.wound(damage * ARROW_DAMAGE)
+            player = self.simulation.roster.side(PLAYER)
+            enemy = self.simulation.roster.side(ENEMY)
 
-            arrow.remove()
+            self.tally.text = (f"{player.alive} ({player.wounded} wounded) vs "
+                               f"{enemy.alive} ({enemy.wounded} wounded)")
 
-        return True
+            with span("draw units"):
+                for unit in self.units:
+                    unit.draw()
 
-    def on_draw(self):
-        self.clear()
+            with span("draw widgets"):
+                self.overlay.update()
 
-        self.arrow_soldier_collisions.pre_solve = self.on_arrow_soldier_collision
+                self.container.draw()
 
-        # for image in self.images:
-        #     create_image(*image)
+        self.profiler.end_frame()
 
-        self.player_list.draw()
-        self.enemy_list.draw()
-        self.projectile_list.draw()
-        self.dead_list.draw()
-        # print(len(self.player_list) + len(self.enemy_list))
-        self.fps.text = f"{int(get_fps())} fps"
+    def dispatch_event(self, event_type, *arguments):
+        """Dispatch an event to the window and every widget, in a span named
+        after the event if the battle is traced. Drawing and updating have
+        spans of their own, and events dispatched while the window is created
+        come before the simulation.
+        """
 
-        self.container.draw()
+        if event_type in ("on_draw", "on_update") or \
+           "simulation" not in self.__dict__:
+            return Window.dispatch_event(self, event_type, *arguments)
 
-        for unit in self.units:
-            unit.draw()
+        with self.simulation.detail(event_type):
+            return Window.dispatch_event(self, event_type, *arguments)
+
+    def on_close(self):
+        if self.replay:
+            self.log.save(self.replay, self.simulation)
+
+        if self.tracer:
+            self.tracer.close()
+            self.tracer.save(self.trace)
+
+        Window.on_close(self)
 
     def on_update(self, delta):
-        self.player_list.update()
-        self.enemy_list.update()
-        self.projectile_list.update()
+        with self.simulation.span("update"):
+            self.simulation.volleys.adapt(delta)
 
-        self.space.step(1 / 60.0)
+            self.alpha = self.simulation.advance(delta)
 
         # for sprite in self.player_list:
         #     check_for_collision_with_list(sprite, self.enemy_list)
 
 
 if __name__ == "__main__":
-    battlefield = Battlefield()
+    # python __init__.py battle.replay battle.trace.json records the battle
+    # and traces it
+    battlefield = Battlefield(*sys.argv[1:3])
 
-    from pyglet.app import run
-    run(1/1200)
+    run()
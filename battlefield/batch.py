@@ -0,0 +1,222 @@
+"""Batch runner for tuning formations. Many headless battles are fought in
+parallel worker processes, each with its own seed and pair of formations, and
+their outcomes are gathered into a single table.
+
+Run it from the command line:
+
+    python batch.py --battles 100 --ticks 3600 --output results.csv
+
+Formation variants can be given as a JSON file mapping a name to a player and
+an enemy formation. Every variant is fought with every seed.
+
+    {"wide": {"player": [[3, 3, 3, 3], [1, 1, 1, 1]],
+              "enemy": [[1, 1], [1, 1], [3, 3]]}}
+
+Every formation needs at least two ranks, as a unit is as wide as its second
+rank.
+
+Or from Python:
+
+>>> results = run_batch(range(8), workers=4)
+>>> print(format_table(results))
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from csv import DictWriter
+from json import load
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(current)
+sys.path.append(parent)
+
+from constants import ENEMY, PLAYER, enemy_formation, player_formation
+
+BATCH_TICKS = 3600 # Longest a battle is fought for, one minute of battle time
+
+# Columns of the result table
+FIELDS = ("variant", "seed", "winner", "ticks", "player_casualties",
+          "enemy_casualties", "player_arrows", "enemy_arrows")
+
+
+def run_battle(seed, player=player_formation, enemy=enemy_formation,
+               ticks=BATCH_TICKS, variant="default", volley=0):
+    """Fight a single headless battle and get its outcome. This is the work
+    done by each worker process.
+
+    seed - seed of the battle
+    player - formation of the player army
+    enemy - formation of the enemy army
+    ticks - longest the battle is fought for
+    variant - name of the pair of formations, copied into the result
+    volley - ticks between volleys of every unit. If 0, soldiers only fire
+             at will.
+
+    parameters: int, list, list, int, str, int
+    returns: dict (a row of the result table)
+    """
+
+    # Imported here so the workers load the simulation themselves
+    from simulation import BattleSimulation
+
+    simulation = BattleSimulation(player=player, enemy=enemy, seed=seed)
+
+    while not simulation.finished and simulation.ticks < ticks:
+        if volley and not simulation.ticks % volley:
+            for unit in simulation.units:
+                unit.on_volley()
+
+        simulation.tick()
+
+    roster = simulation.roster
+
+    return {
+        "variant" : variant,
+        "seed" : seed,
+        "winner" : simulation.winner,
+        "ticks" : simulation.ticks,
+        "player_casualties" : roster.side(PLAYER).dead,
+        "enemy_casualties" : roster.side(ENEMY).dead,
+        "player_arrows" : roster.side(PLAYER).fired,
+        "enemy_arrows" : roster.side(ENEMY).fired,
+    }
+
+def run_batch(seeds, variants=None, ticks=BATCH_TICKS, workers=None,
+              volley=0):
+    """Fight a battle for every seed and formation variant across a pool of
+    worker processes.
+
+    seeds - seeds of the battles
+    variants - dictionary of names to (player, enemy) formation pairs. If
+               None, only the formations in constants are fought.
+    ticks - longest each battle is fought for
+    workers - number of worker processes. If None, one per CPU is used.
+    volley - ticks between volleys of every unit. If 0, soldiers only fire
+             at will.
+
+    parameters: iterable, dict, int, int, int
+    returns: list (rows of the result table, in order of variant then seed)
+    """
+
+    if variants is None:
+        variants = {"default" : (player_formation, enemy_formation)}
+
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(run_battle, seed, player, enemy, ticks,
+                                   name, volley)
+                   for name, (player, enemy) in variants.items()
+                   for seed in seeds]
+
+        return [future.result() for future in futures]
+
+def load_variants(path):
+    """Load formation variants from a JSON file. Every formation must have
+    at least two ranks.
+
+    path - path of the file
+
+    parameters: str
+    returns: dict (names to (player, enemy) formation pairs)
+    """
+
+    with open(path) as file:
+        variants = load(file)
+
+    for name, variant in variants.items():
+        for side in ("player", "enemy"):
+            if len(variant[side]) < 2:
+                raise ValueError(f"The {side} formation of variant "
+                                 f"\"{name}\" has {len(variant[side])} "
+                                 "ranks, but needs at least two")
+
+    return {name : (variant["player"], variant["enemy"])
+            for name, variant in variants.items()}
+
+def format_table(results):
+    """Format the result table as aligned text, followed by the share of
+    battles won by each side per variant.
+
+    results - rows of the result table
+
+    parameters: list
+    returns: str
+    """
+
+    rows = [FIELDS] + [tuple(str(result[field]) for field in FIELDS)
+                       for result in results]
+
+    widths = [max(len(row[column]) for row in rows)
+              for column in range(len(FIELDS))]
+
+    lines = ["  ".join(value.ljust(width) for value, width in zip(row, widths))
+             for row in rows]
+
+    for variant in dict.fromkeys(result["variant"] for result in results):
+        battles = [result for result in results
+                   if result["variant"] == variant]
+
+        wins = {side : sum(result["winner"] == side for result in battles)
+                for side in (PLAYER, ENEMY, None)}
+
+        lines.append(f"{variant}: {len(battles)} battles, "
+                     f"{wins[PLAYER]} won by {PLAYER}, "
+                     f"{wins[ENEMY]} won by {ENEMY}, {wins[None]} undecided")
+
+    return "\n".join(lines)
+
+def main(arguments=None):
+    """Run a batch from the command line.
+
+    arguments - command line arguments. If None, sys.argv is used.
+
+    parameters: list
+    """
+
+    parser = ArgumentParser(description="Fight many headless battles in "
+                                        "parallel and tabulate the outcomes.")
+
+    parser.add_argument("--battles", type=int, default=10,
+                        help="battles fought per variant")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the first battle; the rest count up")
+    parser.add_argument("--ticks", type=int, default=BATCH_TICKS,
+                        help="longest a battle is fought for")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, one per CPU by default")
+    parser.add_argument("--volley", type=int, default=0,
+                        help="ticks between volleys of every unit")
+    parser.add_argument("--variants", default=None,
+                        help="JSON file of formation variants")
+    parser.add_argument("--output", default=None,
+                        help="CSV file to write the results to")
+
+    arguments = parser.parse_args(arguments)
+
+    variants = None
+
+    if arguments.variants:
+        try:
+            variants = load_variants(arguments.variants)
+        except ValueError as error:
+            parser.error(str(error))
+
+    seeds = range(arguments.seed, arguments.seed + arguments.battles)
+
+    results = run_batch(seeds, variants, arguments.ticks, arguments.workers,
+                        arguments.volley)
+
+    print(format_table(results))
+
+    if arguments.output:
+        with open(arguments.output, "w", newline="") as file:
+            writer = DictWriter(file, FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""Benchmark suite for the battle simulation. Scripted battles are fought at
+sizes from a thousand to fifty thousand soldiers, with armies of archers, of
+infantry or of both, and each one is timed tick by tick. Every scenario runs
+in a fresh process so memory measurements do not leak between them.
+
+The results are written as JSON, with the commit they were measured at, so
+two runs can be compared to catch regressions in the simulation:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+Drawing is timed as well with --draw, which needs OpenGL. Pass --headless
+too on machines without a display.
+
+Or from Python:
+
+>>> result = run_scenario(10000, "mixed", ticks=120)
+>>> result["ticks_per_second"]
+41.7
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from gc import collect
+from json import dump, load
+from math import ceil
+from platform import platform, python_version
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(current)
+sys.path.append(parent)
+
+from benchmarking import get_commit, percentile
+from constants import (ARCHER, ARROW_POOL_SIZE, HEAVY_INFANTRY,
+                       LIGHT_INFANTRY, SOLDIER_SPACING, WINDOW_HEIGHT,
+                       WINDOW_WIDTH)
+
+BENCHMARK_SIZES = (1000, 5000, 10000, 25000, 50000) # Soldiers in a battle
+BENCHMARK_TICKS = 120 # Ticks timed in each scenario
+BENCHMARK_WARMUP = 30 # Ticks run before timing starts
+BENCHMARK_VOLLEY = 60 # Ticks between the scripted volleys of every unit
+BENCHMARK_SEED = 1
+BENCHMARK_PRIMER = 100 # Soldiers in the battle fought before measuring memory
+
+# Most ranks in a benchmark army, so both fit between their starting lines
+BENCHMARK_RANKS = 25
+
+# Share of each army that are archers, by mix
+MIXES = {
+    "archers" : 1,
+    "mixed" : 0.5,
+    "infantry" : 0,
+}
+
+# Spans reported per scenario, named as in BattleSimulation.tick
+PHASES = ("index", "soldiers", "bury", "volleys", "projectiles", "units",
+          "flush", "physics", "collisions", "draw")
+
+# Metrics compared between runs, all of which are worse when higher
+COMPARED = ("tick_p50", "tick_p99", "bytes_per_soldier")
+
+REGRESSION_THRESHOLD = 0.1 # Relative slowdown reported as a regression
+
+# Most memory a soldier may take at the peak of its battle, counting what is
+# allocated while it is fought, like arrows, pools and the rival index. Space
+# for soldiers that grows faster than their number shows up here first.
+BENCHMARK_BYTES_PER_SOLDIER = 16384
+
+
+def make_formation(soldiers, mix, front_first=True):
+    """Make the formation of a benchmark army. Archers stand in the rear
+    ranks behind the infantry, like in the default enemy formation, and the
+    infantry ranks take turns of heavy and light infantry from the front.
+
+    soldiers - number of soldiers in the army
+    mix - name of the share of archers, a key of MIXES
+    front_first - whether the first rank faces the enemy, as for an army at
+                  the bottom of the battlefield
+
+    parameters: int, str, bool
+    returns: list
+    """
+
+    ranks = max(min(BENCHMARK_RANKS, soldiers), 2)
+    columns = ceil(soldiers / ranks)
+
+    archers = round(ranks * MIXES[mix])
+
+    formation = []
+
+    for rank in range(ranks):
+        if rank >= ranks - archers:
+            kind = ARCHER
+        else:
+            kind = LIGHT_INFANTRY if rank % 2 else HEAVY_INFANTRY
+
+        count = min(columns, soldiers - columns * rank)
+
+        formation.append([kind] * max(count, 0))
+
+    # Trailing ranks may come out empty when the army does not divide evenly
+    while not formation[-1] and len(formation) > 2:
+        formation.pop()
+
+    if not front_first:
+        formation.reverse()
+
+    return formation
+
+def make_armies(soldiers, mix):
+    """Make the formations of both armies of a benchmark battle, and the
+    width of a battlefield they fit in.
+
+    soldiers - number of soldiers in the battle, split evenly between sides
+    mix - name of the share of archers, a key of MIXES
+
+    parameters: int, str
+    returns: tuple (player formation, enemy formation, width)
+    """
+
+    player = make_formation(soldiers // 2, mix)
+    enemy = make_formation(soldiers - soldiers // 2, mix, front_first=False)
+
+    columns = max(len(rank) for rank in player + enemy)
+
+    width = max(WINDOW_WIDTH, (columns + 10) * SOLDIER_SPACING)
+
+    return player, enemy, width
+
+def get_memory():
+    """Get the memory in use by this process.
+
+    returns: int (bytes)
+    """
+
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # Only the peak is known here, which is still right for a fresh
+        # process that only grows
+        from resource import RUSAGE_SELF, getrusage
+
+        peak = getrusage(RUSAGE_SELF).ru_maxrss
+
+        return peak if sys.platform == "darwin" else peak * 1024
+
+def prime(mix, seed=BENCHMARK_SEED):
+    """Fight a small battle through a volley, so the modules and caches a
+    battle loads the first time it runs are in memory before another one is
+    measured. They cost the same however many soldiers fight, so they are
+    not counted against the soldiers of a scenario. The battle keeps no
+    pooled arrows, which the scenario would otherwise reuse.
+
+    mix - name of the share of archers, a key of MIXES
+    seed - seed of the battle
+
+    parameters: str, int
+    """
+
+    from simulation import BattleSimulation
+
+    player, enemy, width = make_armies(BENCHMARK_PRIMER, mix)
+
+    simulation = BattleSimulation(width, WINDOW_HEIGHT, player, enemy,
+                                  seed=seed, arrow_pool=0)
+
+    for unit in simulation.units:
+        unit.on_volley()
+
+    simulation.run(BENCHMARK_VOLLEY)
+
+    # Soldiers and their simulation refer to each other
+    del simulation
+    collect()
+
+def run_scenario(soldiers, mix, ticks=BENCHMARK_TICKS,
+                 warmup=BENCHMARK_WARMUP, draw=False, headless=False,
+                 seed=BENCHMARK_SEED, arrow_pool=ARROW_POOL_SIZE):
+    """Fight a scripted battle and time it. This is the work done by the
+    process of each scenario.
+
+    soldiers - number of soldiers in the battle, split evenly between sides
+    mix - name of the share of archers, a key of MIXES
+    ticks - number of ticks timed
+    warmup - number of ticks run before timing starts
+    draw - also draw the battlefield to a hidden window after every tick
+    headless - draw without a display, through EGL
+    seed - seed of the battle
+    arrow_pool - number of idle arrows the battle keeps for reuse
+
+    parameters: int, str, int, int, bool, bool, int, int
+    returns: dict
+    """
+
+    if headless:
+        import pyglet
+
+        pyglet.options["headless"] = True
+
+    # Imported here so every scenario loads the simulation itself
+    import arcade
+
+    from simulation import BattleSimulation
+    from spans import PhaseTimes
+
+    player, enemy, width = make_armies(soldiers, mix)
+    height = WINDOW_HEIGHT
+
+    window = None
+    corpses = None
+
+    if draw:
+        from corpses import CorpseLayer
+
+        window = arcade.Window(width, height, visible=False)
+        corpses = CorpseLayer(width, height)
+
+    prime(mix, seed)
+
+    start = get_memory()
+
+    simulation = BattleSimulation(width, height, player, enemy, seed=seed,
+                                  arrow_pool=arrow_pool)
+
+    deployed = peak = get_memory() - start
+
+    if draw:
+        for sprite_list in (simulation.player_list, simulation.enemy_list,
+                            simulation.projectile_list):
+            sprite_list.initialize()
+
+    times = PhaseTimes()
+
+    for tick in range(warmup + ticks):
+        # Sampled between ticks, so reading it is never timed
+        peak = max(peak, get_memory() - start)
+
+        if tick == warmup:
+            simulation.profilers.append(times)
+
+        if not simulation.ticks % BENCHMARK_VOLLEY:
+            for unit in simulation.units:
+                unit.on_volley()
+
+        simulation.tick()
+
+        if draw:
+            with simulation.span("draw"):
+                corpses.bake(simulation.dead_list)
+                simulation.dead_list.clear()
+
+                window.clear()
+
+                corpses.draw()
+
+                simulation.player_list.draw()
+                simulation.enemy_list.draw()
+                simulation.projectile_list.draw()
+
+                for unit in simulation.units:
+                    unit.draw()
+
+                # Wait for the GPU so the span covers the drawing itself
+                window.ctx.finish()
+
+    peak = max(peak, get_memory() - start)
+
+    if window:
+        window.close()
+
+    durations = sorted(times.durations.get("tick", []))
+
+    if draw:
+        durations = sorted(tick + frame for tick, frame in
+                           zip(times.durations["tick"],
+                               times.durations["draw"]))
+
+    total = sum(durations)
+
+    return {
+        "soldiers" : simulation.store.count,
+        "mix" : mix,
+        "ticks" : len(durations),
+        "ticks_per_second" : len(durations) / total if total else 0,
+        "tick_mean" : total / len(durations) if durations else 0,
+        "tick_p50" : percentile(durations, 0.5),
+        "tick_p99" : percentile(durations, 0.99),
+        "bytes_per_soldier" : peak / max(simulation.store.count, 1),
+        "deployed_bytes_per_soldier" : deployed / max(simulation.store.count,
+                                                      1),
+        "arrows" : simulation.arrows.peak,
+        "arrow_misses" : simulation.arrows.misses,
+        "phases" : {phase : times.mean(phase) for phase in PHASES
+                    if phase in times.durations},
+    }
+
+def run_suite(sizes=BENCHMARK_SIZES, mixes=tuple(MIXES),
+              ticks=BENCHMARK_TICKS, warmup=BENCHMARK_WARMUP, draw=False,
+              headless=False, arrow_pool=ARROW_POOL_SIZE, report=None):
+    """Run every scenario, one at a time, each in a process of its own.
+
+    sizes - numbers of soldiers to fight at
+    mixes - names of the shares of archers to fight with
+    ticks - number of ticks timed in each scenario
+    warmup - number of ticks run before timing starts
+    draw - also time drawing the battlefield
+    headless - draw without a display
+    arrow_pool - number of idle arrows each battle keeps for reuse
+    report - called with the result of each scenario as it finishes
+
+    parameters: iterable, iterable, int, int, bool, bool, int, function
+    returns: dict (the metadata of the run and its scenarios)
+    """
+
+    results = []
+
+    for soldiers in sizes:
+        for mix in mixes:
+            # A new process per scenario keeps its memory measurement clean
+            with ProcessPoolExecutor(1) as executor:
+                result = executor.submit(run_scenario, soldiers, mix, ticks,
+                                         warmup, draw, headless,
+                                         arrow_pool=arrow_pool).result()
+
+            results.append(result)
+
+            if report:
+                report(result)
+
+    return {
+        "commit" : get_commit(),
+        "date" : datetime.now(timezone.utc).isoformat(),
+        "python" : python_version(),
+        "platform" : platform(),
+        "cpus" : os.cpu_count(),
+        "ticks" : ticks,
+        "warmup" : warmup,
+        "arrow_pool" : arrow_pool,
+        "scenarios" : results,
+    }
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Find the scenarios that got slower or bigger since a baseline run.
+
+    results - results of this run
+    baseline - results of an earlier run
+    threshold - relative increase reported as a regression
+
+    parameters: dict, dict, float
+    returns: list (of (soldiers, mix, metric, before, after) tuples)
+    """
+
+    before = {(scenario["soldiers"], scenario["mix"]) : scenario
+              for scenario in baseline["scenarios"]}
+
+    regressions = []
+
+    for scenario in results["scenarios"]:
+        old = before.get((scenario["soldiers"], scenario["mix"]))
+
+        if not old:
+            continue
+
+        for metric in COMPARED:
+            if old[metric] and \
+               scenario[metric] > old[metric] * (1 + threshold):
+                regressions.append((scenario["soldiers"], scenario["mix"],
+                                    metric, old[metric], scenario[metric]))
+
+    return regressions
+
+def format_scenario(result):
+    """Format the result of a scenario as a line of text.
+
+    result - result of the scenario
+
+    parameters: dict
+    returns: str
+    """
+
+    phases = " ".join(f"{phase} {time * 1000:.2f}"
+                      for phase, time in result["phases"].items())
+
+    return (f"{result['soldiers']:>6} {result['mix']:<8} "
+            f"{result['ticks_per_second']:8.1f} ticks/s "
+            f"p50 {result['tick_p50'] * 1000:7.2f} ms "
+            f"p99 {result['tick_p99'] * 1000:7.2f} ms "
+            f"{result['bytes_per_soldier']:8.0f} B/soldier "
+            f"{result['arrow_misses']:5} misses | {phases}")
+
+def main(arguments=None):
+    """Run the benchmark suite from the command line.
+
+    arguments - command line arguments. If None, sys.argv is used.
+
+    parameters: list
+    returns: bool (whether no regressions were found and every scenario
+                   kept within the memory budget)
+    """
+
+    parser = ArgumentParser(description="Benchmark the battle simulation.")
+
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=BENCHMARK_SIZES,
+                        help="numbers of soldiers to fight at")
+    parser.add_argument("--mixes", nargs="+", default=tuple(MIXES),
+                        choices=tuple(MIXES), help="armies to fight with")
+    parser.add_argument("--ticks", type=int, default=BENCHMARK_TICKS,
+                        help="ticks timed in each scenario")
+    parser.add_argument("--warmup", type=int, default=BENCHMARK_WARMUP,
+                        help="ticks run before timing starts")
+    parser.add_argument("--draw", action="store_true",
+                        help="also time drawing to a hidden window")
+    parser.add_argument("--headless", action="store_true",
+                        help="draw without a display")
+    parser.add_argument("--output", default=None,
+                        help="JSON file to write the results to")
+    parser.add_argument("--compare", default=None,
+                        help="JSON results of an earlier run to compare to")
+    parser.add_argument("--threshold", type=float,
+                        default=REGRESSION_THRESHOLD,
+                        help="relative slowdown reported as a regression")
+    parser.add_argument("--arrow-pool", type=int, default=ARROW_POOL_SIZE,
+                        help="idle arrows each battle keeps for reuse")
+    parser.add_argument("--memory-budget", type=float,
+                        default=BENCHMARK_BYTES_PER_SOLDIER,
+                        help="most bytes a soldier may take")
+
+    arguments = parser.parse_args(arguments)
+
+    print("misses are arrows created past the pool, phases are in ms per tick")
+
+    results = run_suite(arguments.sizes, arguments.mixes, arguments.ticks,
+                        arguments.warmup, arguments.draw, arguments.headless,
+                        arguments.arrow_pool,
+                        report=lambda result: print(format_scenario(result)))
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            dump(results, file, indent=4)
+
+    passed = True
+
+    for result in results["scenarios"]:
+        if result["bytes_per_soldier"] > arguments.memory_budget:
+            print(f"Over memory budget: {result['soldiers']} {result['mix']} "
+                  f"{result['bytes_per_soldier']:.0f} bytes per soldier, "
+                  f"budget {arguments.memory_budget:.0f}")
+
+            passed = False
+
+    if not arguments.compare:
+        return passed
+
+    with open(arguments.compare) as file:
+        baseline = load(file)
+
+    regressions = compare(results, baseline, arguments.threshold)
+
+    for soldiers, mix, metric, before, after in regressions:
+        print(f"Regression: {soldiers} {mix} {metric} "
+              f"{before:.6g} -> {after:.6g} (+{after / before - 1:.0%})")
+
+    if not regressions:
+        print(f"No regressions against {baseline.get('commit')}")
+
+    return passed and not regressions
+
+
+if __name__ == "__main__":
+    sys.exit(not main())
@@ -0,0 +1,150 @@
+"""Baked corpse layer. Bodies are never removed from the battlefield, so
+drawing every dead soldier as a sprite each frame gets slower and uses more
+memory the longer a battle goes on. Instead, each corpse is stamped once into
+an offscreen texture the size of the battlefield, and the whole layer is drawn
+as a single textured quad, costing the same however many soldiers died.
+
+>>> corpses = CorpseLayer(WINDOW_WIDTH, WINDOW_HEIGHT)
+>>> corpses.bake(simulation.dead_list)
+>>> corpses.draw()
+"""
+
+from arcade import Sprite, SpriteList, get_window
+from arcade.gl.geometry import screen_rectangle
+
+VERTEX_SHADER = """
+#version 330
+
+uniform Projection {
+    uniform mat4 matrix;
+} proj;
+
+in vec2 in_vert;
+in vec2 in_uv;
+
+out vec2 v_uv;
+
+void main() {
+    gl_Position = proj.matrix * vec4(in_vert, 0.0, 1.0);
+    v_uv = in_uv;
+}
+"""
+
+FRAGMENT_SHADER = """
+#version 330
+
+uniform sampler2D corpses;
+
+in vec2 v_uv;
+
+out vec4 f_color;
+
+void main() {
+    f_color = texture(corpses, v_uv);
+}
+"""
+
+
+class CorpseLayer:
+    """Dead soldiers baked into a texture. Corpses are drawn into the texture
+    with bake, after which their sprites are no longer needed for drawing.
+    The layer covers the battlefield in world coordinates, so it lines up
+    with the sprites however the window is resized.
+    """
+
+    def __init__(self, width, height):
+        """Create an empty corpse layer. This needs an active window, as the
+        texture is created in its OpenGL context.
+
+        width - width of the battlefield
+        height - height of the battlefield
+
+        parameters: int, int
+        """
+
+        self.width = width
+        self.height = height
+
+        self.ctx = get_window().ctx
+
+        self.texture = self.ctx.texture((width, height), components=4)
+        self.framebuffer = self.ctx.framebuffer(
+            color_attachments=[self.texture])
+
+        self.framebuffer.clear((0, 0, 0, 0))
+
+        self.program = self.ctx.program(vertex_shader=VERTEX_SHADER,
+                                        fragment_shader=FRAGMENT_SHADER)
+        self.quad = screen_rectangle(0, 0, width, height)
+
+        # Copies of the corpses to stamp. They stay in the list between bakes
+        # and are only hidden when unused, so its buffers are not rebuilt.
+        self.stamps = SpriteList()
+        self.shown = 0 # Stamps visible since the last bake
+
+        self.count = 0 # Corpses baked so far
+
+    def bake(self, sprites):
+        """Stamp corpses into the layer. Each corpse only needs to be baked
+        once, when it dies.
+
+        sprites - corpses to stamp
+
+        parameters: list
+        """
+
+        if not sprites:
+            return
+
+        stamps = self.stamps.sprite_list
+
+        for index, sprite in enumerate(sprites):
+            if index == len(stamps):
+                self.stamps.append(Sprite(texture=sprite.texture))
+
+            stamp = stamps[index]
+
+            stamp.texture = sprite.texture
+            stamp.scale = sprite.scale
+            stamp.position = sprite.position
+            stamp.angle = sprite.angle
+            stamp.color = sprite.color
+            stamp.alpha = sprite.alpha
+
+        for stamp in stamps[len(sprites):self.shown]:
+            stamp.visible = False
+
+        self.shown = len(sprites)
+
+        # The texture matches the battlefield, not the resized window
+        projection = self.ctx.projection_2d
+        self.ctx.projection_2d = 0, self.width, 0, self.height
+
+        with self.framebuffer.activate():
+            self.stamps.draw()
+
+        self.ctx.projection_2d = projection
+
+        self.count += len(sprites)
+
+    def clear(self):
+        """Remove every corpse from the layer."""
+
+        self.framebuffer.clear((0, 0, 0, 0))
+        self.count = 0
+
+    def draw(self):
+        """Draw every baked corpse as a single quad."""
+
+        if not self.count:
+            return
+
+        self.ctx.enable(self.ctx.BLEND)
+
+        # Stamped colors are already multiplied by their alpha
+        self.ctx.blend_func = self.ctx.ONE, self.ctx.ONE_MINUS_SRC_ALPHA
+
+        self.texture.use(0)
+        self.quad.render(self.program)
+
+        self.ctx.blend_func = self.ctx.BLEND_DEFAULT
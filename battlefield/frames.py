@@ -0,0 +1,297 @@
+"""Frames of the battle shared between a simulation process and a renderer
+process. The simulation writes the transforms of every soldier and arrow into
+one of two buffers in shared memory after each tick, then marks it as the
+latest frame. The renderer copies out the latest complete frame whenever it
+draws, so slow ticks never hold up drawing and slow frames never hold up the
+battle.
+
+Each buffer has a sequence number that is odd while it is being written. A
+reader that sees it change while copying caught the writer lapping it, and
+tries again with the newer frame.
+
+>>> frames = FrameBuffer(soldiers, projectiles)
+>>> frames.publish(simulation) # In the simulation process
+>>> frame = FrameBuffer(soldiers, projectiles, frames.name).read()
+"""
+
+import os
+import sys
+from multiprocessing.shared_memory import SharedMemory
+from time import perf_counter, sleep
+
+from numpy import bool_, dtype, float32, float64, int8, int64, ndarray
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import (ARROW_POOL_SIZE, PROJECTILE_CEILING_MAXIMUM,
+                       enemy_formation, player_formation)
+
+FRAME_PROJECTILES = max(ARROW_POOL_SIZE, PROJECTILE_CEILING_MAXIMUM)
+
+# Columns of each buffer, one row per soldier
+SOLDIER_COLUMNS = (
+    ("x", float32),
+    ("y", float32),
+    ("previous_x", float32),
+    ("previous_y", float32),
+    ("side", int8),
+    ("wounded", bool_),
+    ("alive", bool_),
+)
+
+# Columns of each buffer, one row per arrow in flight
+PROJECTILE_COLUMNS = (
+    ("arrow_x", float32),
+    ("arrow_y", float32),
+    ("arrow_previous_x", float32),
+    ("arrow_previous_y", float32),
+)
+
+# Slots of the header
+LATEST = 0 # Buffer holding the latest complete frame, or -1 before the first
+SEQUENCE = 1 # Sequence number of each buffer, two slots
+
+# Slots of the details of each buffer
+TICK = 0
+SOLDIERS = 1
+PROJECTILES = 2
+TIME = 3 # When the tick finished, by perf_counter
+
+
+class Frame:
+    """A frame copied out of shared memory, owned by the reader."""
+
+    def __init__(self, details, columns):
+        """Create a frame.
+
+        details - tick, number of soldiers and arrows and time of the frame
+        columns - dictionary of column names to copied columns
+
+        parameters: ndarray, dict
+        """
+
+        self.tick = int(details[TICK])
+        self.time = float(details[TIME])
+
+        for name, column in columns.items():
+            setattr(self, name, column)
+
+    def alpha(self, step):
+        """Get how far the battle is between this frame and the next one,
+        assuming ticks keep coming on time.
+
+        step - length of a tick in seconds
+
+        parameters: float
+        returns: float
+        """
+
+        return min((perf_counter() - self.time) / step, 1)
+
+
+class FrameBuffer:
+    """Two frames of the battle in a block of shared memory. The simulation
+    process creates the block and publishes to it, and the renderer process
+    attaches to it by name and reads from it.
+    """
+
+    def __init__(self, soldiers, projectiles=FRAME_PROJECTILES, name=None):
+        """Create or attach to a frame buffer.
+
+        soldiers - most soldiers in a frame
+        projectiles - most arrows in a frame. Arrows past this are not drawn.
+        name - name of an existing block to attach to. If None, a new block
+               is created.
+
+        parameters: int, int, str
+        """
+
+        self.soldiers = soldiers
+        self.projectiles = projectiles
+
+        layout = [("header", int64, 3)]
+
+        for buffer in range(2):
+            layout.append((("details", buffer), float64, 4))
+            layout += [((column, buffer), type, soldiers)
+                       for column, type in SOLDIER_COLUMNS]
+            layout += [((column, buffer), type, projectiles)
+                       for column, type in PROJECTILE_COLUMNS]
+
+        size = sum(dtype(type).itemsize * count for key, type, count in layout)
+
+        self.memory = SharedMemory(name, create=not name, size=size)
+
+        self.arrays = {}
+
+        offset = 0
+
+        for key, type, count in layout:
+            self.arrays[key] = ndarray(count, type, self.memory.buf, offset)
+            offset += self.arrays[key].nbytes
+
+        self.header = self.arrays["header"]
+
+        if not name:
+            self.header[LATEST] = -1
+
+    def _get_name(self):
+        """Get the name of the shared memory block.
+
+        returns: str
+        """
+
+        return self.memory.name
+
+    name = property(_get_name)
+
+    def publish(self, simulation):
+        """Write the state of the battle after its last tick into the buffer
+        that is not the latest, then make it the latest.
+
+        simulation - simulation to publish
+
+        parameters: BattleSimulation
+        """
+
+        buffer = 1 if self.header[LATEST] == 0 else 0
+        arrays = self.arrays
+
+        self.header[SEQUENCE + buffer] += 1 # Odd while writing
+
+        store = simulation.store
+        soldiers = min(store.count, self.soldiers, len(simulation.previous_x))
+
+        for column, source in (("x", store.x), ("y", store.y),
+                               ("previous_x", simulation.previous_x),
+                               ("previous_y", simulation.previous_y),
+                               ("side", store.side),
+                               ("wounded", store.wounded),
+                               ("alive", store.alive)):
+            arrays[column, buffer][:soldiers] = source[:soldiers]
+
+        projectiles = simulation.projectiles
+        count = min(projectiles.count, self.projectiles)
+
+        for column, source in (("arrow_x", projectiles.x),
+                               ("arrow_y", projectiles.y),
+                               ("arrow_previous_x", projectiles.previous_x),
+                               ("arrow_previous_y", projectiles.previous_y)):
+            arrays[column, buffer][:count] = source[:count]
+
+        details = arrays["details", buffer]
+
+        details[TICK] = simulation.ticks
+        details[SOLDIERS] = soldiers
+        details[PROJECTILES] = count
+        details[TIME] = perf_counter()
+
+        self.header[SEQUENCE + buffer] += 1
+        self.header[LATEST] = buffer
+
+    def read(self):
+        """Copy out the latest complete frame.
+
+        returns: Frame or None (if nothing was published yet)
+        """
+
+        while True:
+            buffer = int(self.header[LATEST])
+
+            if buffer < 0:
+                return None
+
+            sequence = int(self.header[SEQUENCE + buffer])
+
+            if sequence % 2:
+                continue # Lapped by the writer, which has moved on
+
+            details = self.arrays["details", buffer].copy()
+
+            soldiers = int(details[SOLDIERS])
+            projectiles = int(details[PROJECTILES])
+
+            columns = {column : self.arrays[column, buffer][:soldiers].copy()
+                       for column, type in SOLDIER_COLUMNS}
+            columns.update({column :
+                            self.arrays[column, buffer][:projectiles].copy()
+                            for column, type in PROJECTILE_COLUMNS})
+
+            if self.header[SEQUENCE + buffer] == sequence:
+                return Frame(details, columns)
+
+    def close(self, unlink=False):
+        """Detach from the shared memory block.
+
+        unlink - also free the block. Only the process that created it should
+                 do this.
+
+        parameters: bool
+        """
+
+        self.arrays.clear()
+        self.header = None
+
+        self.memory.close()
+
+        if unlink:
+            self.memory.unlink()
+
+
+def simulate(connection, commands, stop, width, height,
+             player=player_formation, enemy=enemy_formation, seed=None):
+    """Run a battle in real time and publish a frame after every tick, until
+    told to stop. This is the work done by the simulation process. The volley
+    ceiling adapts to how long the ticks themselves take, as no frames are
+    drawn here.
+
+    connection - end of a pipe the size and name of the frame buffer are
+                 sent through, once the armies are deployed
+    commands - queue of commands for the battle from the renderer
+    stop - event set when the battle should stop
+    width - width of the battlefield
+    height - height of the battlefield
+    player - formation of the player army
+    enemy - formation of the enemy army
+    seed - seed of the battle
+
+    parameters: Connection, Queue, Event, int, int, list, list, int
+    """
+
+    # Imported here so the simulation is only loaded in its own process
+    from simulation import BattleSimulation
+
+    simulation = BattleSimulation(width, height, player, enemy, seed=seed)
+
+    frames = FrameBuffer(simulation.store.count)
+
+    connection.send((frames.name, frames.soldiers, frames.projectiles,
+                     simulation.step))
+    connection.close()
+
+    last = perf_counter()
+
+    while not stop.is_set():
+        while not commands.empty():
+            simulation.command(commands.get())
+
+        now = perf_counter()
+        delta = now - last
+        last = now
+
+        ticks = simulation.ticks
+
+        simulation.volleys.adapt(delta)
+        simulation.advance(delta)
+
+        if simulation.ticks != ticks:
+            frames.publish(simulation)
+
+        # Sleep until the next tick is due
+        sleep(max(simulation.step - simulation.accumulator -
+                  (perf_counter() - now), 0))
+
+    frames.close(unlink=True)
@@ -0,0 +1,250 @@
+"""Nearest-rival index. Instead of every soldier looping over the whole enemy
+army with get_closest, the index is refreshed once per tick and answers the
+nearest-enemy query for every soldier in one batched call.
+
+Rivals are bucketed into a uniform grid. Queries search rings of cells around
+their own cell, moving outwards until the closest rival found is nearer than
+anything a further ring could hold. All queries are processed together with
+NumPy, one ring at a time, so the work per tick grows with the number of
+soldiers instead of its square. Rings between a query and the cells holding
+rivals are skipped, so armies far apart cost no more than armies in contact.
+"""
+
+import os
+import sys
+from functools import lru_cache
+
+from numpy import (arange, argsort, array, bincount, concatenate, cumsum,
+                   float32, float64, full, inf, intp, maximum, minimum, repeat,
+                   sqrt, unique, zeros)
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import (ENEMY, PLAYER, RIVAL_INDEX_BRUTE_FORCE,
+                       RIVAL_INDEX_CELL_TARGETS)
+
+
+@lru_cache(maxsize=None)
+def _ring(radius):
+    """Get the cell offsets of a square ring around a cell.
+
+    radius - distance of the ring in cells. A radius of zero is the cell
+             itself.
+
+    parameters: int
+    returns: tuple (ndarray, ndarray) (x and y offsets)
+    """
+
+    if not radius:
+        return array([0]), array([0])
+
+    offsets = [(x, y)
+               for x in range(-radius, radius + 1)
+               for y in range(-radius, radius + 1)
+               if max(abs(x), abs(y)) == radius]
+
+    return array([x for x, y in offsets]), array([y for x, y in offsets])
+
+def nearest(qx, qy, tx, ty, cell_size=None):
+    """Find the nearest target of each query point using a uniform grid.
+
+    qx - x coordinates of the query points
+    qy - y coordinates of the query points
+    tx - x coordinates of the targets
+    ty - y coordinates of the targets
+    cell_size - size of a grid cell. If None, it is picked from the density
+                of the targets so a cell holds about RIVAL_INDEX_CELL_TARGETS
+                of them, which works best for both packed and scattered
+                armies. It is never smaller than the indexed area split into
+                about one cell per target.
+
+    With RIVAL_INDEX_BRUTE_FORCE targets or fewer, no grid is built and every
+    query is checked against every target.
+
+    parameters: ndarray, ndarray, ndarray, ndarray, int
+    returns: tuple (ndarray, ndarray) (index of the nearest target or -1, and
+             its distance)
+    """
+
+    count = len(qx)
+
+    found = full(count, -1, intp)
+    best = full(count, inf, float64)
+
+    if not count or not len(tx):
+        return found, sqrt(best)
+
+    qx = qx.astype(float64)
+    qy = qy.astype(float64)
+    tx = tx.astype(float64)
+    ty = ty.astype(float64)
+
+    left = min(qx.min(), tx.min())
+    bottom = min(qy.min(), ty.min())
+
+    # With only a few targets, a grid costs more than checking them all
+    if len(tx) <= RIVAL_INDEX_BRUTE_FORCE:
+        distances = (qx[:, None] - tx) ** 2 + (qy[:, None] - ty) ** 2
+
+        found = distances.argmin(axis=1)
+
+        return found, sqrt(distances[arange(count), found])
+
+    if not cell_size:
+        area = (tx.max() - tx.min() + 1) * (ty.max() - ty.min() + 1)
+        cell_size = sqrt(area * RIVAL_INDEX_CELL_TARGETS / len(tx))
+
+        # Targets bunched together would make cells tiny next to the queries
+        # around them, and a query would walk hundreds of empty rings. The
+        # grid is kept to about one cell per target over everything indexed.
+        extent = max(max(qx.max(), tx.max()) - left,
+                     max(qy.max(), ty.max()) - bottom) + 1
+
+        cell_size = max(cell_size, extent / sqrt(len(tx)))
+
+    target_columns = ((tx - left) // cell_size).astype(intp)
+    target_rows = ((ty - bottom) // cell_size).astype(intp)
+    query_columns = ((qx - left) // cell_size).astype(intp)
+    query_rows = ((qy - bottom) // cell_size).astype(intp)
+
+    columns = int(max(target_columns.max(), query_columns.max())) + 1
+    rows = int(max(target_rows.max(), query_rows.max())) + 1
+
+    # Sort the targets by cell, so each cell is a contiguous slice
+    cells = target_rows * columns + target_columns
+    order = argsort(cells, kind="stable")
+
+    counts = bincount(cells, minlength=columns * rows)
+    starts = concatenate(([0], cumsum(counts)[:-1]))
+
+    sorted_x = tx[order]
+    sorted_y = ty[order]
+
+    def scan(queries, radius):
+        """Check the targets in a ring of cells around each query."""
+
+        offset_x, offset_y = _ring(radius)
+
+        cell_x = query_columns[queries][:, None] + offset_x
+        cell_y = query_rows[queries][:, None] + offset_y
+
+        valid = (cell_x >= 0) & (cell_x < columns) & \
+                (cell_y >= 0) & (cell_y < rows)
+
+        queries = repeat(queries, len(offset_x)).reshape(cell_x.shape)[valid]
+        cells = (cell_y * columns + cell_x)[valid]
+
+        sizes = counts[cells]
+        occupied = sizes > 0
+
+        queries = queries[occupied]
+        cells = cells[occupied]
+        sizes = sizes[occupied]
+
+        if not len(queries):
+            return
+
+        # Expand every (query, cell) pair into (query, target) pairs
+        pairs = repeat(queries, sizes)
+        targets = repeat(starts[cells], sizes) + \
+            arange(sizes.sum()) - repeat(cumsum(sizes) - sizes, sizes)
+
+        distances = (sorted_x[targets] - qx[pairs]) ** 2 + \
+                    (sorted_y[targets] - qy[pairs]) ** 2
+
+        # Keep the closest target of each query
+        minimum.at(best, pairs, distances)
+
+        closest = distances == best[pairs]
+        found[pairs[closest]] = order[targets[closest]]
+
+    # Rings closer than the cells holding targets are empty, so every query
+    # starts at its distance in cells from the targets' bounding box
+    radius = maximum(
+        maximum(target_columns.min() - query_columns,
+                query_columns - target_columns.max()),
+        maximum(target_rows.min() - query_rows,
+                query_rows - target_rows.max())
+    ).clip(0)
+
+    pending = arange(count)
+
+    while len(pending):
+        for ring in unique(radius[pending]):
+            scan(pending[radius[pending] == ring], int(ring))
+
+        # Anything in further rings is at least this far away
+        reach = radius[pending] * cell_size
+        unresolved = best[pending] > reach * reach
+
+        radius[pending] += 1
+
+        pending = pending[unresolved & (radius[pending] <= max(columns, rows))]
+
+    return found, sqrt(best)
+
+
+class RivalIndex:
+    """Nearest rival of every soldier, refreshed once per tick from the
+    positions in the soldier store.
+    """
+
+    def __init__(self, store, cell_size=None):
+        """Create a rival index over a soldier store.
+
+        store - soldier store whose positions are indexed
+        cell_size - size of a grid cell. Defaults to None, which picks it
+                    from the density of the rivals every refresh.
+
+        parameters: SoldierStore, int
+        """
+
+        self.store = store
+        self.cell_size = cell_size
+
+        self.nearest = zeros(0, intp)
+        self.distance = zeros(0, float32)
+
+    def refresh(self):
+        """Rebuild the index and find the nearest rival of every living
+        soldier. This should be called once per tick, before soldiers update.
+        """
+
+        store = self.store
+
+        self.nearest = full(store.count, -1, intp)
+        self.distance = zeros(store.count, float32)
+
+        players = store.rows(PLAYER)
+        enemies = store.rows(ENEMY)
+
+        for rows, rivals in ((players, enemies), (enemies, players)):
+            found, distance = nearest(store.x[rows], store.y[rows],
+                                      store.x[rivals], store.y[rivals],
+                                      self.cell_size)
+
+            hit = found >= 0
+
+            self.nearest[rows[hit]] = rivals[found[hit]]
+            self.distance[rows[hit]] = distance[hit]
+
+    def get_closest(self, soldier):
+        """Get the closest rival of a soldier, as found by the last refresh.
+        This matches geometry.get_closest, so the soldier itself is returned
+        with a distance of zero if it has no rivals.
+
+        soldier - soldier to get the closest rival of
+
+        parameters: Soldier
+        returns: tuple ((closest, distance))
+        """
+
+        if soldier.index >= len(self.nearest) or \
+            self.nearest[soldier.index] < 0:
+            return (soldier, 0)
+
+        return (self.store.soldiers[self.nearest[soldier.index]],
+                float(self.distance[soldier.index]))
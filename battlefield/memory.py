@@ -0,0 +1,281 @@
+"""Memory report. The memory of a battle is broken down by what holds it:
+living soldiers, arrows, corpses, geometry points, widgets and textures.
+Each entity is measured with everything it owns alone, like its attribute
+dictionary, hit box and pymunk body and shape, while things shared between
+entities, like textures, are counted once under their own category.
+
+Memory held outside of Python objects, like the bodies inside pymunk's space,
+cannot be seen from here and is reported with the interpreter itself as the
+rest of the process.
+
+Run it from the command line:
+
+    python memory.py --soldiers 10000 --ticks 600 --allocations 10
+
+Or from Python:
+
+>>> report = measure(simulation)
+>>> print(format_report(report))
+"""
+
+import gc
+import os
+import sys
+from argparse import ArgumentParser
+from collections import deque
+from json import dump
+from types import (BuiltinFunctionType, FunctionType, MethodType,
+                   ModuleType)
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(current)
+sys.path.append(parent)
+
+from benchmark import (BENCHMARK_SEED, BENCHMARK_VOLLEY, MIXES, get_memory,
+                       make_armies)
+
+# Containers followed when measuring what an entity owns
+FOLLOWED = (dict, list, tuple, set, frozenset, deque)
+
+# Objects shared by everything, never counted as owned
+SHARED = (str, type, ModuleType, FunctionType, BuiltinFunctionType,
+          MethodType)
+
+# Categories of the report, in order
+CATEGORIES = ("soldiers", "corpses", "arrows", "points", "widgets",
+              "textures")
+
+
+def get_size(objects, owned=(), seen=None):
+    """Get the memory of some objects and everything they own. Containers
+    and objects of the owned types are followed, and plain values are
+    counted, but any other object is taken to be shared and left out.
+
+    objects - objects to measure
+    owned - types of the objects owned by them, which are followed too
+    seen - ids of objects already counted, which are skipped. Sharing it
+           between calls counts each object once.
+
+    parameters: iterable, tuple, set
+    returns: int (bytes)
+    """
+
+    if seen is None:
+        seen = set()
+
+    size = 0
+
+    stack = list(objects)
+
+    while stack:
+        item = stack.pop()
+
+        if id(item) in seen:
+            continue
+
+        seen.add(id(item))
+
+        size += sys.getsizeof(item)
+
+        for referent in gc.get_referents(item):
+            if isinstance(referent, FOLLOWED + owned) or \
+               not gc.is_tracked(referent) and \
+               not isinstance(referent, SHARED):
+                stack.append(referent)
+
+    return size
+
+def get_texture_size(texture):
+    """Get the memory of the image of a texture.
+
+    texture - texture to measure
+
+    parameters: Texture
+    returns: int (bytes)
+    """
+
+    image = texture.image
+
+    if image is None:
+        return 0
+
+    return image.width * image.height * len(image.getbands())
+
+def measure(simulation, corpses=None):
+    """Break the memory of a battle down by what holds it.
+
+    simulation - simulation of the battle
+    corpses - corpse layer the dead were baked into, if it is drawn
+
+    parameters: BattleSimulation, CorpseLayer
+    returns: dict (category to the number of entities and their bytes, and
+                   the total and unaccounted bytes of the process)
+    """
+
+    from arcade import get_window
+    from arcade.texture import load_texture
+    from pymunk import Body, Poly
+
+    import geometry
+
+    store = simulation.store
+    alive = store.alive
+
+    # The store keeps every soldier by row, dead or alive
+    living = [soldier for soldier in store.soldiers if alive[soldier.index]]
+    dead = [soldier for soldier in store.soldiers
+            if not alive[soldier.index]]
+
+    seen = set()
+
+    # Shared textures are left to their own category
+    owned = (Body, Poly)
+
+    report = {}
+
+    report["soldiers"] = (len(living),
+                          get_size(living, owned, seen) +
+                          get_size([store, simulation.rival_index], (),
+                                   seen))
+
+    dead_bytes = get_size(dead, owned, seen)
+
+    if corpses:
+        # The baked layer is a single RGBA texture on the GPU
+        dead_bytes += corpses.width * corpses.height * 4
+
+    report["corpses"] = (len(dead), dead_bytes)
+
+    arrows = list(simulation.arrows.free) + list(simulation.projectile_list)
+
+    report["arrows"] = (len(arrows),
+                        get_size(arrows, owned, seen) +
+                        get_size([simulation.projectiles], (), seen))
+
+    # Every point ever created stays in this list
+    report["points"] = (len(geometry.pointlist),
+                        get_size(geometry.pointlist, (), seen))
+
+    # Only counted if widgets were loaded, as loading them needs a window
+    widgets = sys.modules.get("widgets")
+
+    if widgets:
+        from pyglet.text.document import AbstractDocument
+        from pyglet.text.layout import TextLayout
+
+        report["widgets"] = (len(widgets.Container.widgets),
+                             get_size(widgets.Container.widgets,
+                                      (TextLayout, AbstractDocument), seen))
+    else:
+        report["widgets"] = (0, 0)
+
+    textures = list(getattr(load_texture, "texture_cache", {}).values())
+    texture_bytes = sum(get_texture_size(texture) for texture in textures)
+
+    window = get_window() if corpses else None
+
+    if window:
+        # Sprite lists draw from one atlas of every texture on the GPU
+        atlas = window.ctx.default_atlas
+
+        texture_bytes += atlas.width * atlas.height * 4
+
+    report["textures"] = (len(textures), texture_bytes)
+
+    total = get_memory()
+
+    report["total"] = (1, total)
+    report["other"] = (1, total - sum(report[category][1]
+                                      for category in CATEGORIES))
+
+    return report
+
+def format_report(report):
+    """Format a memory report as a table.
+
+    report - report from measure
+
+    parameters: dict
+    returns: str
+    """
+
+    lines = [f"{'category':<10} {'count':>8} {'MiB':>10} {'bytes each':>12}"]
+
+    for category in CATEGORIES + ("other", "total"):
+        count, size = report[category]
+
+        each = f"{size / count:12.0f}" if count and \
+               category in CATEGORIES else f"{'':12}"
+
+        lines.append(f"{category:<10} {count:>8} {size / 2 ** 20:10.2f} "
+                     f"{each}")
+
+    return "\n".join(lines)
+
+def main(arguments=None):
+    """Fight a benchmark battle and report its memory from the command line.
+
+    arguments - command line arguments. If None, sys.argv is used.
+
+    parameters: list
+    """
+
+    parser = ArgumentParser(description="Report the memory of a battle.")
+
+    parser.add_argument("--soldiers", type=int, default=10000,
+                        help="soldiers in the battle")
+    parser.add_argument("--mix", default="mixed", choices=tuple(MIXES),
+                        help="share of archers in each army")
+    parser.add_argument("--ticks", type=int, default=600,
+                        help="ticks fought before measuring")
+    parser.add_argument("--allocations", type=int, default=0,
+                        help="also show this many of the largest allocation "
+                             "sites, which slows the battle down")
+    parser.add_argument("--output", default=None,
+                        help="JSON file to write the report to")
+
+    arguments = parser.parse_args(arguments)
+
+    # Imported here so the arguments are checked before loading arcade
+    from simulation import BattleSimulation
+
+    if arguments.allocations:
+        import tracemalloc
+
+        tracemalloc.start()
+
+    player, enemy, width = make_armies(arguments.soldiers, arguments.mix)
+
+    simulation = BattleSimulation(width, player=player, enemy=enemy,
+                                  seed=BENCHMARK_SEED)
+
+    while simulation.ticks < arguments.ticks and not simulation.finished:
+        if not simulation.ticks % BENCHMARK_VOLLEY:
+            for unit in simulation.units:
+                unit.on_volley()
+
+        simulation.tick()
+
+    report = measure(simulation)
+
+    print(format_report(report))
+
+    if arguments.allocations:
+        print()
+
+        snapshot = tracemalloc.take_snapshot()
+
+        for statistic in snapshot.statistics("lineno")[:arguments.allocations]:
+            print(statistic)
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            dump({category : {"count" : count, "bytes" : size}
+                  for category, (count, size) in report.items()}, file,
+                 indent=4)
+
+
+if __name__ == "__main__":
+    main()
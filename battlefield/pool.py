@@ -0,0 +1,98 @@
+"""Object pool for projectiles. Creating an arrow loads its sprite, computes
+its hit box and builds a pymunk body and shape, which is far too slow to do
+for every shot of a volley. The pool keeps idle arrows around and recycles
+them, so a volley only resets a few attributes per arrow.
+"""
+
+import os
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import ARROW_POOL_SIZE
+from variables import Arrow
+
+
+class ArrowPool:
+    """Recycles arrows and their pymunk bodies and shapes. Arrows are created
+    up front, and new ones are only created when every pooled arrow is in
+    flight. Each of these pool misses is counted, so the size can be tuned
+    from the misses the benchmark reports.
+    """
+
+    def __init__(self, size=ARROW_POOL_SIZE):
+        """Create a pool and fill it with idle arrows. The simulation must be
+        active, as arrows are created in its space.
+
+        size - number of idle arrows kept by the pool
+
+        parameters: int
+        """
+
+        self.size = size
+
+        self.free = [Arrow() for i in range(size)]
+
+        self.hits = 0 # Arrows taken from the pool
+        self.misses = 0 # Arrows created because the pool was empty
+
+        self.active = 0
+        self.peak = 0
+
+    def take(self):
+        """Take an arrow to put in flight, creating a new one if none are
+        idle. Use acquire to fire it.
+
+        returns: Arrow
+        """
+
+        if self.free:
+            arrow = self.free.pop()
+            self.hits += 1
+        else:
+            arrow = Arrow()
+            self.misses += 1
+
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+
+        return arrow
+
+    def acquire(self, shooter, target):
+        """Fire a pooled arrow, creating a new one if none are idle.
+
+        shooter - soldier firing the arrow
+        target - soldier the arrow is aimed at
+
+        parameters: Soldier, Soldier
+        returns: Arrow
+        """
+
+        arrow = self.take()
+        arrow.launch(shooter, target)
+
+        return arrow
+
+    def release(self, arrow):
+        """Take an arrow out of flight and keep it for reuse. Arrows past the
+        pool size are dropped. Releasing an arrow that is not in flight, like
+        one hit twice in the same step, does nothing.
+
+        arrow - arrow to release
+
+        parameters: Arrow
+        """
+
+        if not arrow.attached:
+            return
+
+        arrow.remove_from_sprite_lists()
+        arrow.detach()
+
+        self.active -= 1
+
+        if len(self.free) < self.size:
+            self.free.append(arrow)
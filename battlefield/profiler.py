@@ -0,0 +1,310 @@
+"""Frame profiler. Every span of the simulation and the window is added up per
+frame, and the last PROFILER_HISTORY frames of each phase are kept, so rolling
+percentiles and histograms show where the time goes while a battle is running.
+Frames that take longer than their budget are blamed on the phase that took
+the longest in them.
+
+The overlay shows the profiler on top of the battlefield with Labels, one
+line per phase, refreshed every PROFILER_REFRESH frames while it is shown.
+
+>>> profiler = FrameProfiler()
+>>> simulation.profilers.append(profiler)
+>>> overlay = ProfilerOverlay(profiler, 10, window.height - 20)
+>>> ... # Run a frame
+>>> profiler.end_frame()
+>>> overlay.update()
+"""
+
+import os
+import sys
+from time import perf_counter
+
+from numpy import asarray, bincount, percentile, searchsorted, zeros
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import (PROFILER_BINS, PROFILER_HISTORY, PROFILER_REFRESH,
+                       SIMULATION_STEP)
+
+# Spans that make up a frame. Their total is checked against the budget.
+FRAME_SPANS = ("update", "draw")
+
+# Spans holding other spans, which are never blamed for a slow frame
+OUTER_SPANS = ("frame", "update", "draw", "tick")
+
+# Phases shown by the overlay, in order
+PROFILED_PHASES = ("update", "tick", "index", "soldiers", "bury", "volleys",
+                   "projectiles", "units", "flush", "physics", "collisions",
+                   "draw", "draw corpses", "draw players", "draw enemies",
+                   "draw projectiles", "draw units", "draw widgets")
+
+# Characters drawing the histogram bins, from empty to the fullest bin
+HISTOGRAM_RAMP = "_.:-=+*#%@"
+
+LINE_HEIGHT = 18 # Distance between lines of the overlay
+
+
+class FrameProfiler:
+    """Profiler keeping the time spent in each phase over the last frames.
+    It listens to spans like any other profiler, and end_frame must be called
+    once at the end of every frame.
+    """
+
+    def __init__(self, budget=SIMULATION_STEP, history=PROFILER_HISTORY):
+        """Create a profiler.
+
+        budget - longest a frame should take in seconds
+        history - number of frames kept
+
+        parameters: float, int
+        """
+
+        self.budget = budget
+        self.history = history
+
+        self.frames = 0 # Frames ended so far
+
+        self.samples = {} # Ring of the time spent per frame, by phase
+        self.current = {} # Time spent so far this frame, by phase
+
+        self.intervals = zeros(history) # Ring of the time between frames
+        self.culprits = [None] * history # Ring of the phase blamed, if any
+
+        self.last = None # When the last frame ended, by perf_counter
+
+    def _get_filled(self):
+        """Get the number of frames kept so far.
+
+        returns: int
+        """
+
+        return min(self.frames, self.history)
+
+    def _get_fps(self):
+        """Get the frames per second over the frames kept.
+
+        returns: float
+        """
+
+        intervals = self.intervals[:self.filled]
+        intervals = intervals[intervals > 0]
+
+        if not len(intervals):
+            return 0
+
+        return len(intervals) / intervals.sum()
+
+    def _get_over_budget(self):
+        """Get the number of frames kept that took longer than the budget.
+
+        returns: int
+        """
+
+        return sum(culprit is not None for culprit in self.culprits)
+
+    filled = property(_get_filled)
+    fps = property(_get_fps)
+    over_budget = property(_get_over_budget)
+
+    def record(self, name, start, duration):
+        """Add the duration of a span to its phase for this frame. A phase
+        can run more than once a frame, like the tick when catching up.
+
+        name - name of the span
+        start - when the span started, by perf_counter
+        duration - length of the span in seconds
+
+        parameters: str, float, float
+        """
+
+        self.current[name] = self.current.get(name, 0) + duration
+
+    def end_frame(self):
+        """Keep the time spent in each phase this frame and start the next
+        one. If the frame went over budget, the phase that took the longest
+        in it is blamed.
+        """
+
+        now = perf_counter()
+        slot = self.frames % self.history
+
+        if self.last is not None:
+            self.intervals[slot] = now - self.last
+
+        self.last = now
+
+        current = self.current
+        current["frame"] = sum(current.get(name, 0) for name in FRAME_SPANS)
+
+        for name in current:
+            if name not in self.samples:
+                # Earlier frames did not spend any time in a new phase
+                self.samples[name] = zeros(self.history)
+
+        for name, samples in self.samples.items():
+            samples[slot] = current.get(name, 0)
+
+        culprit = None
+
+        if current["frame"] > self.budget:
+            phases = {name : duration for name, duration in current.items()
+                      if name not in OUTER_SPANS} or current
+
+            culprit = max(phases, key=phases.get)
+
+        self.culprits[slot] = culprit
+
+        self.current = {}
+        self.frames += 1
+
+    def percentile(self, name, share):
+        """Get a percentile of the time spent in a phase per frame.
+
+        name - name of the phase
+        share - percentile, between 0 and 1
+
+        parameters: str, float
+        returns: float (seconds, or 0 if the phase never ran)
+        """
+
+        samples = self.samples.get(name)
+
+        if samples is None or not self.filled:
+            return 0
+
+        return float(percentile(samples[:self.filled], share * 100))
+
+    def histogram(self, name):
+        """Get the number of frames kept whose time in a phase falls in each
+        bin of PROFILER_BINS. The last bin holds everything past the edges.
+
+        name - name of the phase
+
+        parameters: str
+        returns: ndarray
+        """
+
+        samples = self.samples.get(name)
+
+        if samples is None:
+            return zeros(len(PROFILER_BINS) + 1, int)
+
+        bins = searchsorted(asarray(PROFILER_BINS),
+                            samples[:self.filled] * 1000)
+
+        return bincount(bins, minlength=len(PROFILER_BINS) + 1)
+
+    def blame(self):
+        """Get the number of frames kept each phase was blamed for.
+
+        returns: dict (from the most blamed phase to the least)
+        """
+
+        counts = {}
+
+        for culprit in self.culprits:
+            if culprit is not None:
+                counts[culprit] = counts.get(culprit, 0) + 1
+
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+
+class ProfilerOverlay:
+    """Labels showing a FrameProfiler, one line per phase. Hidden until
+    toggled.
+    """
+
+    def __init__(self, profiler, x, y, phases=PROFILED_PHASES):
+        """Create the overlay. A window must be open, and set as the window
+        of the widgets container, which the labels add themselves to.
+
+        profiler - profiler to show
+        x - x position of the overlay
+        y - y position of the first line of the overlay
+        phases - phases to show, one per line
+
+        parameters: FrameProfiler, int, int, tuple
+        """
+
+        # Imported here so the profiler works without a window
+        from widgets import Label
+
+        self.profiler = profiler
+        self.phases = phases
+
+        self.visible = False
+        self.frames = 0
+
+        self.header = Label("", x, y)
+        self.lines = [Label("", x, y - (line + 1) * LINE_HEIGHT)
+                      for line in range(len(phases))]
+
+    def toggle(self):
+        """Show the overlay if it is hidden, or hide it if it is shown."""
+
+        self.visible = not self.visible
+
+        if self.visible:
+            self.refresh()
+        else:
+            self.header.force_text("")
+
+            for label in self.lines:
+                label.force_text("")
+
+    def update(self):
+        """Refresh the overlay every PROFILER_REFRESH frames while it is
+        shown. This should be called once every frame.
+        """
+
+        if not self.visible:
+            return
+
+        self.frames += 1
+
+        if not self.frames % PROFILER_REFRESH:
+            self.refresh()
+
+    def refresh(self):
+        """Show the latest percentiles and histograms of every phase. The
+        phase blamed for the most slow frames is shown in red.
+        """
+
+        profiler = self.profiler
+
+        blame = profiler.blame()
+        culprit = next(iter(blame), None)
+
+        header = (f"frame {profiler.percentile('frame', 0.5) * 1000:.1f} / "
+                  f"{profiler.percentile('frame', 0.99) * 1000:.1f} ms of "
+                  f"{profiler.budget * 1000:.1f}, {profiler.fps:.0f} fps, "
+                  f"{profiler.over_budget} of {profiler.filled} over budget")
+
+        if culprit:
+            header += f", mostly {culprit}"
+
+        self.header.force_text(header)
+
+        for phase, label in zip(self.phases, self.lines):
+            if phase not in profiler.samples:
+                label.force_text(f"{phase} -")
+                continue
+
+            counts = profiler.histogram(phase)
+            fullest = max(counts.max(), 1)
+
+            bars = "".join(HISTOGRAM_RAMP[
+                -(-count * (len(HISTOGRAM_RAMP) - 1) // fullest)]
+                for count in counts.tolist())
+
+            text = (f"{phase} {profiler.percentile(phase, 0.5) * 1000:.2f} / "
+                    f"{profiler.percentile(phase, 0.99) * 1000:.2f} ms "
+                    f"[{bars}]")
+
+            if phase == culprit:
+                text = f"<font color='red'>{text}</font>"
+
+            label.force_text(text)
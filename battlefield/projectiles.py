@@ -0,0 +1,220 @@
+"""Vectorized projectile integrator. Every arrow in flight is a row in a set of
+NumPy columns holding its position, heading, speed and aim point. The heading
+is worked out once when the arrow is fired, and the whole volley is advanced
+and culled in a single step instead of one Arrow.update per sprite.
+"""
+
+import os
+import sys
+from math import atan2, cos, sin
+
+from numpy import flatnonzero, float64, zeros
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import ARROW_POOL_SIZE, ARROW_SPEED_DECAY, SIMULATION_STEP
+
+
+class ProjectileSystem:
+    """Arrows in flight, stored densely in rows 0 to count. Removing an arrow
+    moves the last row into its place, so the columns never have gaps and
+    the step works on plain slices.
+    """
+
+    COLUMNS = (
+        ("x", float64),
+        ("y", float64),
+        ("previous_x", float64),
+        ("previous_y", float64),
+        ("heading_x", float64),
+        ("heading_y", float64),
+        ("speed", float64),
+        ("target_x", float64),
+        ("target_y", float64),
+    )
+
+    def __init__(self, width, height, capacity=ARROW_POOL_SIZE):
+        """Create an empty projectile system.
+
+        width - width of the battlefield, past which arrows are culled
+        height - height of the battlefield, past which arrows are culled
+        capacity - number of rows allocated up front. The columns grow past
+                   this automatically.
+
+        parameters: int, int, int
+        """
+
+        self.width = width
+        self.height = height
+
+        self.capacity = capacity
+        self.count = 0
+
+        self.arrows = [] # Arrow of each row
+
+        # Arrows are culled once they are this far past an edge
+        self.margin = 0
+
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, zeros(capacity, dtype))
+
+    def __len__(self):
+        """Get the number of arrows in flight.
+
+        returns: int
+        """
+
+        return self.count
+
+    def _grow(self):
+        """Double the capacity of every column, keeping the rows in use. Empty
+        columns grow to a single row.
+        """
+
+        self.capacity = max(self.capacity * 2, 1)
+
+        for name, dtype in self.COLUMNS:
+            column = zeros(self.capacity, dtype)
+            column[:self.count] = getattr(self, name)[:self.count]
+
+            setattr(self, name, column)
+
+    def add(self, arrow, target_x, target_y, speed):
+        """Put an arrow in flight from its current position towards an aim
+        point. The arrow's row is kept in its slot attribute.
+
+        arrow - arrow to put in flight
+        target_x - x coordinate of the aim point
+        target_y - y coordinate of the aim point
+        speed - initial speed in pixels per tick
+
+        parameters: Arrow, float, float, float
+        """
+
+        if self.count == self.capacity:
+            self._grow()
+
+        row = self.count
+        self.count += 1
+
+        angle = atan2(target_y - arrow.y, target_x - arrow.x)
+
+        self.x[row] = arrow.x
+        self.y[row] = arrow.y
+        self.previous_x[row] = arrow.x
+        self.previous_y[row] = arrow.y
+        self.heading_x[row] = cos(angle)
+        self.heading_y[row] = sin(angle)
+        self.speed[row] = speed
+        self.target_x[row] = target_x
+        self.target_y[row] = target_y
+
+        if not self.margin:
+            self.margin = max(arrow.width, arrow.height) / 2
+
+        arrow.slot = row
+        self.arrows.append(arrow)
+
+    def remove(self, arrow):
+        """Take an arrow out of flight. Removing an arrow that is not in
+        flight does nothing.
+
+        arrow - arrow to remove
+
+        parameters: Arrow
+        """
+
+        row = arrow.slot
+
+        if row is None:
+            return
+
+        last = self.count - 1
+
+        if row != last:
+            for name, dtype in self.COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+
+            moved = self.arrows[last]
+            moved.slot = row
+            self.arrows[row] = moved
+
+        self.arrows.pop()
+        self.count -= 1
+
+        arrow.slot = None
+
+    def step(self, delta=SIMULATION_STEP):
+        """Advance every arrow in flight. Arrows slow down by ARROW_SPEED_DECAY
+        each tick and are removed once past an edge of the battlefield.
+
+        delta - length of the tick in seconds
+
+        parameters: float
+        """
+
+        count = self.count
+
+        if not count:
+            return
+
+        speed = self.speed[:count]
+        speed[speed > ARROW_SPEED_DECAY] -= ARROW_SPEED_DECAY
+
+        velocity_x = self.heading_x[:count] * speed
+        velocity_y = self.heading_y[:count] * speed
+
+        scale = delta / SIMULATION_STEP
+
+        x = self.x[:count]
+        y = self.y[:count]
+
+        self.previous_x[:count] = x
+        self.previous_y[:count] = y
+
+        x += velocity_x * scale
+        y += velocity_y * scale
+
+        margin = self.margin
+
+        culled = (y - margin > self.height) | (y + margin < 0) | \
+                 (x - margin > self.width) | (x + margin < 0)
+
+        for arrow, arrow_x, arrow_y, force_x, force_y in zip(
+            self.arrows, x.tolist(), y.tolist(),
+            velocity_x.tolist(), velocity_y.tolist()):
+            arrow.set_position(arrow_x, arrow_y)
+            arrow.body.position = arrow_x, arrow_y
+            arrow.force = (force_x, force_y)
+
+        # Highest rows first, so rows moved by a removal are never culled
+        for row in flatnonzero(culled)[::-1]:
+            self.arrows[row].remove()
+
+    def interpolate(self, alpha):
+        """Place arrows between their positions before and after the last
+        tick, in the sprite list buffers only.
+
+        alpha - fraction of the way from the previous to the current tick
+
+        parameters: float
+        """
+
+        count = self.count
+
+        if not count:
+            return
+
+        previous_x = self.previous_x[:count]
+        previous_y = self.previous_y[:count]
+
+        render_x = previous_x + (self.x[:count] - previous_x) * alpha
+        render_y = previous_y + (self.y[:count] - previous_y) * alpha
+
+        for arrow, arrow_x, arrow_y in zip(self.arrows, render_x.tolist(),
+                                           render_y.tolist()):
+            arrow.render_at(arrow_x, arrow_y)
@@ -0,0 +1,241 @@
+"""Two-process battlefield. The battle runs in a simulation process of its own
+and publishes every tick to a shared-memory FrameBuffer, while this window
+only draws the latest frame. Heavy ticks no longer drop frames, and a slow
+frame no longer slows the battle down.
+
+Run it from the command line:
+
+    python renderer.py
+"""
+
+import os
+import sys
+from multiprocessing import Event, Pipe, Process, Queue, resource_tracker
+
+from arcade import (Sprite, SpriteList, Window, close_window, enable_timings,
+                    get_fps, load_texture, run, timings_enabled)
+from numpy import bool_, flatnonzero, ones, zeros
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(current)
+sys.path.append(parent)
+
+from color import GRASS, RED
+from constants import *
+from file import projectile, soldier
+from key import Q
+from widgets import Label, container
+
+from corpses import CorpseLayer
+from frames import FrameBuffer, simulate
+from store import ALLEGIANCES
+
+
+class Renderer(Window):
+    """Window drawing a battle fought in another process. Soldiers and
+    arrows are plain sprites, moved to the transforms of each frame read.
+    """
+
+    def __init__(self, player=player_formation, enemy=enemy_formation,
+                 seed=None):
+        """Start the simulation process and open the window once its armies
+        are deployed.
+
+        player - formation of the player army
+        enemy - formation of the enemy army
+        seed - seed of the battle
+
+        parameters: list, list, int
+        """
+
+        Window.__init__(self, WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_TITLE,
+                        resizable=True, style=Window.WINDOW_STYLE_DIALOG)
+
+        self.commands = Queue()
+        self.stop = Event()
+
+        connection, child = Pipe(duplex=False)
+
+        # Both processes must share a tracker, or the frame buffer counts as
+        # leaked by this one once the simulation process frees it
+        resource_tracker.ensure_running()
+
+        self.process = Process(target=simulate, daemon=True,
+                               args=(child, self.commands, self.stop,
+                                     self.width, self.height, player, enemy,
+                                     seed))
+        self.process.start()
+
+        name, soldiers, projectiles, self.step = connection.recv()
+
+        # The fps label needs arcade's timings, which widgets no longer enable
+        if not timings_enabled():
+            enable_timings()
+
+        self.frames = FrameBuffer(soldiers, projectiles, name)
+        self.frame = None
+
+        self.corpses = CorpseLayer(self.width, self.height)
+
+        self.textures = {allegiance : (
+            load_texture(soldier[f"{allegiance}_light_infantry"]),
+            load_texture(soldier[f"{allegiance}_light_infantry_dead"]))
+            for allegiance in ALLEGIANCES}
+
+        self.soldiers = [] # Sprite of each soldier row
+        self.soldier_list = SpriteList()
+        self.projectile_list = SpriteList()
+
+        # Widgets add themselves to the container, which needs the window
+        container.window = self
+
+        self.container = container
+
+        self.fps = Label("", 50, 50, command=close_window)
+        self.tally = Label("", 50, 70)
+
+        self.unit_organize_volley = Label("Organize volley", 10, 40,
+                                          command=self.command,
+                                          parameters=["volley"])
+
+        self.unit_organize_volley.bind(Q)
+        self.background_color = GRASS
+
+    def command(self, attack):
+        """Send a command to the simulation process.
+
+        attack - name of the command
+
+        parameters: str
+        """
+
+        self.commands.put(attack)
+
+    def deploy(self, frame):
+        """Create a sprite for every soldier in the first frame.
+
+        frame - first frame of the battle
+
+        parameters: Frame
+        """
+
+        for side in frame.side.tolist():
+            sprite = Sprite(scale=0.5, angle=90)
+            sprite.texture = self.textures[ALLEGIANCES[side]][0]
+
+            self.soldiers.append(sprite)
+            self.soldier_list.append(sprite)
+
+    def show(self, frame):
+        """Move the sprites to a frame, between its previous and current
+        positions by how far the next tick is.
+
+        frame - frame to show
+
+        parameters: Frame
+        """
+
+        if not self.soldiers:
+            self.deploy(frame)
+
+        count = len(frame.alive)
+        alpha = frame.alpha(self.step)
+
+        if self.frame is None:
+            alive = ones(count, bool_)
+            wounded = zeros(count, bool_)
+        else:
+            alive = self.frame.alive
+            wounded = self.frame.wounded
+
+        # Newly dead soldiers are baked into the corpse layer
+        died = flatnonzero(alive & ~frame.alive).tolist()
+
+        corpses = [self.soldiers[row] for row in died]
+
+        for row, corpse in zip(died, corpses):
+            corpse.texture = self.textures[ALLEGIANCES[frame.side[row]]][1]
+            corpse.position = frame.x[row], frame.y[row]
+
+        self.corpses.bake(corpses)
+
+        for corpse in corpses:
+            self.soldier_list.remove(corpse)
+
+        for row in flatnonzero(~wounded & frame.wounded).tolist():
+            self.soldiers[row].color = RED
+
+        alive = flatnonzero(frame.alive)
+
+        render_x = frame.previous_x + (frame.x - frame.previous_x) * alpha
+        render_y = frame.previous_y + (frame.y - frame.previous_y) * alpha
+
+        for row, x, y in zip(alive.tolist(), render_x[alive].tolist(),
+                             render_y[alive].tolist()):
+            self.soldiers[row].position = x, y
+
+        while len(self.projectile_list) < len(frame.arrow_x):
+            self.projectile_list.append(Sprite(projectile["arrow"], 0.8))
+
+        while len(self.projectile_list) > len(frame.arrow_x):
+            self.projectile_list.pop()
+
+        arrow_x = frame.arrow_previous_x + \
+                  (frame.arrow_x - frame.arrow_previous_x) * alpha
+        arrow_y = frame.arrow_previous_y + \
+                  (frame.arrow_y - frame.arrow_previous_y) * alpha
+
+        for arrow, x, y in zip(self.projectile_list, arrow_x.tolist(),
+                               arrow_y.tolist()):
+            arrow.position = x, y
+
+        self.frame = frame
+
+    def on_draw(self):
+        self.clear()
+
+        frame = self.frames.read()
+
+        if frame is not None:
+            self.show(frame)
+
+        self.corpses.draw()
+
+        self.soldier_list.draw()
+        self.projectile_list.draw()
+
+        self.fps.text = f"{int(get_fps())} fps"
+
+        if frame is not None:
+            counts = []
+
+            for side in range(len(ALLEGIANCES)):
+                alive = frame.alive & (frame.side == side)
+
+                counts.append((int(alive.sum()),
+                               int((alive & frame.wounded).sum())))
+
+            (player, player_wounded), (enemy, enemy_wounded) = counts
+
+            self.tally.text = (f"{player} ({player_wounded} wounded) vs "
+                               f"{enemy} ({enemy_wounded} wounded)")
+
+        self.container.draw()
+
+    def on_close(self):
+        """Stop the simulation process before closing the window."""
+
+        self.stop.set()
+        self.process.join()
+
+        self.frames.close()
+
+        Window.on_close(self)
+
+
+if __name__ == "__main__":
+    renderer = Renderer()
+
+    run()
@@ -0,0 +1,357 @@
+"""Command-log replays. A battle is decided by its seed and the commands the
+player gave, so recording the seed and each command with the tick it was
+given before is enough to play the battle again exactly. Replays run
+headless as fast as the CPU allows, for regression tests and post-mortems,
+and selected ticks can be rendered to images.
+
+A replay file starts with REPLAY_MAGIC, the length of a JSON header and the
+header itself, which holds the seed, formations and outcome of the battle.
+Each command follows as a fixed-size binary record.
+
+Record a battle with:
+
+>>> log = record(simulation)
+>>> ... # Play the battle
+>>> log.save("battle.replay", simulation)
+
+Replay it from the command line:
+
+    python replay.py battle.replay --render 600 1200 --output frames
+
+Pass --trace battle.trace.json to see where the time of the replay went.
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from json import dumps, loads
+from struct import Struct
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(current)
+sys.path.append(parent)
+
+from constants import ENEMY, PLAYER
+
+REPLAY_MAGIC = b"REPLAY\x00\x01"
+
+# Commands in the order of their codes in a replay file
+COMMANDS = ("volley", "split", "select", "ceiling")
+
+# Tick the command was given before, command code and argument
+RECORD = Struct("<IBi")
+
+NO_ARGUMENT = -1 # Stored for commands without an argument
+
+
+class CommandLog:
+    """The seed, formations and commands of a battle."""
+
+    def __init__(self, header, commands=None):
+        """Create a command log.
+
+        header - seed, battlefield size, tick length and formations of the
+                 battle, and its outcome once saved
+        commands - (tick, command, argument) of every command so far
+
+        parameters: dict, list
+        """
+
+        self.header = header
+        self.commands = commands or []
+
+    def __len__(self):
+        """Get the number of commands recorded.
+
+        returns: int
+        """
+
+        return len(self.commands)
+
+    def record(self, tick, attack, argument=None):
+        """Record a command.
+
+        tick - number of ticks run before the command was given
+        attack - name of the command
+        argument - argument of the command, if it takes one
+
+        parameters: int, str, int
+        """
+
+        self.commands.append((tick, attack, argument))
+
+    def save(self, path, simulation=None):
+        """Write the log to a file.
+
+        path - path of the file
+        simulation - simulation the log was recorded from. If given, the
+                     number of ticks run and the outcome are saved, so a
+                     replay runs as long and can be checked against it.
+
+        parameters: str, BattleSimulation
+        """
+
+        header = dict(self.header)
+
+        if simulation:
+            header.update(outcome(simulation))
+
+        encoded = dumps(header).encode()
+
+        with open(path, "wb") as file:
+            file.write(REPLAY_MAGIC)
+            file.write(len(encoded).to_bytes(8, "little"))
+            file.write(encoded)
+
+            for tick, attack, argument in self.commands:
+                file.write(RECORD.pack(
+                    tick, COMMANDS.index(attack),
+                    NO_ARGUMENT if argument is None else argument))
+
+
+class Painter:
+    """Hidden window used to draw selected ticks of a replay to images."""
+
+    def __init__(self, width, height):
+        """Create the hidden window.
+
+        width - width of the battlefield
+        height - height of the battlefield
+
+        parameters: int, int
+        """
+
+        from arcade import Window
+
+        from corpses import CorpseLayer
+
+        self.window = Window(width, height, visible=False)
+        self.corpses = CorpseLayer(width, height)
+
+    def prepare(self, simulation):
+        """Create the OpenGL objects of the sprite lists of a simulation.
+        Its lists are lazy, and arcade only keeps a lazy list right for
+        drawing if it is initialized before sprites are removed from it.
+
+        simulation - simulation that will be drawn
+
+        parameters: BattleSimulation
+        """
+
+        for sprite_list in (simulation.player_list, simulation.enemy_list,
+                            simulation.projectile_list):
+            sprite_list.initialize()
+
+    def paint(self, simulation, path):
+        """Draw the battlefield as it is after the last tick and save it.
+
+        simulation - simulation to draw
+        path - path of the image
+
+        parameters: BattleSimulation, str
+        """
+
+        from arcade import get_image
+
+        from color import GRASS
+
+        self.corpses.bake(simulation.dead_list)
+        simulation.dead_list.clear()
+
+        self.window.background_color = GRASS
+        self.window.clear()
+
+        simulation.interpolate(1)
+
+        self.corpses.draw()
+
+        simulation.player_list.draw()
+        simulation.enemy_list.draw()
+        simulation.projectile_list.draw()
+
+        for unit in simulation.units:
+            unit.draw()
+
+        get_image(0, 0, simulation.width, simulation.height).save(path)
+
+
+def record(simulation):
+    """Start recording the commands given to a simulation. This should be
+    done before the first tick.
+
+    simulation - simulation to record
+
+    parameters: BattleSimulation
+    returns: CommandLog
+    """
+
+    simulation.recorder = CommandLog({
+        "seed" : simulation.rng.seed_value,
+        "width" : simulation.width,
+        "height" : simulation.height,
+        "step" : simulation.step,
+        "player" : simulation.player_unit.formation,
+        "enemy" : simulation.enemy_unit.formation,
+    })
+
+    return simulation.recorder
+
+def outcome(simulation):
+    """Get the outcome of a battle, to check replays against.
+
+    simulation - simulation of the battle
+
+    parameters: BattleSimulation
+    returns: dict
+    """
+
+    roster = simulation.roster
+
+    return {
+        "ticks" : simulation.ticks,
+        "winner" : simulation.winner,
+        "player_casualties" : roster.side(PLAYER).dead,
+        "enemy_casualties" : roster.side(ENEMY).dead,
+        "player_arrows" : roster.side(PLAYER).fired,
+        "enemy_arrows" : roster.side(ENEMY).fired,
+    }
+
+def load_log(path):
+    """Read a command log from a file.
+
+    path - path of the file
+
+    parameters: str
+    returns: CommandLog
+    """
+
+    with open(path, "rb") as file:
+        if file.read(len(REPLAY_MAGIC)) != REPLAY_MAGIC:
+            raise ValueError(f"{path} is not a battle replay")
+
+        length = int.from_bytes(file.read(8), "little")
+
+        header = loads(file.read(length))
+        records = file.read()
+
+    commands = [(tick, COMMANDS[code],
+                 None if argument == NO_ARGUMENT else argument)
+                for tick, code, argument in RECORD.iter_unpack(records)]
+
+    return CommandLog(header, commands)
+
+def replay(log, ticks=None, render=(), output=".", trace=None):
+    """Play a recorded battle again, headless and as fast as possible.
+
+    log - command log of the battle
+    ticks - number of ticks to play. Defaults to as many as were recorded,
+            or until the battle is over if the log has no outcome.
+    render - ticks after which the battlefield is drawn and saved as an
+             image. Drawing needs a window, which is only created if this is
+             given.
+    output - directory the images are saved to
+    trace - file the latest spans of the replay are written to as trace
+            events. Nothing is traced if None.
+
+    parameters: CommandLog, int, iterable, str, str
+    returns: BattleSimulation (in its state after the last tick played)
+    """
+
+    # Imported here so the simulation is only loaded when replaying
+    from simulation import BattleSimulation
+    from tracer import Tracer
+
+    header = log.header
+
+    if ticks is None:
+        ticks = header.get("ticks")
+
+    render = set(render)
+
+    painter = None
+
+    if render:
+        painter = Painter(header["width"], header["height"])
+
+    simulation = BattleSimulation(header["width"], header["height"],
+                                  header["player"], header["enemy"],
+                                  header["step"], seed=header["seed"])
+
+    if painter:
+        painter.prepare(simulation)
+
+    tracer = None
+
+    if trace:
+        tracer = Tracer(simulation)
+        simulation.profilers.append(tracer)
+        simulation.tracers.append(tracer)
+
+    commands = iter(log.commands)
+    command = next(commands, None)
+
+    while ticks is None and not simulation.finished or \
+          ticks is not None and simulation.ticks < ticks:
+        while command and command[0] <= simulation.ticks:
+            simulation.command(*command[1:])
+            command = next(commands, None)
+
+        simulation.tick()
+
+        if simulation.ticks in render:
+            with simulation.span("paint"):
+                painter.paint(simulation, os.path.join(
+                    output, f"tick_{simulation.ticks:06d}.png"))
+
+    if tracer:
+        tracer.close()
+        tracer.save(trace)
+
+    return simulation
+
+def main(arguments=None):
+    """Replay a battle from the command line and check its outcome.
+
+    arguments - command line arguments. If None, sys.argv is used.
+
+    parameters: list
+    returns: bool (whether the outcome matches the recording)
+    """
+
+    parser = ArgumentParser(description="Replay a recorded battle headless.")
+
+    parser.add_argument("path", help="replay file")
+    parser.add_argument("--ticks", type=int, default=None,
+                        help="ticks to play, as many as recorded by default")
+    parser.add_argument("--render", type=int, nargs="*", default=(),
+                        help="ticks to draw to images")
+    parser.add_argument("--output", default=".",
+                        help="directory to save the images to")
+    parser.add_argument("--trace", default=None,
+                        help="trace-event file to write the spans to")
+
+    arguments = parser.parse_args(arguments)
+
+    log = load_log(arguments.path)
+
+    simulation = replay(log, arguments.ticks, arguments.render,
+                        arguments.output, arguments.trace)
+
+    result = outcome(simulation)
+
+    matches = all(log.header.get(key, value) == value
+                  for key, value in result.items())
+
+    for key, value in result.items():
+        print(f"{key}: {value} (recorded {log.header.get(key)})")
+
+    print("Outcome matches the recording" if matches else
+          "Outcome differs from the recording")
+
+    return matches
+
+
+if __name__ == "__main__":
+    sys.exit(not main())
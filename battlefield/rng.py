@@ -0,0 +1,75 @@
+"""Random number service of a battle. Every roll in a battle is drawn from one
+seeded generator instead of the global random module, so a battle played
+with the same seed and commands plays out the same way. Rolls made for every
+soldier each tick are drawn as whole arrays from a NumPy Generator seeded
+alongside it.
+
+>>> rng = BattleRandom(1234)
+>>> rng.chance(1000)
+False
+>>> rng.chances(1000, 5)
+array([False, False, False, False, False])
+"""
+
+import os
+import sys
+from random import Random
+
+from numpy.random import default_rng
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from geometry import chance
+
+
+class BattleRandom(Random):
+    """A seeded random number generator for one battle. Being a Random, it
+    has the usual randint, randrange, choice and random functions, and its
+    state can be saved with getstate. The generator property is a NumPy
+    Generator for batched draws.
+    """
+
+    def __init__(self, seed=None):
+        """Create a random number generator for a battle.
+
+        seed - seed of the battle. If None, a seed is picked at random and
+               can be read from the seed_value property to replay the battle.
+
+        parameters: int
+        """
+
+        if seed is None:
+            seed = int.from_bytes(os.urandom(4), "little")
+
+        self.seed_value = seed
+
+        Random.__init__(self, seed)
+
+        self.generator = default_rng(seed)
+
+    def chance(self, value):
+        """Return True or False in a 1-in-value chance, like geometry.chance.
+
+        value - chance of returning True
+
+        parameters: int
+        returns: bool
+        """
+
+        return chance(value, self)
+
+    def chances(self, value, size):
+        """Roll a 1-in-value chance for many things at once, like every
+        soldier of the battle.
+
+        value - chance of each roll being True
+        size - number of rolls
+
+        parameters: int, int
+        returns: ndarray (bool of each roll)
+        """
+
+        return self.generator.integers(1, value + 1, size) == 2
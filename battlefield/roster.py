@@ -0,0 +1,160 @@
+"""Running totals of the battle. Instead of scanning every soldier to find out
+how many are still standing, the roster keeps counts of living, wounded and
+dead soldiers and of arrows left and fired for each side and each unit. The
+counts are updated as soldiers are wounded, killed and fire, so reading them
+costs the same however large the armies are.
+
+>>> roster = Roster(store)
+>>> roster.side(PLAYER).alive
+400
+>>> roster.unit(unit).arrows
+1200
+"""
+
+import os
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import ENEMY, PLAYER
+
+
+class Tally:
+    """Counts of one side or unit. A soldier counts as wounded from the first
+    time it is hurt until it dies, even if it heals.
+    """
+
+    def __init__(self):
+        """Create an empty tally."""
+
+        self.alive = 0
+        self.wounded = 0
+        self.dead = 0
+        self.arrows = 0
+        self.fired = 0
+
+    def __repr__(self):
+        """Get a summary of the tally.
+
+        returns: str
+        """
+
+        return (f"Tally(alive={self.alive}, wounded={self.wounded}, "
+                f"dead={self.dead}, arrows={self.arrows}, "
+                f"fired={self.fired})")
+
+
+class Roster:
+    """Tallies of both sides and every unit. Each soldier must be enlisted,
+    and the roster must be told when a soldier is wounded, killed or fires
+    an arrow.
+    """
+
+    def __init__(self, store):
+        """Create an empty roster.
+
+        store - soldier store the soldiers live in, used to remember which
+                soldiers are wounded
+
+        parameters: SoldierStore
+        """
+
+        self.store = store
+
+        self.sides = {PLAYER : Tally(), ENEMY : Tally()}
+        self.units = {}
+
+    def side(self, allegiance):
+        """Get the tally of a side.
+
+        allegiance - side to get the tally of
+
+        parameters: str
+        returns: Tally
+        """
+
+        return self.sides[allegiance]
+
+    def unit(self, unit):
+        """Get the tally of a unit.
+
+        unit - unit to get the tally of
+
+        parameters: Unit
+        returns: Tally
+        """
+
+        return self.units[unit]
+
+    def enlist(self, soldier):
+        """Add a new soldier and its arrows to its side and unit. The unit
+        attribute of the soldier must already be set.
+
+        soldier - soldier to add
+
+        parameters: Soldier
+        """
+
+        if soldier.unit not in self.units:
+            self.units[soldier.unit] = Tally()
+
+        arrows = soldier.arrows
+
+        for tally in (self.sides[soldier.allegiance],
+                      self.units[soldier.unit]):
+            tally.alive += 1
+            tally.arrows += arrows
+
+    def wound(self, soldier):
+        """Count a soldier as wounded. Wounding a soldier again, or one that
+        is already dead, does nothing.
+
+        soldier - soldier that was hurt
+
+        parameters: Soldier
+        """
+
+        row = soldier.index
+
+        if self.store.wounded[row] or not self.store.alive[row]:
+            return
+
+        self.store.wounded[row] = True
+
+        self.sides[soldier.allegiance].wounded += 1
+        self.units[soldier.unit].wounded += 1
+
+    def kill(self, soldier):
+        """Move a soldier to the dead, along with any arrows it had left.
+        This must be called once per soldier, while it is still marked alive
+        in the store.
+
+        soldier - soldier that died
+
+        parameters: Soldier
+        """
+
+        wounded = int(self.store.wounded[soldier.index])
+        arrows = soldier.arrows
+
+        for tally in (self.sides[soldier.allegiance], self.units[soldier.unit]):
+            tally.alive -= 1
+            tally.wounded -= wounded
+            tally.dead += 1
+            tally.arrows -= arrows
+
+    def shoot(self, soldier):
+        """Count an arrow fired by a soldier.
+
+        soldier - soldier that fired
+
+        parameters: Soldier
+        """
+
+        for tally in (self.sides[soldier.allegiance],
+                      self.units[soldier.unit]):
+            tally.arrows -= 1
+            tally.fired += 1
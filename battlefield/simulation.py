@@ -0,0 +1,566 @@
+"""Headless battle engine. The simulation owns the pymunk space, the side
+lists and the tick loop, so a battle can be stepped without a window or an
+OpenGL context. The Battlefield window only draws what the simulation holds.
+
+>>> simulation = BattleSimulation()
+>>> winner = simulation.run(ticks=600)
+"""
+
+import os
+import sys
+from array import array
+
+from arcade import SpriteList
+from pymunk import Space
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from numpy import (absolute, asarray, bool_, flatnonzero, float32, intp,
+                   maximum, subtract, unique, zeros)
+
+from color import RED
+from constants import (ARROW_DAMAGE, ARROW_DAMAGE_LOSS, ARROW_POOL_SIZE,
+                       ENEMY, PLAYER, SIMULATION_MAX_STEPS, SIMULATION_STEP,
+                       WINDOW_HEIGHT, WINDOW_WIDTH, enemy_formation,
+                       player_formation)
+from index import RivalIndex
+from projectiles import ProjectileSystem
+from rng import BattleRandom
+from spans import NO_SPAN, Span
+from roster import Roster
+from store import SoldierStore
+from volley import VolleyScheduler
+
+_simulation = None
+
+
+def get_simulation():
+    """Get the active battle simulation. Soldiers, arrows and units use this
+    instead of the window to reach the physics space and the sprite lists.
+
+    returns: BattleSimulation
+    """
+
+    return _simulation
+
+def set_simulation(simulation):
+    """Set the active battle simulation. This is done automatically when a
+    simulation is created, so you should only need it when switching between
+    several simulations in the same process.
+
+    simulation - simulation to make active
+
+    parameters: BattleSimulation
+    """
+
+    global _simulation
+
+    _simulation = simulation
+
+def remove_sprites(sprite_list, sprites):
+    """Remove many sprites from a sprite list in a single pass. Removing them
+    one at a time searches the whole list and its index buffer for each
+    sprite, which gets slow when many soldiers die in the same tick. Sprites
+    not in the list are ignored.
+
+    sprite_list - list to remove the sprites from
+    sprites - sprites to remove
+
+    parameters: SpriteList, set
+    """
+
+    slots = set()
+
+    for sprite in sprites:
+        slot = sprite_list.sprite_slot.pop(sprite, None)
+
+        if slot is None:
+            continue
+
+        sprite.sprite_lists.remove(sprite_list)
+        sprite_list._sprite_buffer_free_slots.append(slot)
+
+        if sprite_list.spatial_hash:
+            sprite_list.spatial_hash.remove_object(sprite)
+
+        slots.add(slot)
+
+    if not slots:
+        return
+
+    # A lazy list not drawn yet would still load the removed sprites
+    if sprite_list._deferred_sprites:
+        sprite_list._deferred_sprites -= sprites
+
+    sprite_list.sprite_list = [sprite for sprite in sprite_list.sprite_list
+                               if sprite not in sprites]
+
+    # Keep the draw order of the remaining sprites
+    data = sprite_list._sprite_index_data
+    used = sprite_list._sprite_index_slots
+
+    kept = array(data.typecode, [slot for slot in data[:used]
+                                 if slot not in slots])
+
+    data[:used] = kept + array(data.typecode, [0] * (used - len(kept)))
+    sprite_list._sprite_index_slots = len(kept)
+    sprite_list._sprite_index_changed = True
+
+
+class BattleSimulation:
+    """A battle between two armies, stepped one tick at a time. Nothing here
+    touches the window, so it runs as fast as the CPU allows on machines where
+    no window can be created.
+    """
+
+    def __init__(self, width=WINDOW_WIDTH, height=WINDOW_HEIGHT,
+                 player=player_formation, enemy=enemy_formation,
+                 step=SIMULATION_STEP, max_steps=SIMULATION_MAX_STEPS,
+                 seed=None, arrow_pool=ARROW_POOL_SIZE):
+
+        """Create a battle simulation and deploy both armies.
+
+        width - width of the battlefield
+        height - height of the battlefield
+        player - formation of the player army
+        enemy - formation of the enemy army
+        step - length of a tick in seconds when driven by advance
+        max_steps - most ticks advance runs to catch up in one frame. Time
+                    past this is dropped, so a slow machine runs the battle
+                    slower instead of falling further and further behind.
+        seed - seed of every random roll in the battle. If None, one is
+               picked at random and kept in rng.seed_value.
+        arrow_pool - number of idle arrows kept for reuse. Volleys of more
+                     arrows than this create new ones, which are counted in
+                     arrows.misses.
+
+        parameters: int, int, list, list, float, int, int, int
+        """
+
+        # These are imported here as they need the simulation to be active
+        from pool import ArrowPool
+        from units import Unit
+
+        self.width = width
+        self.height = height
+
+        # Lazy sprite lists do not create OpenGL objects until drawn
+        self.player_list = SpriteList(lazy=True)
+        self.enemy_list = SpriteList(lazy=True)
+        self.projectile_list = SpriteList(lazy=True)
+
+        # Soldiers buried since the renderer last baked them into its corpse
+        # layer. Corpses are not drawn as sprites, so this is a plain list.
+        self.dead_list = []
+
+        self.units = []
+        self.moved = [] # Objects with positions waiting to be committed
+        self.dying = [] # Soldiers killed this tick, waiting to be buried
+
+        self.rng = BattleRandom(seed)
+
+        self.store = SoldierStore()
+        self.rival_index = RivalIndex(self.store)
+        self.roster = Roster(self.store)
+        self.projectiles = ProjectileSystem(self.width, self.height,
+                                            arrow_pool)
+        self.volleys = VolleyScheduler(self)
+
+        self.recorder = None # CommandLog recording the commands, if any
+        self.profilers = [] # Told how long each phase of a tick takes
+        self.tracers = [] # Also told about every contact and input event
+
+        self.space = Space()
+
+        # Registered once; hits are only recorded during the step
+        self.arrow_soldier_collisions = self.space.add_collision_handler(1, 2)
+        self.arrow_soldier_collisions.pre_solve = self.on_arrow_soldier_collision
+
+        self.hits = {} # Row of the soldier each arrow hit during the step
+
+        self.ticks = 0
+
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0
+
+        # Soldier positions before the last tick, for interpolation
+        self.previous_x = zeros(0, float32)
+        self.previous_y = zeros(0, float32)
+
+        # Soldiers last drawn somewhere else than their position
+        self.offset = zeros(0, bool_)
+
+        # Fatigue roll of every soldier for the current tick
+        self.fatigue = zeros(0, bool_)
+
+        set_simulation(self)
+
+        self.arrows = ArrowPool(arrow_pool)
+
+        self.player_unit = Unit(player, PLAYER, self.width / 2, 200)
+        self.enemy_unit = Unit(enemy, ENEMY, self.width / 2, 500)
+
+        self.current_unit = self.player_unit
+
+    def _get_finished(self):
+        """Check if the battle is over, which is when one side has no living
+        soldiers left.
+
+        returns: bool
+        """
+
+        return not self.roster.side(PLAYER).alive or \
+               not self.roster.side(ENEMY).alive
+
+    def _get_winner(self):
+        """Get the side that won the battle. This is None if the battle is
+        still being fought or both sides were wiped out.
+
+        returns: str or None
+        """
+
+        player = self.roster.side(PLAYER).alive
+        enemy = self.roster.side(ENEMY).alive
+
+        if player and not enemy:
+            return PLAYER
+        if enemy and not player:
+            return ENEMY
+
+        return None
+
+    finished = property(_get_finished)
+    winner = property(_get_winner)
+
+    def span(self, name):
+        """Get a span timing a phase of the battle for every profiler in
+        profilers. While there are none, this costs next to nothing.
+
+        name - name of the phase
+
+        parameters: str
+        returns: Span
+        """
+
+        if not self.profilers:
+            return NO_SPAN
+
+        return Span(self.profilers, name)
+
+    def detail(self, name):
+        """Get a span timing something small that happens many times a
+        tick, like a single contact or input event, for every profiler in
+        tracers. Only tracers keep spans this fine, so others are not told,
+        and nothing is created while there are no tracers.
+
+        name - name of the span
+
+        parameters: str
+        returns: Span
+        """
+
+        if not self.tracers:
+            return NO_SPAN
+
+        return Span(self.tracers, name)
+
+    def command(self, attack, argument=None):
+        """Give a player command. Every command that changes the battle goes
+        through here, so it can be recorded with the tick it was given
+        before and replayed.
+
+        attack - name of the command: "volley" or "split" for the selected
+                 unit, "select" to select the unit at index argument of
+                 units, or "ceiling" to set the volley ceiling to argument
+        argument - argument of the command, if it takes one
+
+        parameters: str, int
+        """
+
+        if self.recorder is not None:
+            self.recorder.record(self.ticks, attack, argument)
+
+        if attack == "volley":
+            self.current_unit.on_volley()
+        elif attack == "split":
+            self.current_unit.on_split()
+        elif attack == "select":
+            self.current_unit = self.units[argument]
+        elif attack == "ceiling":
+            self.volleys.ceiling = argument
+
+    def on_arrow_soldier_collision(self, arbiter, space, data):
+        """An arrow hit a soldier. The hit is only recorded here, as this is
+        called from inside the physics step for every contact, and all hits
+        are resolved together by resolve_hits once the step is done. An arrow
+        touching several soldiers hits the one in the lowest row, so hits
+        do not depend on the order pymunk reports contacts in.
+
+        The contact is ignored by the solver, since the arrow is removed
+        anyway.
+        """
+
+        with self.detail("arrow hit"):
+            arrow = arbiter.shapes[1].object
+
+            row = arbiter.shapes[0].object.index
+
+            self.hits[arrow] = min(self.hits.get(arrow, row), row)
+
+        return False
+
+    def resolve_hits(self):
+        """Apply the damage of every arrow that hit a soldier in the last
+        step and take the arrows out of flight. The damage of an arrow grows
+        with its force, and is worked out for every hit at once. Collision
+        filters already keep arrows from hitting their own side, but the
+        allegiance is checked to be safe.
+        """
+
+        if not self.hits:
+            return
+
+        arrows = sorted(self.hits, key=lambda arrow: arrow.slot)
+        rows = asarray([self.hits[arrow] for arrow in arrows], intp)
+
+        self.hits.clear()
+
+        store = self.store
+
+        shooters = asarray([arrow.shooter.index for arrow in arrows], intp)
+        force = asarray([arrow.force for arrow in arrows], float32)
+
+        rivals = store.side[rows] != store.side[shooters]
+        rows = rows[rivals]
+
+        damage = absolute(maximum(force[rivals, 0], force[rivals, 1])) / \
+                 ARROW_DAMAGE_LOSS
+        damage[damage == 0] = 1 # Even slow arrows cause damage
+
+        # A soldier may be hit by several arrows in the same step
+        subtract.at(store.health, rows, damage * ARROW_DAMAGE)
+
+        for row in unique(rows).tolist():
+            store.soldiers[row].color = RED
+            self.roster.wound(store.soldiers[row])
+
+        for arrow, rival in zip(arrows, rivals.tolist()):
+            if rival:
+                arrow.remove()
+
+    def kill(self, soldier):
+        """Mark a soldier as dead. It stops counting as alive right away, but
+        its body and sprite are only cleared away by bury, once per tick.
+        Killing a soldier twice does nothing.
+
+        soldier - soldier that died
+
+        parameters: Soldier
+        """
+
+        if not self.store.alive[soldier.index]:
+            return
+
+        self.roster.kill(soldier)
+
+        self.store.alive[soldier.index] = False
+        self.store.health[soldier.index] = 0
+
+        self.dying.append(soldier)
+
+    def bury(self):
+        """Clear away the soldiers killed since the last burial. Their bodies
+        leave the physics space, their sprites move from the side lists to
+        the dead list, and the units drop them from their soldiers, each in a
+        single pass however many soldiers died.
+        """
+
+        if not self.dying:
+            return
+
+        # Kept in order of death, so replays of a battle bury the same way
+        dying = self.dying
+        self.dying = []
+
+        for soldier in dying:
+            soldier.detach()
+            soldier.set_texture(1)
+
+        buried = set(dying)
+
+        remove_sprites(self.player_list, buried)
+        remove_sprites(self.enemy_list, buried)
+
+        self.dead_list.extend(dying)
+
+        alive = self.store.alive
+
+        for unit in self.units:
+            unit.soldiers = [soldier for soldier in unit.soldiers
+                             if alive[soldier.index]]
+
+    def flush_positions(self):
+        """Commit the positions of every object moved with set_position since
+        the last flush, updating each one's spatial hashes and sprite list
+        buffers once no matter how often it moved.
+        """
+
+        for object in self.moved:
+            object.commit_position()
+
+        self.moved.clear()
+
+    def tick(self, delta=None):
+        """Advance the battle by a single tick.
+
+        delta - length of the tick in seconds. Defaults to the step of the
+                simulation.
+
+        parameters: float
+        """
+
+        delta = delta or self.step
+
+        store = self.store
+        count = store.count
+
+        with self.span("tick"):
+            self.previous_x = store.x[:count].copy()
+            self.previous_y = store.y[:count].copy()
+
+            with self.span("index"):
+                self.fatigue = self.rng.chances(5, count)
+
+                self.rival_index.refresh()
+
+            with self.span("soldiers"):
+                self.player_list.update()
+                self.enemy_list.update()
+
+            with self.span("bury"):
+                self.bury()
+
+            # Living soldiers slowly regain health
+            healing = self.rng.chances(1000, count) & store.alive[:count]
+            store.health[:count][healing] += 1
+
+            with self.span("volleys"):
+                self.volleys.update()
+
+            with self.span("projectiles"):
+                self.projectiles.step(delta)
+
+            with self.span("units"):
+                for unit in self.units:
+                    with self.span("unit"):
+                        unit.on_update(delta)
+
+            with self.span("flush"):
+                self.flush_positions()
+
+            with self.span("physics"):
+                self.space.step(delta)
+
+            with self.span("collisions"):
+                self.resolve_hits()
+
+            self.ticks += 1
+
+    def advance(self, delta):
+        """Advance the battle by the real time that passed since the last
+        frame. Time is accumulated and spent in fixed steps, so the battle
+        runs at the same speed whatever the frame rate.
+
+        delta - time passed in seconds
+
+        parameters: float
+        returns: float (fraction of a step left over, used to interpolate)
+        """
+
+        self.accumulator += delta
+
+        steps = 0
+
+        while self.accumulator >= self.step:
+            if steps == self.max_steps:
+                # Too far behind to catch up, drop the backlog
+                self.accumulator %= self.step
+                break
+
+            self.tick(self.step)
+
+            self.accumulator -= self.step
+            steps += 1
+
+        return self.accumulator / self.step
+
+    def interpolate(self, alpha):
+        """Place moving sprites between their positions before and after the
+        last tick, for drawing frames that fall between ticks. Only the
+        sprite list buffers are changed, so the positions the battle reads
+        stay exact.
+
+        alpha - fraction of the way from the previous to the current tick
+
+        parameters: float
+        """
+
+        store = self.store
+        count = len(self.previous_x)
+
+        x = store.x[:count]
+        y = store.y[:count]
+
+        if len(self.offset) != count:
+            offset = zeros(count, bool_)
+            offset[:len(self.offset)] = self.offset[:count]
+
+            self.offset = offset
+
+        # Soldiers of collapsed units stand still in their unit's reserve.
+        # Soldiers that stopped moving since they were drawn short of their
+        # position are drawn again, where they stopped.
+        moving = flatnonzero(store.alive[:count] & ~store.reserve[:count] &
+                             ((x != self.previous_x) | (y != self.previous_y) |
+                              self.offset))
+
+        render_x = self.previous_x[moving] + \
+                   (x[moving] - self.previous_x[moving]) * alpha
+        render_y = self.previous_y[moving] + \
+                   (y[moving] - self.previous_y[moving]) * alpha
+
+        for row, soldier_x, soldier_y in zip(moving.tolist(),
+                                             render_x.tolist(),
+                                             render_y.tolist()):
+            store.soldiers[row].render_at(soldier_x, soldier_y)
+
+        self.offset[:] = False
+        self.offset[moving] = (render_x != x[moving]) | \
+                              (render_y != y[moving])
+
+        self.projectiles.interpolate(alpha)
+
+    def run(self, ticks=None, delta=None):
+        """Step the battle as fast as possible until it is finished or the
+        number of ticks is reached.
+
+        ticks - maximum number of ticks to run. If None, the battle runs until
+                one side is wiped out.
+        delta - length of each tick in seconds. Defaults to the step of the
+                simulation.
+
+        parameters: int, float
+        returns: str or None (the winner)
+        """
+
+        while not self.finished:
+            if ticks is not None and self.ticks >= ticks:
+                break
+
+            self.tick(delta)
+
+        return self.winner
@@ -0,0 +1,483 @@
+"""Battle snapshots. The whole state of a battle between two ticks (soldiers,
+arrows in flight, units, physics bodies, random number generators and the
+tick) is written to a compact binary file of columns, which can be restored
+into a new simulation to carry on from that point, or to fork several
+what-if battles from it.
+
+A snapshot file starts with SNAPSHOT_MAGIC, the length of a JSON header and
+the header itself, which holds the scalars of the battle and where each
+column is. Every column follows as raw array data, aligned so it can be
+viewed in place. Files are written and read through mmap, so reading a
+snapshot only maps the file and loading one copies each column once.
+
+>>> save_snapshot(simulation, "battle.snapshot")
+>>> snapshot = load_snapshot("battle.snapshot")
+>>> what_if = snapshot.restore(seed=2) # Same battle, different luck
+"""
+
+import os
+import sys
+from collections import deque
+from json import dumps, loads
+from mmap import ACCESS_READ, mmap
+
+from numpy import (asarray, bool_, dtype, float32, float64, frombuffer, int32,
+                   ndarray, uint32, zeros)
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from color import RED
+from constants import MELEE, RANGE
+
+from rng import BattleRandom
+
+SNAPSHOT_MAGIC = b"BATTLE\x00\x01"
+SNAPSHOT_HEADER = len(SNAPSHOT_MAGIC) + 8 # Where the JSON header starts
+SNAPSHOT_ALIGNMENT = 64 # Columns start on a cache line
+
+# Soldier state kept outside the store, one row per soldier. Physics state
+# is kept at full precision, or restored battles drift from the original.
+SOLDIER_COLUMNS = (
+    ("angle", float64),
+    ("force_x", float64),
+    ("force_y", float64),
+    ("melee", bool_),
+    ("moving_up", bool_),
+    ("moving_down", bool_),
+    ("target", int32), # Row of the soldier's target, or -1
+)
+
+
+class Snapshot:
+    """A snapshot read from a file. Columns are views of the mapped file
+    until the snapshot is closed.
+    """
+
+    def __init__(self, header, columns, file=None):
+        """Create a snapshot.
+
+        header - scalars of the battle
+        columns - dictionary of column names to arrays
+        file - mapped file the columns are views of, if any
+
+        parameters: dict, dict, mmap
+        """
+
+        self.header = header
+        self.columns = columns
+        self.file = file
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def _get_ticks(self):
+        """Get the tick the snapshot was taken after.
+
+        returns: int
+        """
+
+        return self.header["ticks"]
+
+    ticks = property(_get_ticks)
+
+    def close(self):
+        """Unmap the file of the snapshot. Its columns can no longer be
+        used.
+        """
+
+        self.columns = {}
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def restore(self, seed=None):
+        """Create a new simulation in the state of the snapshot. The armies
+        are deployed as usual, then every piece of state is overwritten.
+
+        seed - if given, the random number generators are reseeded after
+               restoring, so the battle carries on differently from the
+               original. Otherwise it carries on with the same rolls.
+
+        parameters: int
+        returns: BattleSimulation
+        """
+
+        # Imported here as restoring deploys a new simulation
+        from simulation import BattleSimulation
+
+        header = self.header
+        columns = self.columns
+
+        simulation = BattleSimulation(
+            header["width"], header["height"], header["player"],
+            header["enemy"], header["step"], header["max_steps"],
+            header["seed"])
+
+        store = simulation.store
+        count = header["soldiers"]
+
+        if store.count != count:
+            raise ValueError(f"Snapshot has {count} soldiers, but its "
+                             f"formations deploy {store.count}")
+
+        for name, type in store.COLUMNS:
+            getattr(store, name)[:count] = columns[name]
+
+        soldiers = store.soldiers
+
+        # Dead soldiers are buried as if they had just died
+        alive = store.alive[:count]
+
+        simulation.dying = [soldiers[row]
+                            for row in (~alive).nonzero()[0].tolist()]
+        simulation.bury()
+
+        for row in alive.nonzero()[0].tolist():
+            soldier = soldiers[row]
+
+            soldier.set_position(float(store.x[row]), float(store.y[row]))
+
+            soldier.angle = float(columns["angle"][row])
+            soldier.force = (float(columns["force_x"][row]),
+                             float(columns["force_y"][row]))
+            soldier.weapon = MELEE if columns["melee"][row] else RANGE
+            soldier.moving_up = bool(columns["moving_up"][row])
+            soldier.moving_down = bool(columns["moving_down"][row])
+
+            target = int(columns["target"][row])
+            soldier.target = soldiers[target] if target >= 0 else None
+
+            soldier.body.position = soldier.position
+            _set_body(soldier.body, columns, "soldier", row)
+
+            if store.wounded[row]:
+                soldier.color = RED
+
+        simulation.flush_positions()
+
+        self._restore_units(simulation)
+        self._restore_arrows(simulation)
+
+        volleys = simulation.volleys
+
+        volleys.pending = deque(soldiers[row]
+                                for row in columns["pending"].tolist())
+        volleys.rate = header["volleys"]["rate"]
+        volleys.ceiling = header["volleys"]["ceiling"]
+        volleys.frame_time = header["volleys"]["frame_time"]
+
+        simulation.ticks = header["ticks"]
+        simulation.accumulator = header["accumulator"]
+
+        simulation.previous_x = columns["previous_x"].copy()
+        simulation.previous_y = columns["previous_y"].copy()
+
+        simulation.current_unit = simulation.units[header["current_unit"]]
+
+        rng = header["rng"]
+
+        simulation.rng.setstate((rng["version"],
+                                 tuple(columns["rng"].tolist()),
+                                 rng["gauss_next"]))
+        simulation.rng.generator.bit_generator.state = rng["generator"]
+
+        if seed is not None:
+            simulation.rng = BattleRandom(seed)
+
+        return simulation
+
+    def _restore_units(self, simulation):
+        """Restore the tallies of the roster and the state of every unit.
+
+        simulation - simulation being restored
+
+        parameters: BattleSimulation
+        """
+
+        roster = simulation.roster
+
+        for allegiance, tally in self.header["roster"].items():
+            vars(roster.side(allegiance)).update(tally)
+
+        for unit, state in zip(simulation.units, self.header["units"]):
+            vars(roster.unit(unit)).update(state["tally"])
+
+            # Soldiers are back where they stood, so the block is too
+            if state["collapsed"]:
+                unit.collapse()
+
+            unit.expanded_tick = state["expanded_tick"]
+
+    def _restore_arrows(self, simulation):
+        """Put every arrow of the snapshot back in flight.
+
+        simulation - simulation being restored
+
+        parameters: BattleSimulation
+        """
+
+        columns = self.columns
+        projectiles = simulation.projectiles
+        soldiers = simulation.store.soldiers
+
+        for row in range(self.header["arrows"]):
+            arrow = simulation.arrows.take()
+
+            x = float(columns["arrow_x"][row])
+            y = float(columns["arrow_y"][row])
+
+            arrow.set_position(x, y)
+
+            arrow.fly(soldiers[columns["shooter"][row]],
+                      soldiers[columns["victim"][row]],
+                      (float(columns["arrow_target_x"][row]),
+                       float(columns["arrow_target_y"][row])),
+                      float(columns["launch_speed"][row]))
+
+            _set_body(arrow.body, columns, "arrow", row)
+
+            # Heading and speed carry on from where they were
+            for name, type in projectiles.COLUMNS:
+                getattr(projectiles, name)[arrow.slot] = \
+                    columns[f"arrow_{name}"][row]
+
+        simulation.flush_positions()
+
+
+def take_snapshot(simulation):
+    """Gather the state of a simulation between two ticks.
+
+    simulation - simulation to take the snapshot of
+
+    parameters: BattleSimulation
+    returns: Snapshot
+    """
+
+    store = simulation.store
+    count = store.count
+
+    columns = {name : getattr(store, name)[:count]
+               for name, type in store.COLUMNS}
+
+    soldier_columns = {name : zeros(count, type)
+                       for name, type in SOLDIER_COLUMNS}
+
+    for row, soldier in enumerate(store.soldiers):
+        force = soldier.force or (0, 0)
+
+        soldier_columns["angle"][row] = soldier.angle
+        soldier_columns["force_x"][row] = force[0]
+        soldier_columns["force_y"][row] = force[1]
+        soldier_columns["melee"][row] = soldier.weapon == MELEE
+        soldier_columns["moving_up"][row] = soldier.moving_up
+        soldier_columns["moving_down"][row] = soldier.moving_down
+        soldier_columns["target"][row] = soldier.target.index \
+                                         if soldier.target else -1
+
+    columns.update(soldier_columns)
+    columns.update(_get_bodies(store.soldiers, "soldier"))
+
+    projectiles = simulation.projectiles
+    arrows = projectiles.count
+
+    for name, type in projectiles.COLUMNS:
+        columns[f"arrow_{name}"] = getattr(projectiles, name)[:arrows]
+
+    columns.update(_get_bodies(projectiles.arrows, "arrow"))
+
+    columns["shooter"] = asarray([arrow.shooter.index
+                                  for arrow in projectiles.arrows], int32)
+    columns["victim"] = asarray([arrow.target.index
+                                 for arrow in projectiles.arrows], int32)
+    columns["launch_speed"] = asarray([arrow.speed
+                                       for arrow in projectiles.arrows],
+                                      float32)
+
+    columns["pending"] = asarray([soldier.index
+                                  for soldier in simulation.volleys.pending],
+                                 int32)
+
+    columns["previous_x"] = simulation.previous_x
+    columns["previous_y"] = simulation.previous_y
+
+    version, state, gauss_next = simulation.rng.getstate()
+
+    columns["rng"] = asarray(state, uint32)
+
+    roster = simulation.roster
+
+    units = []
+
+    for unit in simulation.units:
+        units.append({
+            "collapsed" : unit.collapsed,
+            "expanded_tick" : unit.expanded_tick,
+            "tally" : vars(roster.unit(unit)),
+        })
+
+    header = {
+        "width" : simulation.width,
+        "height" : simulation.height,
+        "player" : simulation.player_unit.formation,
+        "enemy" : simulation.enemy_unit.formation,
+        "step" : simulation.step,
+        "max_steps" : simulation.max_steps,
+        "seed" : simulation.rng.seed_value,
+        "ticks" : simulation.ticks,
+        "accumulator" : simulation.accumulator,
+        "soldiers" : count,
+        "arrows" : arrows,
+        "current_unit" : simulation.units.index(simulation.current_unit),
+        "rng" : {
+            "version" : version,
+            "gauss_next" : gauss_next,
+            "generator" : simulation.rng.generator.bit_generator.state,
+        },
+        "volleys" : {
+            "rate" : simulation.volleys.rate,
+            "ceiling" : simulation.volleys.ceiling,
+            "frame_time" : simulation.volleys.frame_time,
+        },
+        "roster" : {allegiance : vars(tally)
+                    for allegiance, tally in roster.sides.items()},
+        "units" : units,
+    }
+
+    return Snapshot(header, columns)
+
+def save_snapshot(simulation, path):
+    """Write a snapshot of a simulation to a file.
+
+    simulation - simulation to take the snapshot of, or a Snapshot
+    path - path of the file
+
+    parameters: BattleSimulation, str
+    returns: int (size of the file in bytes)
+    """
+
+    if not isinstance(simulation, Snapshot):
+        simulation = take_snapshot(simulation)
+
+    header = dict(simulation.header)
+    header["columns"] = {}
+
+    offset = 0
+
+    for name, column in simulation.columns.items():
+        offset = _align(offset)
+
+        header["columns"][name] = (column.dtype.str, len(column), offset)
+
+        offset += column.nbytes
+
+    encoded = dumps(header).encode()
+
+    start = _align(SNAPSHOT_HEADER + len(encoded))
+    size = start + offset
+
+    with open(path, "w+b") as file:
+        file.truncate(size)
+
+        with mmap(file.fileno(), size) as buffer:
+            buffer[:len(SNAPSHOT_MAGIC)] = SNAPSHOT_MAGIC
+            buffer[len(SNAPSHOT_MAGIC):SNAPSHOT_HEADER] = \
+                len(encoded).to_bytes(8, "little")
+            buffer[SNAPSHOT_HEADER:SNAPSHOT_HEADER + len(encoded)] = encoded
+
+            for name, column in simulation.columns.items():
+                type, length, offset = header["columns"][name]
+
+                view = ndarray(length, type, buffer, start + offset)
+                view[:] = column
+
+                del view # The map cannot close while viewed
+
+    return size
+
+def load_snapshot(path):
+    """Map a snapshot file. Nothing is copied until it is restored.
+
+    path - path of the file
+
+    parameters: str
+    returns: Snapshot
+    """
+
+    with open(path, "rb") as file:
+        buffer = mmap(file.fileno(), 0, access=ACCESS_READ)
+
+    if buffer[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        buffer.close()
+
+        raise ValueError(f"{path} is not a battle snapshot")
+
+    length = int.from_bytes(buffer[len(SNAPSHOT_MAGIC):SNAPSHOT_HEADER],
+                            "little")
+
+    header = loads(buffer[SNAPSHOT_HEADER:SNAPSHOT_HEADER + length])
+
+    start = _align(SNAPSHOT_HEADER + length)
+
+    columns = {name : frombuffer(buffer, dtype(type), count, start + offset)
+               for name, (type, count, offset)
+               in header.pop("columns").items()}
+
+    return Snapshot(header, columns, buffer)
+
+def _align(offset):
+    """Round an offset up to the next column boundary.
+
+    offset - offset in bytes
+
+    parameters: int
+    returns: int
+    """
+
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
+
+def _get_bodies(objects, kind):
+    """Gather the state of the pymunk bodies of some objects, apart from
+    their positions, which follow their sprites.
+
+    objects - objects with bodies, in row order
+    kind - prefix of the column names
+
+    parameters: list, str
+    returns: dict (column names to columns)
+    """
+
+    bodies = [object.body for object in objects]
+
+    return {
+        f"{kind}_body_angle" : asarray([body.angle for body in bodies],
+                                       float64),
+        f"{kind}_body_vx" : asarray([body.velocity[0] for body in bodies],
+                                    float64),
+        f"{kind}_body_vy" : asarray([body.velocity[1] for body in bodies],
+                                    float64),
+        f"{kind}_body_spin" : asarray([body.angular_velocity
+                                       for body in bodies], float64),
+    }
+
+def _set_body(body, columns, kind, row):
+    """Restore the state of a pymunk body, apart from its position.
+
+    body - body to restore
+    columns - columns of the snapshot
+    kind - prefix of the column names
+    row - row of the body
+
+    parameters: Body, dict, str, int
+    """
+
+    body.angle = float(columns[f"{kind}_body_angle"][row])
+    body.velocity = (float(columns[f"{kind}_body_vx"][row]),
+                     float(columns[f"{kind}_body_vy"][row]))
+    body.angular_velocity = float(columns[f"{kind}_body_spin"][row])
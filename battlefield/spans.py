@@ -0,0 +1,94 @@
+"""Named spans of time in a battle. The simulation wraps each phase of a tick
+in a span, and every profiler listening to it is told how long the phase
+took. Nothing is timed while no profiler is listening.
+
+>>> times = PhaseTimes()
+>>> simulation.profilers.append(times)
+>>> simulation.run(ticks=600)
+>>> times.mean("physics")
+0.0021
+"""
+
+from contextlib import nullcontext
+from time import perf_counter
+
+NO_SPAN = nullcontext() # Span used while nothing is listening
+
+
+class Span:
+    """A phase being timed. Profilers are told about it once it ends, so
+    spans nested inside it are reported first.
+    """
+
+    def __init__(self, profilers, name):
+        """Create a span.
+
+        profilers - profilers to tell about the span. Each has a record
+                    method taking the name, start and duration of a span.
+        name - name of the phase
+
+        parameters: list, str
+        """
+
+        self.profilers = profilers
+        self.name = name
+
+        self.start = 0
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+        return self
+
+    def __exit__(self, *exception):
+        duration = perf_counter() - self.start
+
+        for profiler in self.profilers:
+            profiler.record(self.name, self.start, duration)
+
+
+class PhaseTimes:
+    """Profiler keeping the duration of every span by name, for benchmarks
+    and other runs short enough to keep them all.
+    """
+
+    def __init__(self):
+        """Create an empty profiler."""
+
+        self.durations = {} # Durations in seconds by span name
+
+    def record(self, name, start, duration):
+        """Keep the duration of a span.
+
+        name - name of the span
+        start - when the span started, by perf_counter
+        duration - length of the span in seconds
+
+        parameters: str, float, float
+        """
+
+        if name not in self.durations:
+            self.durations[name] = []
+
+        self.durations[name].append(duration)
+
+    def mean(self, name):
+        """Get the average duration of a span.
+
+        name - name of the span
+
+        parameters: str
+        returns: float (seconds, or 0 if it never happened)
+        """
+
+        durations = self.durations.get(name)
+
+        if not durations:
+            return 0
+
+        return sum(durations) / len(durations)
+
+    def clear(self):
+        """Forget every duration kept so far."""
+
+        self.durations.clear()
@@ -0,0 +1,142 @@
+"""Structure-of-arrays storage for soldiers. Every piece of battle state of a
+soldier (position, velocity, health, strength, arrows, side, type and whether
+it is wounded, alive or held in a collapsed unit) lives in a contiguous NumPy
+column, and a Soldier is a thin view over one row. This
+keeps the state of a whole army in a few compact arrays, so it can be updated
+for every soldier at once instead of one sprite at a time.
+
+>>> store = SoldierStore()
+>>> row = store.add(soldier, PLAYER, ARCHER)
+>>> store.health[store.rows(PLAYER)] += 1
+"""
+
+import os
+import sys
+
+from numpy import bool_, flatnonzero, float32, int8, int16, ones, zeros
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import ENEMY, PLAYER, SOLDIER_STORE_CAPACITY
+
+# Sides are stored as small integers in the side column
+SIDES = {PLAYER : 0, ENEMY : 1}
+ALLEGIANCES = (PLAYER, ENEMY)
+
+
+class SoldierStore:
+    """Columns of soldier state, indexed by row. Rows are handed out in order
+    and never reused, so the row of a soldier stays valid for the whole
+    battle. The columns are reallocated with double the capacity when full.
+    """
+
+    COLUMNS = (
+        ("x", float32),
+        ("y", float32),
+        ("vx", float32),
+        ("vy", float32),
+        ("health", float32),
+        ("strength", int16),
+        ("arrows", int16),
+        ("side", int8),
+        ("kind", int8),
+        ("wounded", bool_),
+        ("reserve", bool_),
+        ("alive", bool_),
+    )
+
+    def __init__(self, capacity=SOLDIER_STORE_CAPACITY):
+        """Create an empty soldier store.
+
+        capacity - number of rows allocated up front. The store grows past
+                   this automatically, but allocating enough rows for the
+                   whole army avoids copying the columns.
+
+        parameters: int
+        """
+
+        self.capacity = capacity
+        self.count = 0
+
+        self.soldiers = [] # Soldier of each row
+
+        for name, dtype in self.COLUMNS:
+            setattr(self, name, zeros(capacity, dtype))
+
+    def __len__(self):
+        """Get the number of rows in use.
+
+        returns: int
+        """
+
+        return self.count
+
+    def _grow(self):
+        """Double the capacity of every column, keeping the rows in use."""
+
+        self.capacity *= 2
+
+        for name, dtype in self.COLUMNS:
+            column = zeros(self.capacity, dtype)
+            column[:self.count] = getattr(self, name)[:self.count]
+
+            setattr(self, name, column)
+
+    def _get_nbytes(self):
+        """Get the number of bytes used by the columns.
+
+        returns: int
+        """
+
+        return sum(getattr(self, name).nbytes for name, dtype in self.COLUMNS)
+
+    nbytes = property(_get_nbytes)
+
+    def add(self, soldier, allegiance, kind):
+        """Add a row for a soldier. The soldier is set alive, but its position
+        and statistics must still be written.
+
+        soldier - soldier viewing the row
+        allegiance - side of the soldier
+        kind - type of soldier, as used in formations
+
+        parameters: Soldier, str, int
+        returns: int (row of the soldier)
+        """
+
+        if self.count == self.capacity:
+            self._grow()
+
+        row = self.count
+        self.count += 1
+
+        self.side[row] = SIDES[allegiance]
+        self.kind[row] = kind
+        self.alive[row] = True
+
+        self.soldiers.append(soldier)
+
+        return row
+
+    def rows(self, allegiance=None, alive=True):
+        """Get the rows of soldiers, optionally only of one side.
+
+        allegiance - side of the soldiers. If None, both sides are included.
+        alive - only include soldiers that are alive. Defaults to True.
+
+        parameters: str, bool
+        returns: ndarray (rows of the soldiers)
+        """
+
+        if alive:
+            mask = self.alive[:self.count].copy()
+        else:
+            mask = ones(self.count, bool_)
+
+        if allegiance is not None:
+            mask &= self.side[:self.count] == SIDES[allegiance]
+
+        return flatnonzero(mask)
@@ -0,0 +1,248 @@
+"""Trace recorder. Every span of the simulation and the window is kept with
+when it started, along with garbage collections and the arrows in flight
+after every tick, and written out as a Chrome trace-event file. Open it in
+chrome://tracing or https://ui.perfetto.dev to see what a stall was made of.
+
+Spans and counters are kept in ring buffers of a fixed size, so a tracer can
+be left running for a whole battle and only holds its last TRACE_CAPACITY
+spans.
+
+>>> tracer = Tracer(simulation)
+>>> simulation.profilers.append(tracer)
+>>> simulation.tracers.append(tracer) # Also every contact and input event
+>>> simulation.run(ticks=600)
+>>> tracer.save("battle.trace.json")
+"""
+
+import gc
+import os
+import sys
+from json import dump
+from time import perf_counter
+
+from numpy import argsort, float64, int32, lexsort, zeros
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import TRACE_CAPACITY
+
+# Counters sampled after every tick, with the function reading each one
+COUNTERS = (
+    ("arrows in flight", lambda simulation: simulation.projectiles.count),
+    ("queued shots", lambda simulation: len(simulation.volleys.pending)),
+)
+
+
+class Ring:
+    """Columns of a fixed number of rows, where each new row overwrites the
+    oldest once they are full.
+    """
+
+    def __init__(self, capacity, columns):
+        """Create an empty ring.
+
+        capacity - most rows kept
+        columns - (name, dtype) of each column
+
+        parameters: int, tuple
+        """
+
+        self.capacity = capacity
+        self.written = 0 # Rows written so far, kept or not
+
+        self.columns = {name : zeros(capacity, dtype)
+                        for name, dtype in columns}
+
+    def __len__(self):
+        """Get the number of rows kept.
+
+        returns: int
+        """
+
+        return min(self.written, self.capacity)
+
+    def append(self, *row):
+        """Write a row over the oldest one.
+
+        *row - value of each column, in order
+
+        parameters: *object
+        """
+
+        slot = self.written % self.capacity
+
+        for column, value in zip(self.columns.values(), row):
+            column[slot] = value
+
+        self.written += 1
+
+    def rows(self):
+        """Get the columns of the rows kept, oldest first.
+
+        returns: dict
+        """
+
+        count = len(self)
+        start = self.written % self.capacity if self.written > count else 0
+
+        return {name : column[:count].take(range(start, start + count),
+                                          mode="wrap")
+                for name, column in self.columns.items()}
+
+
+class Tracer:
+    """Profiler keeping the latest spans, garbage collections and counters of
+    a battle for a trace-event file.
+    """
+
+    def __init__(self, simulation=None, capacity=TRACE_CAPACITY):
+        """Create a tracer and start timing garbage collections.
+
+        simulation - simulation whose counters are sampled after every tick.
+                     If None, no counters are kept.
+        capacity - most spans kept, and most samples of each counter
+
+        parameters: BattleSimulation, int
+        """
+
+        self.simulation = simulation
+
+        self.names = [] # Name of every span, by id
+        self.ids = {} # Id of every span name
+
+        self.spans = Ring(capacity, (("name", int32), ("start", float64),
+                                     ("duration", float64)))
+        self.counters = Ring(capacity, (("name", int32), ("time", float64),
+                                        ("value", float64)))
+
+        self.origin = perf_counter() # Time zero of the trace
+
+        self.collecting = None # When the running collection started
+
+        gc.callbacks.append(self.on_collect)
+
+    def __len__(self):
+        """Get the number of spans kept.
+
+        returns: int
+        """
+
+        return len(self.spans)
+
+    def intern(self, name):
+        """Get the id of a span or counter name, giving it one if it is new.
+
+        name - name of the span or counter
+
+        parameters: str
+        returns: int
+        """
+
+        if name not in self.ids:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+
+        return self.ids[name]
+
+    def record(self, name, start, duration):
+        """Keep a span. The counters are sampled at the end of every tick.
+
+        name - name of the span
+        start - when the span started, by perf_counter
+        duration - length of the span in seconds
+
+        parameters: str, float, float
+        """
+
+        self.spans.append(self.intern(name), start, duration)
+
+        if name == "tick" and self.simulation:
+            end = start + duration
+
+            for counter, read in COUNTERS:
+                self.counters.append(self.intern(counter), end,
+                                     read(self.simulation))
+
+    def on_collect(self, phase, info):
+        """Time a garbage collection as a span named after its generation.
+        This is called by the garbage collector when it starts and stops.
+
+        phase - "start" or "stop"
+        info - details of the collection
+
+        parameters: str, dict
+        """
+
+        if phase == "start":
+            self.collecting = perf_counter()
+        elif self.collecting is not None:
+            self.record(f"gc {info['generation']}", self.collecting,
+                        perf_counter() - self.collecting)
+
+            self.collecting = None
+
+    def close(self):
+        """Stop timing garbage collections. Spans kept so far can still be
+        saved.
+        """
+
+        if self.on_collect in gc.callbacks:
+            gc.callbacks.remove(self.on_collect)
+
+    def events(self):
+        """Get the spans and counters kept as trace events. Spans are sorted
+        by when they started, outer spans before the spans inside them.
+
+        returns: list
+        """
+
+        process = os.getpid()
+
+        events = [
+            {"name" : "process_name", "ph" : "M", "pid" : process, "tid" : 0,
+             "args" : {"name" : "battlefield"}},
+            {"name" : "thread_name", "ph" : "M", "pid" : process, "tid" : 0,
+             "args" : {"name" : "main"}},
+        ]
+
+        spans = self.spans.rows()
+
+        for row in lexsort((-spans["duration"], spans["start"])).tolist():
+            events.append({
+                "name" : self.names[spans["name"][row]],
+                "ph" : "X",
+                "ts" : (spans["start"][row] - self.origin) * 1e6,
+                "dur" : spans["duration"][row] * 1e6,
+                "pid" : process,
+                "tid" : 0,
+            })
+
+        counters = self.counters.rows()
+
+        for row in argsort(counters["time"], kind="stable").tolist():
+            name = self.names[counters["name"][row]]
+
+            events.append({
+                "name" : name,
+                "ph" : "C",
+                "ts" : (counters["time"][row] - self.origin) * 1e6,
+                "pid" : process,
+                "args" : {name : counters["value"][row]},
+            })
+
+        return events
+
+    def save(self, path):
+        """Write the spans and counters kept to a trace-event file.
+
+        path - path of the file
+
+        parameters: str
+        """
+
+        with open(path, "w") as file:
+            dump({"traceEvents" : self.events(), "displayTimeUnit" : "ms"},
+                 file)
@@ -1,6 +1,6 @@
-from arcade import draw_rectangle_outline, get_window
+from arcade import SpriteList, draw_rectangle_outline
+from numpy import asarray, intp
 from pyglet.event import EventDispatcher
-from random import choice, random
 
 import os
 import sys # Use full imports: may have three path variables
@@ -12,14 +12,15 @@ sys.path.append(parent)
 
 from color import RED
 from constants import *
-from key import KEY_DOWN, KEY_LEFT, KEY_RIGHT, KEY_UP, Keys
-from variables import Arrow, Soldier
+from key import KEY_DOWN, KEY_LEFT, KEY_RIGHT, KEY_UP
+from simulation import get_simulation, remove_sprites
+from variables import Soldier
 
 
 class Unit(EventDispatcher):
     
     def __init__(self, formation, allegiance, x, y):
-        self.formation = []
+        self.formation = formation
         
         self.x = x
         self.y = y
@@ -28,12 +29,26 @@ class Unit(EventDispatcher):
 
         self.soldiers = []
 
-        self.window = get_window()
+        self.simulation = get_simulation()
 
         if allegiance == PLAYER:
-            self.rivals = self.window.enemy_list
+            self.side_list = self.simulation.player_list
+            self.rivals = self.simulation.enemy_list
+            self.rivals_allegiance = ENEMY
         else:
-            self.rivals = self.window.player_list
+            self.side_list = self.simulation.enemy_list
+            self.rivals = self.simulation.player_list
+            self.rivals_allegiance = PLAYER
+
+        # A unit far from the enemy collapses into a single block. Its
+        # soldiers leave the side list and the space, and stand still and
+        # hold their fire until it expands again.
+        self.collapsed = False
+        self.reserve = SpriteList(lazy=True)
+
+        self.rows = None
+
+        self.expanded_tick = 0 # Tick the unit last expanded
         
         self.width = (len(formation[1]) + 1) * SOLDIER_SPACING# Soldier width
         self.height = (len(formation) + 1) * SOLDIER_SPACING
@@ -65,65 +80,197 @@ class Unit(EventDispatcher):
                 soldier.x = col + self._x
                 soldier.y = self._y - row
 
-                if self.allegiance == PLAYER: self.window.player_list.append(soldier)
-                else: self.window.enemy_list.append(soldier)
+                soldier.attach()
+
+                soldier.unit = self
+                self.simulation.roster.enlist(soldier)
+
+                if self.allegiance == PLAYER: self.simulation.player_list.append(soldier)
+                else: self.simulation.enemy_list.append(soldier)
 
                 self.soldiers.append(soldier)
         
-        self.keys = Keys()
+        self.simulation.units.append(self)
 
-        self.window.push_handlers(self)
-        self.window.units.append(self)
+    def _get_headcount(self):
+        return self.simulation.roster.unit(self).alive
+
+    def _get_ammo(self):
+        return self.simulation.roster.unit(self).arrows
+
+    def _get_strength(self):
+        rows = [soldier.index for soldier in self.soldiers]
+
+        return int(self.simulation.store.strength[rows].sum())
+
+    headcount = property(_get_headcount)
+    ammo = property(_get_ammo)
+    strength = property(_get_strength)
+
+    def collapse(self):
+        """Collapse the unit into a single block. Soldiers keep their rows
+        in the store, so they are still counted and aimed at, but they are no
+        longer updated one by one or simulated by pymunk. Only units standing
+        still collapse, so the block does not move.
+        """
+
+        if self.collapsed or not self.soldiers:
+            return
+
+        store = self.simulation.store
+
+        self.rows = asarray([soldier.index for soldier in self.soldiers], intp)
+
+        store.reserve[self.rows] = True
+
+        remove_sprites(self.side_list, set(self.soldiers))
+
+        for soldier in self.soldiers:
+            soldier.detach()
+            soldier.target = None
+
+            self.reserve.append(soldier)
+
+        self.collapsed = True
+
+    def expand(self):
+        """Expand a collapsed unit back into individual soldiers, placed
+        where they stood in the block.
+        """
+
+        if not self.collapsed:
+            return
+
+        store = self.simulation.store
+        store.reserve[self.rows] = False
+
+        self.reserve.clear()
 
-    def on_volley(self):
         for soldier in self.soldiers:
-            if soldier.health > 0 and soldier.archer and soldier.arrows:
-                arrow = Arrow(soldier, choice(soldier.rivals))
-                arrow = Arrow(soldier, choice(soldier.rivals))
+            soldier.set_position(float(store.x[soldier.index]),
+                                 float(store.y[soldier.index]))
+            soldier.body.position = soldier.position
+            soldier.attach()
+
+            self.side_list.append(soldier)
+
+        self.rows = None
+        self.collapsed = False
+
+        self.expanded_tick = self.simulation.ticks
+
+    def _get_engaged(self):
+        """Check if any soldier of a collapsed unit is within engagement range
+        of a rival, using the distances found by the rival index this tick.
+
+        returns: bool
+        """
+
+        index = self.simulation.rival_index
+        rows = self.rows
+
+        found = index.nearest[rows] >= 0
+
+        if not found.any():
+            return False
+
+        return index.distance[rows][found].min() < LOD_ENGAGEMENT_RANGE
+
+    def _get_reserved(self):
+        """Check if every soldier of the unit is far from the enemy and
+        standing still, and the unit has not just expanded, so it can
+        collapse.
+
+        returns: bool
+        """
+
+        if self.simulation.ticks - self.expanded_tick < LOD_COOLDOWN:
+            return False
+
+        store = self.simulation.store
+        index = self.simulation.rival_index
+
+        rows = [soldier.index for soldier in self.soldiers]
+
+        if not rows or max(rows) >= len(index.nearest):
+            return False # Wiped out, or some soldiers are not indexed yet
+
+        found = index.nearest[rows] >= 0
+
+        if found.any() and \
+            index.distance[rows][found].min() < LOD_COLLAPSE_RANGE:
+            return False
+
+        return not (store.vx[rows].any() or store.vy[rows].any())
+
+    engaged = property(_get_engaged)
+    reserved = property(_get_reserved)
+
+    def on_volley(self):
+        archers = [soldier for soldier in self.soldiers
+                   if soldier.health > 0 and soldier.archer and soldier.arrows]
+
+        # Two arrows each, launched over the next few ticks
+        self.simulation.volleys.schedule(archers * 2)
     
     def on_split(self):
+        self.expand()
+
         for soldier in self.soldiers:
-            soldier.target = choice(soldier.rivals)
+            # Soldiers of a collapsed rival unit can only be found through
+            # the rival index
+            soldier.target = soldier.pick_target()
 
     def check_collision(self, x, y):
         return (0 < x - self.x < self.width and
                 0 < y - self.y < self.height)
     
     def draw(self):
-        if self.window.current_unit == self:
+        if self.collapsed:
+            self.reserve.draw()
+
+        if self.simulation.current_unit == self:
             draw_rectangle_outline(
-                self.window.current_unit.x,
-                self.window.current_unit.y,
-                self.window.current_unit.width,
-                self.window.current_unit.height,
+                self.x,
+                self.y,
+                self.width,
+                self.height,
                 RED
             )
     
     def on_mouse_press(self, x, y, buttons, modifiers):
         if self.check_collision(x, y):
             if self.allegiance == PLAYER:
-                self.window.current_unit = self
+                self.simulation.command("select",
+                                        self.simulation.units.index(self))
     
     def on_update(self, delta):
-        for soldier in self.soldiers:
-            if not soldier.health:
-                self.soldiers.remove(soldier)
+        if self.collapsed:
+            if self.engaged:
+                self.expand()
+
+        elif self.reserved:
+            self.collapse()
 
-        fire = False
+        roster = self.simulation.roster
 
-        for enemy in self.rivals:
-            if enemy.health > 0: # Enemy still alive
-                fire = True
-                break
+        alive = roster.unit(self).alive
 
-        if fire and self.soldiers:
-            soldier = choice(self.soldiers)
-            if soldier.archer: rate = 2000 / len(self.soldiers)
-            if soldier.light_infantry: rate = 3000 / len(self.soldiers)
+        # A collapsed unit holds its fire, as its soldiers are not on the
+        # battlefield to shoot from
+        if alive and roster.side(self.rivals_allegiance).alive and \
+            not self.collapsed:
+            soldier = self.simulation.rng.choice(self.soldiers)
+            if soldier.archer:
+                rate = ARCHER_ATTACK_RATE / alive
+            if soldier.light_infantry:
+                rate = LIGHT_INFANTRY_ATTACK_RATE / alive
+            if soldier.heavy_infantry:
+                rate = HEAVY_INFANTRY_ATTACK_RATE / alive
 
-            if len(self.window.projectile_list) < 50: # Fewer than twenty arrows
-                if random() < 1 / rate:     #
+            if self.simulation.volleys.room:
+                if self.simulation.rng.random() < 1 / rate:     #
                     soldier.on_attack() # Fire
 
-        if not self.window.current_unit == self:
+        if not self.simulation.current_unit == self:
             return
@@ -2,8 +2,7 @@
 
 import os
 import sys
-from math import atan2, cos, sin
-from random import choice, randint
+from math import cos, sin
 
 from arcade import load_texture
 from pymunk import ShapeFilter
@@ -14,137 +13,141 @@ parent = os.path.dirname(current)
 sys.path.append(parent)
 
 from color import RED
-from constants import (ARROW_ACCURACY, ARROW_MAXIMUM_ARCHER_SPEED,
-                       ARROW_MAXIMUM_SPEED, ARROW_MINIMUM_SPEED, ENEMY, MELEE,
-                       MELEE_RANGE, MELEE_RANGE_CHANCE, PLAYER, RANGE,
-                       SOLDIER_MELEE_REACH)
+from constants import (ARCHER, ARROW_ACCURACY, ARROW_MAXIMUM_ARCHER_SPEED,
+                       ARROW_MAXIMUM_SPEED, ARROW_MINIMUM_SPEED, ENEMY,
+                       HEAVY_INFANTRY, LIGHT_INFANTRY, MELEE, MELEE_RANGE,
+                       MELEE_RANGE_CHANCE, PLAYER, RANGE, SOLDIER_MELEE_REACH)
 from file import projectile, soldier
-from geometry import Point, chance, get_closest
+from simulation import get_simulation
 from sprite import PhysicsObject
+from store import ALLEGIANCES
 
 
 class Arrow(PhysicsObject):
 
-    def __init__(self, shooter, target):
+    def __init__(self, shooter=None, target=None):
 
         """Initiate arrows.
 
         Arrows start with a speed of zero, then speed up as they make their way to
         their target. They evantually slow down as a result of drag.
+
+        Arrows are recycled by the simulation's ArrowPool, so an arrow is
+        created idle, without its body in the space, and fired with launch.
+        Use the pool's acquire instead of creating arrows directly.
+
+        shooter - soldier firing the arrow. If given, the arrow is launched
+                  immediately.
+        target - soldier the arrow is aimed at
         """
 
         PhysicsObject.__init__(
-            self, projectile["arrow"], 0.8, mass=0.13, type=2)
-
-        self.x = shooter.x
-        self.y = shooter.y
+            self, projectile["arrow"], 0.8, mass=0.13, type=2,
+            world=get_simulation(), attach=False)
 
         self.rot_speed = 2**32
 
-        self.shooter = shooter
-        self.target = target
-
-        self.accuracy = 0
-        self.speed = randint(ARROW_MINIMUM_SPEED, ARROW_MAXIMUM_SPEED)
-
-        self.shooter.arrows -= 1
-
         self.collision_type = 2
 
-        self.accuracy_x = randint(-ARROW_ACCURACY, ARROW_ACCURACY)
-        self.accuracy_y = randint(-ARROW_ACCURACY, ARROW_ACCURACY)
+        self.shooter = None
+        self.target = None
 
-        if self.shooter.archer:
-            self.speed = ARROW_MAXIMUM_ARCHER_SPEED
+        self.slot = None # Row in the projectile system while in flight
 
-            self.accuracy_x = randint(
-                int(-ARROW_ACCURACY / 2), int(ARROW_ACCURACY / 2))
-            self.accuracy_y = randint(
-                int(-ARROW_ACCURACY / 2), int(ARROW_ACCURACY / 2))
+        if shooter:
+            self.launch(shooter, target)
 
-        self.point = Point(self.target.x + self.accuracy_x,
-                           self.target.y + self.accuracy_y)
+    def launch(self, shooter, target):
+        """Fire the arrow from a shooter at a target. This resets everything
+        left over from a previous flight, adds the body back to the space and
+        the arrow to the projectile list.
 
-        if self.shooter.allegiance == PLAYER:
-            self.shape.filter = ShapeFilter(categories=0b0010, mask=0b1101)
+        shooter - soldier firing the arrow
+        target - soldier the arrow is aimed at
 
-        if self.shooter.allegiance == ENEMY:
-           self.shape.filter = ShapeFilter(categories=0b0001, mask=0b1110)
+        parameters: Soldier, Soldier
+        """
 
-        self.destination_point = self.point.x, self.point.y
+        self.set_position(shooter.x, shooter.y)
 
-        self.window.projectile_list.append(self)
+        self.accuracy = 0
+        speed = self.world.rng.randint(ARROW_MINIMUM_SPEED, ARROW_MAXIMUM_SPEED)
 
-    def update(self):
-        PhysicsObject.update(self)
+        shooter.arrows -= 1
+        self.world.roster.shoot(shooter)
 
-        if self.speed > 5:
-            self.speed -= 5
+        self.accuracy_x = self.world.rng.randint(-ARROW_ACCURACY,
+                                                 ARROW_ACCURACY)
+        self.accuracy_y = self.world.rng.randint(-ARROW_ACCURACY,
+                                                 ARROW_ACCURACY)
 
-        dest_x = self.point.x
-        dest_y = self.point.y
+        if shooter.archer:
+            speed = ARROW_MAXIMUM_ARCHER_SPEED
 
-        x_diff = dest_x - self.shooter.x
-        y_diff = dest_y - self.shooter.y
-        angle = atan2(y_diff, x_diff)
+            self.accuracy_x = self.world.rng.randint(
+                int(-ARROW_ACCURACY / 2), int(ARROW_ACCURACY / 2))
+            self.accuracy_y = self.world.rng.randint(
+                int(-ARROW_ACCURACY / 2), int(ARROW_ACCURACY / 2))
 
-        force = [cos(angle), sin(angle)]
+        # Coming under fire brings a collapsed unit back into the battle
+        if target.unit.collapsed:
+            target.unit.expand()
 
-        # Taking into account the angle, calculate our force.
-        force[0] *= self.speed
-        force[1] *= self.speed
+        self.fly(shooter, target, (target.x + self.accuracy_x,
+                                   target.y + self.accuracy_y), speed)
 
-        self.force = force
+    def fly(self, shooter, target, point, speed):
+        """Put the arrow in flight from where it is towards an aim point,
+        without rolling anything or counting the shot. This is the end of
+        launch, and is also used to restore arrows from a snapshot.
 
-        # arrow_player_collision = check_for_collision_with_list(self, self.window.player_list)
-        # arrow_enemy_collision = check_for_collision_with_list(self, self.window.enemy_list)
+        shooter - soldier that fired the arrow
+        target - soldier the arrow is aimed at
+        point - aim point of the arrow
+        speed - speed the arrow was fired at
 
-        # for soldier in self.collisions:
-        #     if self.shooter.allegiance == ENEMY:
-        #         damage = abs(max(self.force)) / ARROW_DAMAGE_LOSS
-        #         if not damage:
-        #             damage = 1 # Even slow arrows cause damage
+        parameters: Soldier, Soldier, tuple, int
+        """
 
-        #         soldier.wound(damage * ARROW_DAMAGE)
+        self.shooter = shooter
+        self.target = target
 
-        #         if soldier.health:
-        #             arrow = PhysicsObject(
-        #                 projectile["arrow"],
-        #                 0.7
-        #             )
+        self.stopped = False
+        self.force = [0, 0]
 
-        #             arrow.x, arrow.y = self.x, self.y
-        #             arrow.angle = self.angle
+        self.body.position = self.position
+        self.body.velocity = (0, 0)
+        self.body.angle = 0
+        self.body.angular_velocity = 0
 
-        #             self.remove()
+        # A pooled arrow's shape is still where its last flight ended
+        self.shape.cache_bb()
 
-        # for soldier in arrow_enemy_collision:
-        #     if self.shooter.allegiance == PLAYER:
-        #         damage = abs(max(self.force))
-        #         if not damage:
-        #             damage = 1 # Even slow arrows cause damage
+        self.speed = speed
+        self.point = point
 
-        #         soldier.wound(damage * ARROW_DAMAGE)
+        if self.shooter.allegiance == PLAYER:
+            self.shape.filter = ShapeFilter(categories=0b0010, mask=0b1101)
 
-        #         # print(damage, ARROW_DAMAGE)
+        if self.shooter.allegiance == ENEMY:
+           self.shape.filter = ShapeFilter(categories=0b0001, mask=0b1110)
 
-        #         # print(self.force)
-        #         if soldier.health:
-        #             arrow = PhysicsObject(
-        #                 projectile["arrow"],
-        #                 0.7
-        #             )
+        self.destination_point = self.point
 
-        #             arrow.x, arrow.y = self.x, self.y
-        #             arrow.angle = self.angle
+        self.attach()
+        self.world.projectile_list.append(self)
+        self.world.projectiles.add(self, *self.point, self.speed)
 
-        #             self.remove()
+    def remove(self):
+        """Take the arrow out of flight and give it back to the pool."""
 
-        if self.bottom > self.window.height or \
-            self.top < 0 or \
-            self.left > self.window.width or \
-            self.right < 0:
-            self.remove()
+        self.world.projectiles.remove(self)
+        self.world.arrows.release(self)
+
+    def update(self):
+        """Arrows in flight are moved and culled all at once by the
+        simulation's ProjectileSystem, so there is nothing to do per arrow.
+        """
 
 
 class Soldier(PhysicsObject):
@@ -162,6 +165,11 @@ class Soldier(PhysicsObject):
             * Heavy infantry        - Heavily armored but slower foot soldiers
             * Archer                - Soldiers that can fire arrows at enemy
 
+        The battle state of a soldier is not kept on the sprite. It is a view
+        over one row of the simulation's SoldierStore, so health, strength,
+        arrows, allegiance, type, position and velocity are read from and
+        written to the store's columns.
+
         allegiance - allegiance of the soldier
         rivals - rivals of the soldier
         light_infantry - soldier is light infantry
@@ -174,19 +182,29 @@ class Soldier(PhysicsObject):
         else:
             image = soldier["enemy_light_infantry"]
 
-        PhysicsObject.__init__(self, image, 0.5, mass=145, type=1)
+        if archer:
+            kind = ARCHER
+        elif heavy_infantry:
+            kind = HEAVY_INFANTRY
+        elif light_infantry:
+            kind = LIGHT_INFANTRY
+        else:
+            kind = 0
 
-        self.allegiance = allegiance
-        self.rivals = rivals
+        # The row must exist before the sprite is positioned
+        self.store = get_simulation().store
+        self.index = self.store.add(self, allegiance, kind)
 
-        self.light_infantry = light_infantry
-        self.heavy_infantry = heavy_infantry
-        self.archer = archer
+        # Attached by the unit once the soldier stands in formation
+        PhysicsObject.__init__(self, image, 0.5, mass=145, type=1,
+                               world=get_simulation(), attach=False)
+
+        self.rivals = rivals
 
         self.hands = (None, "bow")
 
         self.arrows = 24
-        self.strength = randint(70, 100)
+        self.strength = self.world.rng.randint(70, 100)
 
         self.target = None
         self.health = 100
@@ -215,24 +233,97 @@ class Soldier(PhysicsObject):
             self.append_texture(load_texture(
                 soldier["enemy_light_infantry_dead"]))
 
+    def _set_x(self, x):
+        PhysicsObject._set_x(self, x)
+
+        self.store.x[self.index] = x
+
+    def _set_y(self, y):
+        PhysicsObject._set_y(self, y)
+
+        self.store.y[self.index] = y
+
+    def set_position(self, x, y):
+        PhysicsObject.set_position(self, x, y)
+
+        self.store.x[self.index] = x
+        self.store.y[self.index] = y
+
+    def _get_change_x(self):
+        return float(self.store.vx[self.index])
+
+    def _set_change_x(self, change_x):
+        self.store.vx[self.index] = change_x
+
+    def _get_change_y(self):
+        return float(self.store.vy[self.index])
+
+    def _set_change_y(self, change_y):
+        self.store.vy[self.index] = change_y
+
+    def _get_health(self):
+        return float(self.store.health[self.index])
+
+    def _set_health(self, health):
+        self.store.health[self.index] = health
+
+    def _get_strength(self):
+        return int(self.store.strength[self.index])
+
+    def _set_strength(self, strength):
+        self.store.strength[self.index] = strength
+
+    def _get_arrows(self):
+        return int(self.store.arrows[self.index])
+
+    def _set_arrows(self, arrows):
+        self.store.arrows[self.index] = arrows
+
+    def _get_allegiance(self):
+        return ALLEGIANCES[self.store.side[self.index]]
+
+    def _get_light_infantry(self):
+        return self.store.kind[self.index] == LIGHT_INFANTRY
+
+    def _get_heavy_infantry(self):
+        return self.store.kind[self.index] == HEAVY_INFANTRY
+
+    def _get_archer(self):
+        return self.store.kind[self.index] == ARCHER
+
+    x = property(PhysicsObject._get_x, _set_x)
+    y = property(PhysicsObject._get_y, _set_y)
+    change_x = property(_get_change_x, _set_change_x)
+    change_y = property(_get_change_y, _set_change_y)
+    health = property(_get_health, _set_health)
+    strength = property(_get_strength, _set_strength)
+    arrows = property(_get_arrows, _set_arrows)
+    allegiance = property(_get_allegiance)
+    light_infantry = property(_get_light_infantry)
+    heavy_infantry = property(_get_heavy_infantry)
+    archer = property(_get_archer)
+
     def wound(self, amount):
         self.color = RED
         self.health -= amount
 
+        self.world.roster.wound(self)
+
     def knockback(self, strength):
         self.reverse(strength)
 
-        self.x += self.change_x
-        self.y += self.change_y
+        self.set_position(self.x + self.change_x, self.y + self.change_y)
 
     def on_attack(self):
-        distance = get_closest(self, self.rivals)
+        distance = self.world.rival_index.get_closest(self)
 
-        if chance(5):
+        # Fatigue is rolled for every soldier at once each tick
+        if self.world.fatigue[self.index]:
             self.strength -= 1
 
-        if distance[1] < randint(MELEE_RANGE - MELEE_RANGE_CHANCE,
-                                 MELEE_RANGE + MELEE_RANGE_CHANCE):
+        if distance[1] < self.world.rng.randint(
+            MELEE_RANGE - MELEE_RANGE_CHANCE,
+            MELEE_RANGE + MELEE_RANGE_CHANCE):
             self.weapon = MELEE
 
             if distance[1] < MELEE_RANGE:
@@ -241,14 +332,33 @@ class Soldier(PhysicsObject):
         else:
             self.weapon = RANGE
 
-            if self.arrows:
-                arrow = Arrow(self, choice(self.rivals))
+            target = self.pick_target()
+
+            if self.arrows and target:
+                self.world.arrows.acquire(self, target)
+
+    def pick_target(self):
+        """Pick a rival to shoot at. This is any rival on the battlefield, or
+        the closest one if every rival is held in a collapsed unit.
+
+        returns: Soldier or None (if there are no rivals left)
+        """
+
+        if self.rivals:
+            return self.world.rng.choice(self.rivals)
+
+        closest = self.world.rival_index.get_closest(self)[0]
+
+        if closest is not self:
+            return closest
+
+        return None
 
     def on_melee(self):
         distance = 2**32
 
         if not self.target:
-            self.target, distance = get_closest(self, self.rivals)
+            self.target, distance = self.world.rival_index.get_closest(self)
 
         # Thrust with sword
         if distance < SOLDIER_MELEE_REACH:
@@ -264,11 +374,7 @@ class Soldier(PhysicsObject):
         #         pass
 
         if self.health <= 0:
-            self.set_texture(1)
-            self.health = 0
-
-            self.remove()
-            self.window.dead_list.append(self)
+            self.world.kill(self) # Cleared away at the end of the update
 
             return
 
@@ -283,9 +389,6 @@ class Soldier(PhysicsObject):
                 sin(self.radians) * -self.strength / 10
             )
 
-        if chance(1000):
-            self.health += 1
-
         if self.target:
-            if get_closest(self, self.rivals)[1] < MELEE_RANGE:
+            if self.world.rival_index.get_closest(self)[1] < MELEE_RANGE:
                 self.follow(self.target, rate=5, speed=1.5)
@@ -0,0 +1,143 @@
+"""Volley scheduler. Firing a whole volley in one tick launches thousands of
+arrows at once and drops frames. Instead, shots are queued and launched a
+few at a time over several ticks, within a budget per tick and a ceiling on
+the number of arrows in flight. The ceiling backs off when frames run late
+and creeps back up while they are on time.
+
+>>> volleys = VolleyScheduler(simulation)
+>>> volleys.schedule(archers * 2)
+>>> volleys.update() # Every tick
+"""
+
+import os
+import sys
+from collections import deque
+from math import ceil
+
+current = os.path.dirname(os.path.realpath(__file__))
+parent = os.path.dirname(current)
+
+sys.path.append(parent)
+
+from constants import (FRAME_TIME_SMOOTHING, PROJECTILE_CEILING,
+                       PROJECTILE_CEILING_BACKOFF, PROJECTILE_CEILING_MAXIMUM,
+                       PROJECTILE_CEILING_MINIMUM, PROJECTILE_CEILING_STEP,
+                       SIMULATION_STEP, VOLLEY_BUDGET, VOLLEY_FRAMES)
+
+
+class VolleyScheduler:
+    """Queued shots of volleys, launched over the following ticks. Targets
+    are picked when a shot is launched, so arrows are not wasted on soldiers
+    killed while the volley was waiting.
+    """
+
+    def __init__(self, simulation, frames=VOLLEY_FRAMES, budget=VOLLEY_BUDGET,
+                 ceiling=PROJECTILE_CEILING):
+        """Create an empty volley scheduler.
+
+        simulation - simulation the arrows are fired in
+        frames - number of ticks a volley is spread over
+        budget - most arrows launched by volleys in a single tick
+        ceiling - most arrows in flight at once, before adapting to the
+                  frame time
+
+        parameters: BattleSimulation, int, int, int
+        """
+
+        self.simulation = simulation
+
+        self.frames = frames
+        self.budget = budget
+        self.ceiling = ceiling
+
+        self.pending = deque() # Soldiers waiting to fire, one per arrow
+        self.rate = 0 # Arrows launched per tick for the queued volleys
+
+        self.frame_time = SIMULATION_STEP # Average time of recent frames
+
+    def __len__(self):
+        """Get the number of shots waiting to be launched.
+
+        returns: int
+        """
+
+        return len(self.pending)
+
+    def _get_room(self):
+        """Get the number of arrows that can still be put in flight under the
+        ceiling.
+
+        returns: int
+        """
+
+        return max(self.ceiling - len(self.simulation.projectiles), 0)
+
+    room = property(_get_room)
+
+    def schedule(self, shooters):
+        """Queue a volley. Each shooter fires one arrow per time it appears,
+        so a soldier firing twice should be given twice.
+
+        shooters - soldiers firing the volley
+
+        parameters: list
+        """
+
+        self.pending.extend(shooters)
+
+        self.rate = ceil(len(self.pending) / self.frames)
+
+    def adapt(self, frame_time):
+        """Adjust the ceiling to the time the last frame took. This should be
+        called by whatever draws the battle, once per frame. Headless runs
+        never adapt, and changes are recorded as commands, so a battle
+        launches the same arrows every time it is replayed.
+
+        frame_time - time the last frame took in seconds
+
+        parameters: float
+        """
+
+        self.frame_time += (frame_time - self.frame_time) * FRAME_TIME_SMOOTHING
+
+        ceiling = self.ceiling
+
+        if self.frame_time > self.simulation.step * 1.25:
+            ceiling = int(ceiling * PROJECTILE_CEILING_BACKOFF)
+        elif self.frame_time <= self.simulation.step:
+            ceiling += PROJECTILE_CEILING_STEP
+
+        ceiling = min(max(ceiling, PROJECTILE_CEILING_MINIMUM),
+                      PROJECTILE_CEILING_MAXIMUM)
+
+        # Set as a command, so replays launch the same arrows
+        if ceiling != self.ceiling:
+            self.simulation.command("ceiling", ceiling)
+
+    def update(self):
+        """Launch this tick's share of the queued shots. Shooters that died
+        or ran out of arrows while waiting, or have nobody left to aim at,
+        are skipped without using up the budget.
+        """
+
+        if not self.pending:
+            return
+
+        alive = self.simulation.store.alive
+
+        launches = min(self.rate, self.budget, self.room)
+
+        while launches and self.pending:
+            shooter = self.pending.popleft()
+
+            if not alive[shooter.index] or not shooter.arrows:
+                continue
+
+            target = shooter.pick_target()
+
+            if not target:
+                continue
+
+            self.simulation.arrows.acquire(shooter, target)
+
+            launches -= 1
@@ -0,0 +1,46 @@
+"""Helpers shared by the benchmarks of the game and its toolkit: the battle
+simulation in battlefield/benchmark.py, the widgets in widgets_benchmark.py
+and the geometry module in geometry_benchmark.py.
+"""
+
+import os
+from math import ceil
+from subprocess import DEVNULL, CalledProcessError, check_output
+
+current = os.path.dirname(os.path.realpath(__file__))
+
+
+def get_commit():
+    """Get the commit the code being benchmarked is at.
+
+    returns: str or None (outside a git checkout)
+    """
+
+    try:
+        return check_output(["git", "rev-parse", "HEAD"], cwd=current,
+                            stderr=DEVNULL, text=True).strip()
+    except (OSError, CalledProcessError):
+        return None
+
+def percentile(values, share):
+    """Get a percentile of some values, by the nearest rank.
+
+    values - sorted values
+    share - percentile, between 0 and 1
+
+    parameters: list, float
+    returns: float
+    """
+
+    if not values:
+        return 0
+
+    return values[min(ceil(share * len(values)) - 1, len(values) - 1)]
+
+def use_software_rendering():
+    """Have Mesa render OpenGL on the CPU with llvmpipe, whatever GPU the
+    machine has. This must be called before the first window is created.
+    """
+
+    os.environ["LIBGL_ALWAYS_SOFTWARE"] = "1"
+    os.environ["GALLIUM_DRIVER"] = "llvmpipe"
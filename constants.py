@@ -20,6 +20,14 @@ FOCUS_SIZE = 1.05 # [DEPRECATED]
 X = 0
 Y = 0
 
+# Distance units
+PX = "px"
+PT = "pt"
+PC = "pc"
+IN = "in"
+MM = "mm"
+CM = "cm"
+
 ENTRY_BLINK_INTERVAL = 0.5 # Interval in seconds the caret blinks in an entry
 
 TOGGLE_VELOCITY = 2 # How fast the knob moves in a toggle
@@ -65,13 +73,63 @@ ARROW_MINIMUM_SPEED = 70
 ARROW_MAXIMUM_SPEED = 90
 ARROW_MAXIMUM_ARCHER_SPEED = 120
 ARROW_SPEED_LOSS = 20
+ARROW_SPEED_DECAY = 5 # Speed lost by an arrow in flight every tick
 ARROW_DAMAGE = 10
 ARROW_DAMAGE_LOSS = 2
 ARROW_KNOCKBACK = 3
+ARROW_POOL_SIZE = 512 # Idle arrows kept for reuse
+
+# A unit fires once in this many ticks for each of its living soldiers, going
+# by the soldier picked to fire. Heavy infantry fires 10 / 7 as often as light
+# infantry, like in the README.
+ARCHER_ATTACK_RATE = 2000
+LIGHT_INFANTRY_ATTACK_RATE = 3000
+HEAVY_INFANTRY_ATTACK_RATE = 2100
+
+VOLLEY_FRAMES = 8 # Ticks a volley is spread over
+VOLLEY_BUDGET = 64 # Most arrows launched by volleys in a single tick
+PROJECTILE_CEILING = 1000 # Arrows allowed in flight at once
+PROJECTILE_CEILING_MINIMUM = 50
+PROJECTILE_CEILING_MAXIMUM = 4000
+PROJECTILE_CEILING_STEP = 25 # Raised by this while frames are on time
+PROJECTILE_CEILING_BACKOFF = 0.75 # Multiplied by this when frames run late
+FRAME_TIME_SMOOTHING = 0.1 # Weight of the newest frame in the average
+
+PROFILER_HISTORY = 300 # Frames kept in the rolling histograms of the profiler
+PROFILER_REFRESH = 15 # Frames between refreshes of the profiler overlay
+# Upper edges of the histogram bins of the profiler in milliseconds
+PROFILER_BINS = (0.25, 0.5, 1, 2, 4, 8, 16, 32)
+TRACE_CAPACITY = 1 << 16 # Spans kept by a tracer, the oldest dropped first
+
+# Most sprites checked for collisions one by one before the GPU is used, and
+# the fewest that are looked up in a spatial hash. These were calibrated by
+# geometry_benchmark.py --calibrate with llvmpipe, and are only used until it
+# measures them for the machine.
+COLLISION_GPU_THRESHOLD = 61
+COLLISION_SPATIAL_THRESHOLD = 0
+
+# Soldier types, as used in formations
+LIGHT_INFANTRY = 1
+HEAVY_INFANTRY = 2
+ARCHER = 3
+COMMANDER = 4
+
+SOLDIER_STORE_CAPACITY = 4096 # Rows allocated up front for soldier state
+RIVAL_INDEX_CELL_TARGETS = 2 # Rivals per cell in the nearest-rival grid
+RIVAL_INDEX_BRUTE_FORCE = 32 # Most rivals checked by every soldier directly
+
+# Units further than this from every rival collapse into a single block...
+LOD_COLLAPSE_RANGE = 250
+# ...and expand back into soldiers when a rival comes this close
+LOD_ENGAGEMENT_RANGE = 150
+LOD_COOLDOWN = 120 # Ticks a unit stays expanded, long enough for arrows to land
 
 SOLDIER_MOVE_UP_FORCE = 10
 SOLDIER_MOVE_DOWN_FORCE = -10
 
+SIMULATION_STEP = 1 / 60.0 # Length of one simulation tick in seconds
+SIMULATION_MAX_STEPS = 5 # Most ticks run to catch up in a single frame
+
 WINDOW_WIDTH = 1300
 WINDOW_HEIGHT = 900
 WINDOW_TITLE = "Simulation"
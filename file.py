@@ -59,6 +59,9 @@ colorchooser = f"{gui_image_path}colorchooser.png"
 
 none = f"{image_path}application/none.png"
 
+# Collision thresholds measured for this machine by geometry_benchmark.py
+collision_calibration = f"{path}collision.json"
+
 arrow_trail = f"{image_path}objects/projectiles/arrow_trail.png"
 
 soldier = {
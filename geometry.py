@@ -6,24 +6,30 @@ TODO: Add more features to Points
 """
 
 from cmath import cos, sin
+from json import dump, load
 from math import atan2, degrees, hypot, pow, radians, sqrt
 from operator import neg, pos
+import random as _random
 from random import random, randrange, uniform
 from re import compile
 from struct import unpack
-from sys import modules
 from typing import List, Tuple, cast
 
 from arcade import Sprite, SpriteList, get_window, unschedule
 
 from color import BLACK
-from constants import CM, IN, MM, PC, PT, PX
+from constants import (CM, COLLISION_GPU_THRESHOLD,
+                       COLLISION_SPATIAL_THRESHOLD, IN, MM, PC, PT, PX)
+from file import collision_calibration
 
 points = 0 # Number of points to create unique keysets
 pi = 3.14159265358979
 
 pointlist = []
 
+# Crossover counts of the collision methods, loaded on the first collision
+collision_thresholds = None
+
 __all__ = [
            "Point",
            "square",
@@ -33,6 +39,8 @@ __all__ = [
            "are_polygons_intersecting",
            "is_point_in_polygon",
            "check_collision",
+           "get_collision_thresholds",
+           "save_collision_thresholds",
            "get_distance",
            "get_closest",
            "rotate_point",
@@ -883,16 +891,18 @@ def parse_distance(distance, dpi=96):
 
     else: raise_distance_decoding_error(distance)
 
-def chance(value):
+def chance(value, rng=None):
     """Return True or False in a 1-in-value chance.
 
     value - chance of returning True
+    rng - random number generator to draw from, like a battle's BattleRandom.
+          Defaults to the global random module.
 
-    parameters: int
+    parameters: int, Random
     returns: bool
     """
 
-    if randrange(1, value + 1) == 2:
+    if (rng or _random).randrange(1, value + 1) == 2:
         return True
     else:
         return False
@@ -963,27 +973,23 @@ def is_point_in_polygon(point, polygon, shapely=True):
 
     length = len(polygon)
     inside = False
-    p1x, p1y = polygon[0]
 
     if not length:
         return False
 
     if shapely:
-        if "shapely" in modules():
-            from shapely import Point as Point_
-            from shapely import Polygon as Polygon_
-            from shapely.speedups import enable, enabled
-
-            if not enabled:
-                enable()
-
-            point = Point_(point.position)
-            polygon = Polygon_(polygon)
+        try:
+            from shapely.geometry import Point as Point_
+            from shapely.geometry import Polygon as Polygon_
+        except ImportError:
+            pass
+        else:
+            return Polygon_(polygon).contains(Point_(point.x, point.y))
 
-            return polygon.contains(point)
+    p1x, p1y = polygon[0]
 
     for i in range(length + 1):
-        p2x, p2y = points[i % length]
+        p2x, p2y = polygon[i % length]
 
         if point.y > min(p1y, p2y):
             if point.y <= max(p1y, p2y):
@@ -1048,7 +1054,7 @@ def _check_collision(a, b):
 def get_nearby_sprites(object, list):
     """Internal function used by GPU collision check.
 
-    object - object to get nearby objects
+    object - sprite to get nearby objects, like an Object or PhysicsObject
     list - list of nearby objects
 
     parameters: Object, PhysicsObject
@@ -1064,7 +1070,8 @@ def get_nearby_sprites(object, list):
     ctx = get_window().ctx
     list._write_sprite_buffers_to_gpu()
 
-    ctx.collision_detection_program["check_pos"] = object.x, object.y
+    ctx.collision_detection_program["check_pos"] = (object.center_x,
+                                                    object.center_y)
     ctx.collision_detection_program["check_size"] = object.width, object.height
 
     # Ensure the result buffer can fit all the sprites (worst case)
@@ -1122,6 +1129,10 @@ def check_collision(a, b, type=None, method=0):
         2: GPU based (recommended with 1,500+ objects)
         3: Simple-check
 
+    The counts used by automatic select depend a lot on the machine. Running
+    geometry_benchmark.py --calibrate measures them and saves them, and they
+    are used instead from then on. See get_collision_thresholds.
+
     a - first item to check collision with
     b - second item to check collision with
     type - optional type of collsions
@@ -1150,10 +1161,21 @@ def check_collision(a, b, type=None, method=0):
         return _check_collision(a, b)
 
     elif double:
-        if b.spatial_hash and (method == 1 or method == 0):
+        if method == 0:
+            thresholds = get_collision_thresholds()
+
+            if b.spatial_hash and thresholds["spatial"] is not None and \
+               len(b) >= thresholds["spatial"]:
+                method = 1
+            elif thresholds["gpu"] is None or len(b) <= thresholds["gpu"]:
+                method = 3
+            else:
+                method = 2
+
+        if b.spatial_hash and method == 1:
         # Spatial
             b_ = b.spatial_hash.get_objects_for_box(a)
-        elif method == 3 or (method == 0 and len(b) <= 1500):
+        elif method == 3:
             b_ = b  # type: ignore
         else:
             # GPU transform
@@ -1258,6 +1280,57 @@ def get_closest(object, list, regular=True):
 
     return list[position], distance
 
+def get_collision_thresholds():
+    """Get the crossover counts used to select a method of checking
+    collisions automatically. These are read from the calibration saved by
+    geometry_benchmark.py, or the defaults in constants are used if there is
+    none. The file is only read once.
+
+    gpu - most sprites checked one by one before the GPU is used. None if
+          the GPU is never faster.
+    spatial - fewest sprites looked up in a spatial hash. None if the hash is
+              never faster.
+
+    returns: dict (with gpu and spatial keys)
+    """
+
+    global collision_thresholds
+
+    if collision_thresholds is None:
+        collision_thresholds = {
+            "gpu" : COLLISION_GPU_THRESHOLD,
+            "spatial" : COLLISION_SPATIAL_THRESHOLD,
+        }
+
+        try:
+            with open(collision_calibration) as file:
+                calibration = load(file)
+        except (OSError, ValueError):
+            calibration = {}
+
+        for key in collision_thresholds:
+            if key in calibration:
+                collision_thresholds[key] = calibration[key]
+
+    return collision_thresholds
+
+def save_collision_thresholds(thresholds, filename=collision_calibration):
+    """Save crossover counts of the collision methods, which are used by
+    check_collision from then on. See get_collision_thresholds.
+
+    thresholds - crossover counts, with gpu and spatial keys
+    filename - file to save to
+
+    parameters: dict, str
+    """
+
+    global collision_thresholds
+
+    with open(filename, "w") as file:
+        dump(thresholds, file, indent=4)
+
+    collision_thresholds = dict(thresholds)
+
 def rotate_point(point, center, degrees, precision=2):
     """Rotate a Point a certain degrees around a center. This just changes the
     Point's properties and returns the changed x and y values.
@@ -0,0 +1,440 @@
+"""Micro-benchmarks of the geometry module. Each function is timed against a
+growing number of objects:
+
+    get_closest - closest of many Points, with both ways of measuring
+    are_polygons_intersecting - one polygon against many
+    is_point_in_polygon - many Points in one polygon, with and without
+                          shapely
+    check_collision - one sprite against a sprite list, with every method
+
+The time of a call is the best of several rounds, each of as many calls as
+fit in about a fifth of a second, so fast functions are timed as well as
+slow ones.
+
+Which method of checking collisions is fastest depends a lot on the machine,
+mostly on its GPU. Calibrating finds the sprite counts where the spatial hash
+and the GPU become faster than checking sprites one by one, and saves them
+for check_collision to use when selecting a method automatically:
+
+    python geometry_benchmark.py --calibrate
+
+The results are written as JSON like the other benchmarks, so two runs can be
+compared to catch regressions:
+
+    python geometry_benchmark.py --output before.json
+    python geometry_benchmark.py --output after.json --compare before.json
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from importlib.util import find_spec
+from itertools import cycle
+from json import dump, load
+from math import cos, pi, sin
+from platform import platform, python_version
+from random import Random
+from timeit import Timer
+
+current = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.append(current)
+
+from benchmarking import get_commit, use_software_rendering
+from constants import WINDOW_HEIGHT, WINDOW_WIDTH
+from file import collision_calibration, soldier
+
+GEOMETRY_SIZES = (10, 100, 500, 1000, 2000, 5000, 10000) # Objects checked
+GEOMETRY_ROUNDS = 5 # Rounds timed for each call, the best is kept
+GEOMETRY_QUERIES = 64 # Positions queried in turn
+GEOMETRY_SEED = 1
+
+POLYGON_SIDES = 8 # Sides of the polygons checked
+POLYGON_RADIUS = 10
+
+# Methods of check_collision, by their number
+COLLISION_METHODS = {
+    "auto" : 0,
+    "spatial" : 1,
+    "gpu" : 2,
+    "simple" : 3,
+}
+
+REGRESSION_THRESHOLD = 0.1 # Relative slowdown reported as a regression
+
+
+def time_call(function, rounds=GEOMETRY_ROUNDS):
+    """Time a call of a function. It is called enough times to take about a
+    fifth of a second per round, and the best round is kept.
+
+    function - function to time, called without arguments
+    rounds - number of rounds
+
+    parameters: function, int
+    returns: float (seconds per call)
+    """
+
+    timer = Timer(function)
+
+    number, _ = timer.autorange()
+
+    return min(timer.repeat(rounds, number)) / number
+
+def make_polygon(x, y, sides=POLYGON_SIDES, radius=POLYGON_RADIUS):
+    """Make a regular polygon around a position.
+
+    x - x position of the center
+    y - y position of the center
+    sides - number of sides
+    radius - distance of every corner from the center
+
+    parameters: float, float, int, float
+    returns: tuple (of (x, y) tuples)
+    """
+
+    return tuple((x + radius * cos(2 * pi * side / sides),
+                  y + radius * sin(2 * pi * side / sides))
+                 for side in range(sides))
+
+def make_positions(count, random):
+    """Make random positions over the battlefield.
+
+    count - number of positions
+    random - random number generator
+
+    parameters: int, Random
+    returns: list (of (x, y) tuples)
+    """
+
+    return [(random.uniform(0, WINDOW_WIDTH), random.uniform(0, WINDOW_HEIGHT))
+            for _ in range(count)]
+
+def make_sprites(count, random, spatial_hash=False):
+    """Make a sprite list of soldiers at random positions.
+
+    count - number of sprites
+    random - random number generator
+    spatial_hash - whether the list has a spatial hash
+
+    parameters: int, Random, bool
+    returns: SpriteList
+    """
+
+    from arcade import Sprite, SpriteList
+
+    sprites = SpriteList(use_spatial_hash=spatial_hash)
+
+    for x, y in make_positions(count, random):
+        sprites.append(Sprite(soldier["player_light_infantry"],
+                              center_x=x, center_y=y))
+
+    return sprites
+
+def run_size(count, rounds=GEOMETRY_ROUNDS, seed=GEOMETRY_SEED):
+    """Time every function against a number of objects. The geometry module
+    must be loaded in a process with a window, for the GPU.
+
+    count - number of objects
+    rounds - rounds timed for each call
+    seed - seed of the positions
+
+    parameters: int, int, int
+    returns: list (of dicts)
+    """
+
+    from geometry import (Point, are_polygons_intersecting, check_collision,
+                          get_closest, is_point_in_polygon)
+
+    random = Random(seed)
+
+    queries = make_positions(GEOMETRY_QUERIES, random)
+
+    results = []
+
+    def add(function, variant, call):
+        results.append({
+            "function" : function,
+            "variant" : variant,
+            "count" : count,
+            "time" : time_call(call, rounds),
+        })
+
+    points = [Point(x, y) for x, y in make_positions(count, random)]
+    origins = cycle([Point(x, y) for x, y in queries])
+
+    add("get_closest", "get_distance",
+        lambda: get_closest(next(origins), points))
+    add("get_closest", "get_distance_",
+        lambda: get_closest(next(origins), points, regular=False))
+
+    polygons = [make_polygon(x, y) for x, y in make_positions(count, random)]
+    others = cycle([make_polygon(x, y) for x, y in queries])
+
+    def intersect():
+        polygon = next(others)
+
+        return [other for other in polygons
+                if are_polygons_intersecting(polygon, other)]
+
+    add("are_polygons_intersecting", "python", intersect)
+
+    polygon = make_polygon(WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2,
+                           radius=WINDOW_HEIGHT / 2)
+
+    variants = {"python" : False}
+
+    if find_spec("shapely"):
+        variants["shapely"] = True
+
+    for variant, shapely in variants.items():
+        add("is_point_in_polygon", variant,
+            lambda: [point for point in points
+                     if is_point_in_polygon(point, polygon, shapely)])
+
+    plain = make_sprites(count, random)
+    hashed = make_sprites(count, random, spatial_hash=True)
+
+    # The GPU reads the positions of every sprite from its buffers
+    plain.initialize()
+    hashed.initialize()
+
+    sprites = cycle(make_sprites(GEOMETRY_QUERIES, random))
+
+    for variant, method in COLLISION_METHODS.items():
+        checked = hashed if variant in ("auto", "spatial") else plain
+
+        add("check_collision", variant,
+            lambda: check_collision(next(sprites), checked, method=method))
+
+    return results
+
+def run_suite(sizes=GEOMETRY_SIZES, rounds=GEOMETRY_ROUNDS, headless=True,
+              software=False, report=None):
+    """Time every function against every number of objects.
+
+    sizes - numbers of objects
+    rounds - rounds timed for each call
+    headless - open the window offscreen without a display, through EGL
+    software - render OpenGL in software instead of on the GPU, which is
+               wrong for calibrating
+    report - called with the results of each size as they finish
+
+    parameters: iterable, int, bool, bool, function
+    returns: dict (the metadata of the run and its results)
+    """
+
+    if software:
+        use_software_rendering()
+
+    import pyglet
+
+    if headless:
+        pyglet.options["headless"] = True
+
+    import arcade
+
+    window = arcade.Window(WINDOW_WIDTH, WINDOW_HEIGHT, visible=False)
+
+    results = []
+
+    for count in sizes:
+        size = run_size(count, rounds)
+
+        results.extend(size)
+
+        if report:
+            report(size)
+
+    renderer = window.ctx.info.RENDERER
+
+    window.close()
+
+    return {
+        "commit" : get_commit(),
+        "date" : datetime.now(timezone.utc).isoformat(),
+        "python" : python_version(),
+        "platform" : platform(),
+        "cpus" : os.cpu_count(),
+        "renderer" : renderer,
+        "software" : software,
+        "rounds" : rounds,
+        "results" : results,
+    }
+
+def get_crossover(results, variant, baseline="simple"):
+    """Get the number of sprites above which a method of checking collisions
+    is faster than another. Between two sizes measured, the crossover is
+    interpolated from how much faster each one was.
+
+    results - results of a run
+    variant - method that is faster with more sprites
+    baseline - method that is faster with fewer sprites
+
+    parameters: dict, str, str
+    returns: int or None (if the method was slower at the largest size)
+    """
+
+    times = {}
+
+    for result in results["results"]:
+        if result["function"] == "check_collision":
+            times.setdefault(result["count"], {})[result["variant"]] = \
+                result["time"]
+
+    counts = sorted(times)
+
+    # How much slower the method is than the baseline at each size
+    slower = [times[count][variant] - times[count][baseline]
+              for count in counts]
+
+    # Noise can make the method faster at a single small size, so the
+    # crossover is after the last size it was slower at
+    last = max((index for index, difference in enumerate(slower)
+                if difference > 0), default=None)
+
+    if last is None:
+        return 0
+    if last == len(counts) - 1:
+        return None
+
+    before, after = counts[last], counts[last + 1]
+    share = slower[last] / (slower[last] - slower[last + 1])
+
+    return round(before + (after - before) * share)
+
+def calibrate(results, filename=collision_calibration):
+    """Save the crossover counts of the methods of checking collisions, for
+    check_collision to select methods by from then on.
+
+    results - results of a run, with every method timed
+    filename - file to save to
+
+    parameters: dict, str
+    returns: dict (the crossover counts saved)
+    """
+
+    from geometry import save_collision_thresholds
+
+    thresholds = {
+        "gpu" : get_crossover(results, "gpu"),
+        "spatial" : get_crossover(results, "spatial"),
+        "commit" : results["commit"],
+        "date" : results["date"],
+        "renderer" : results["renderer"],
+    }
+
+    save_collision_thresholds(thresholds, filename)
+
+    return thresholds
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Find the calls that got slower since a baseline run.
+
+    results - results of this run
+    baseline - results of an earlier run
+    threshold - relative increase reported as a regression
+
+    parameters: dict, dict, float
+    returns: list (of (function, variant, count, before, after) tuples)
+    """
+
+    before = {(result["function"], result["variant"], result["count"]) :
+              result["time"] for result in baseline["results"]}
+
+    regressions = []
+
+    for result in results["results"]:
+        key = (result["function"], result["variant"], result["count"])
+        old = before.get(key)
+
+        if old and result["time"] > old * (1 + threshold):
+            regressions.append((*key, old, result["time"]))
+
+    return regressions
+
+def format_size(results):
+    """Format the results of a size as lines of text.
+
+    results - results of every call at the size
+
+    parameters: list
+    returns: str
+    """
+
+    return "\n".join(f"{result['count']:>6} {result['function']:<26} "
+                     f"{result['variant']:<14} "
+                     f"{result['time'] * 1e6:12.2f} us"
+                     for result in results)
+
+def main(arguments=None):
+    """Run the geometry benchmark from the command line.
+
+    arguments - command line arguments. If None, sys.argv is used.
+
+    parameters: list
+    returns: bool (whether no regressions were found)
+    """
+
+    parser = ArgumentParser(description="Benchmark the geometry module.")
+
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=GEOMETRY_SIZES,
+                        help="numbers of objects to check")
+    parser.add_argument("--rounds", type=int, default=GEOMETRY_ROUNDS,
+                        help="rounds timed for each call")
+    parser.add_argument("--display", action="store_true",
+                        help="open a hidden window on the display")
+    parser.add_argument("--software", action="store_true",
+                        help="render OpenGL in software")
+    parser.add_argument("--calibrate", nargs="?", const=collision_calibration,
+                        default=None,
+                        help="save the collision crossovers to this file")
+    parser.add_argument("--output", default=None,
+                        help="JSON file to write the results to")
+    parser.add_argument("--compare", default=None,
+                        help="JSON results of an earlier run to compare to")
+    parser.add_argument("--threshold", type=float,
+                        default=REGRESSION_THRESHOLD,
+                        help="relative slowdown reported as a regression")
+
+    arguments = parser.parse_args(arguments)
+
+    if arguments.calibrate and arguments.software:
+        parser.error("calibrating needs the GPU the game will run on")
+
+    results = run_suite(arguments.sizes, arguments.rounds,
+                        not arguments.display, arguments.software,
+                        report=lambda size: print(format_size(size)))
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            dump(results, file, indent=4)
+
+    if arguments.calibrate:
+        thresholds = calibrate(results, arguments.calibrate)
+
+        print(f"Calibrated: GPU above {thresholds['gpu']} sprites, spatial "
+              f"hash from {thresholds['spatial']} sprites "
+              f"({thresholds['renderer']})")
+
+    if not arguments.compare:
+        return True
+
+    with open(arguments.compare) as file:
+        baseline = load(file)
+
+    regressions = compare(results, baseline, arguments.threshold)
+
+    for function, variant, count, before, after in regressions:
+        print(f"Regression: {count} {function} {variant} "
+              f"{before:.6g} -> {after:.6g} (+{after / before - 1:.0%})")
+
+    if not regressions:
+        print(f"No regressions against {baseline.get('commit')}")
+
+    return not regressions
+
+
+if __name__ == "__main__":
+    sys.exit(not main())
@@ -282,6 +282,8 @@ MOTION_NEXT_PAGE = 65366
 MOTION_PREVIOUS_PAGE = 65365
 MOTION_BEGINNING_OF_FILE = 5
 MOTION_END_OF_FILE = 6
+MOTION_COPY = 7
+MOTION_PASTE = 8
 MOTION_BACKSPACE = 65288
 MOTION_DELETE = 65535
 NUMLOCK = 65407
@@ -241,16 +241,36 @@ class Object(Sprite):
 
 class PhysicsObject(Sprite):
 
-    def __init__(self, image, scaling=1.0, mass=1):
+    def __init__(self, image, scaling=1.0, mass=1, type=0, world=None,
+                 attach=True):
+        """Initiate a sprite backed by a pymunk body and shape.
+
+        image - filename of the sprite image
+        scaling - scaling of the sprite
+        mass - mass of the shape, from which the body mass is computed
+        type - collision type of the shape
+        world - object owning the pymunk space, the sprite lists, the list
+                of moved objects and the random number generator, usually a
+                BattleSimulation. Defaults to the current window.
+        attach - add the body and shape to the space right away. Objects
+                 that are recycled are created detached and attached when
+                 used. Defaults to True.
+        """
+
         Sprite.__init__(self, filename=image, scale=scaling)
 
         self.body = Body()
         self.shape = Poly(self.body, self.hit_box)
 
+        self.shape.mass = mass
+        self.shape.collision_type = type
+        self.shape.object = self # Reached from collision handlers
+
         self.x = 0
         self.y = 0
 
         self.stopped = False
+        self.pending = False # Position waiting to be committed
 
         # Destination point is where we are going
         self._destination_point = None
@@ -262,9 +282,12 @@ class PhysicsObject(Sprite):
         self.move_angle = 0
 
         self.frames = 0
-        self.window = get_window()
+        self.world = world or get_window()
+
+        self.attached = False
 
-        self.window.space.add(self.body, self.shape)
+        if attach:
+            self.attach()
 
     def _get_x(self):
         return self._position[0]
@@ -295,6 +318,85 @@ class PhysicsObject(Sprite):
     x = property(_get_x, _set_x)
     y = property(_get_y, _set_y)
 
+    def set_position(self, x, y):
+        """Move the sprite to a new position, deferring the spatial hash and
+        sprite list updates. Setting x and y separately updates both twice,
+        which is slow for objects moving every frame. The move is committed
+        once by commit_position, which the world does for every moved object
+        in its per-tick flush.
+
+        x - new x position
+        y - new y position
+
+        parameters: float, float
+        """
+
+        if x == self._position[0] and y == self._position[1]:
+            return
+
+        self._point_list_cache = None
+        self._position = (x, y)
+
+        if not self.pending:
+            self.pending = True
+            self.world.moved.append(self)
+
+    def commit_position(self):
+        """Update the spatial hashes and sprite list buffers with a position
+        set by set_position. This is done by the world's flush, so you should
+        not need to call it directly.
+        """
+
+        self.pending = False
+
+        self.clear_spatial_hashes()
+        self.add_spatial_hashes()
+
+        for sprite_list in self.sprite_lists:
+            sprite_list.update_location(self)
+
+    def render_at(self, x, y):
+        """Draw the sprite at a position without moving it. Only the buffers
+        of its sprite lists are changed, which is used to interpolate between
+        simulation ticks. The next committed move overwrites it.
+
+        x - x position to draw at
+        y - y position to draw at
+
+        parameters: float, float
+        """
+
+        position = self._position
+        self._position = (x, y)
+
+        for sprite_list in self.sprite_lists:
+            sprite_list.update_location(self)
+
+        self._position = position
+
+    def attach(self):
+        """Add the body and shape to the world's space, if not already. The
+        body is moved to the sprite first, as the space caches a pair for
+        every two shapes that overlap, and shapes all added at the origin
+        cost it memory growing with the square of their number.
+        """
+
+        if not self.attached:
+            self.body.position = self.position
+
+            self.world.space.add(self.body, self.shape)
+            self.attached = True
+
+    def detach(self):
+        """Remove the body and shape from the world's space, so the object
+        no longer costs anything in the physics step. Removing during a step
+        is deferred by pymunk until the step is done.
+        """
+
+        if self.attached:
+            self.world.space.remove(self.body, self.shape)
+            self.attached = False
+
     def remove(self):
         self.remove_from_sprite_lists()
     
@@ -316,8 +418,7 @@ class PhysicsObject(Sprite):
         self.angle = -angle
     
     def follow(self, object, rate=65, speed=2):
-        self.x += self.change_x
-        self.y += self.change_y
+        self.set_position(self.x + self.change_x, self.y + self.change_y)
 
         if not rate and not self.moved:
             start_x = self.x
@@ -344,7 +445,7 @@ class PhysicsObject(Sprite):
 
         # Random 1 in rate chance that we'll change from our old direction and
         # then re-aim toward the player
-        if not randrange(rate):
+        if not self.world.rng.randrange(rate):
             start_x = self.x
             start_y = self.y
 
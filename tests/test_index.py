@@ -0,0 +1,57 @@
+"""Tests of the nearest-rival index."""
+
+import os
+import sys
+
+from numpy import allclose, sqrt
+from numpy.random import default_rng
+
+current = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.append(os.path.join(os.path.dirname(current), "battlefield"))
+
+from index import nearest
+
+
+def brute_force(qx, qy, tx, ty):
+    """Get the distance from every query to its nearest target by checking
+    every pair.
+    """
+
+    return sqrt((qx[:, None] - tx) ** 2 + (qy[:, None] - ty) ** 2).min(axis=1)
+
+def test_one_far_target():
+    """A single target in a corner, far from the queries, is found quickly
+    instead of through hundreds of tiny rings.
+    """
+
+    random = default_rng(1)
+
+    qx = random.uniform(0, 1300, 1000)
+    qy = random.uniform(0, 900, 1000)
+
+    tx = random.uniform(0, 1, 1) + 5
+    ty = random.uniform(0, 1, 1) + 5
+
+    found, distance = nearest(qx, qy, tx, ty)
+
+    assert (found == 0).all()
+    assert allclose(distance, brute_force(qx, qy, tx, ty))
+
+def test_bunched_targets():
+    """Targets packed in a corner, more than are checked directly, are found
+    through the grid.
+    """
+
+    random = default_rng(2)
+
+    qx = random.uniform(0, 1300, 2000)
+    qy = random.uniform(0, 900, 2000)
+
+    tx = random.uniform(0, 3, 200) + 1200
+    ty = random.uniform(0, 3, 200) + 800
+
+    found, distance = nearest(qx, qy, tx, ty)
+
+    assert (found >= 0).all()
+    assert allclose(distance, brute_force(qx, qy, tx, ty))
@@ -0,0 +1,54 @@
+"""Tests of the headless battle simulation."""
+
+import os
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.append(os.path.join(os.path.dirname(current), "battlefield"))
+
+from simulation import BattleSimulation
+
+
+def get_drawn(soldier):
+    """Get the position a soldier is drawn at by its first sprite list.
+
+    soldier - soldier to check
+
+    parameters: Soldier
+    returns: tuple (x, y)
+    """
+
+    sprite_list = soldier.sprite_lists[0]
+    slot = sprite_list.sprite_slot[soldier]
+
+    return tuple(sprite_list._sprite_pos_data[slot * 2:slot * 2 + 2])
+
+def test_stopped_soldier_is_drawn_where_it_stopped():
+    """A soldier drawn part of the way along its last move is drawn at its
+    position once it stops, instead of staying short of it.
+    """
+
+    simulation = BattleSimulation(seed=1)
+    store = simulation.store
+    soldier = store.soldiers[0]
+
+    x, y = soldier.position
+
+    # The soldier moves during a tick and a frame is drawn halfway through
+    simulation.previous_x = store.x[:store.count].copy()
+    simulation.previous_y = store.y[:store.count].copy()
+
+    soldier.set_position(x + 10, y)
+    simulation.flush_positions()
+    simulation.interpolate(0.5)
+
+    assert get_drawn(soldier) == (x + 5, y)
+
+    # The next tick it stands still
+    simulation.previous_x = store.x[:store.count].copy()
+    simulation.previous_y = store.y[:store.count].copy()
+
+    simulation.interpolate(0.5)
+
+    assert get_drawn(soldier) == (x + 10, y)
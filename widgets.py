@@ -76,23 +76,36 @@ from key import (ALT, CONTROL, ENTER, KEY_LEFT, KEY_RIGHT, MOTION_BACKSPACE,
 
 MAX = 2 ** 32
 
-enable_timings()
-
-clipboard = Tk()
-clipboard.withdraw()
+clipboard = None # Hidden Tk window holding the clipboard, opened when used
 
 _widgets = SpriteList()
 batch = Batch()
 widgets_list = SpriteList()
 
 
+def get_clipboard():
+    """Get the hidden Tk window holding the clipboard. It is only opened the
+    first time the clipboard is used, so widgets can be created without a
+    display, like in a headless benchmark.
+
+    returns: Tk
+    """
+
+    global clipboard
+
+    if clipboard is None:
+        clipboard = Tk()
+        clipboard.withdraw()
+
+    return clipboard
+
 def clipboard_get():
     """Get some text from the clipboard.
 
     returns: str
     """
 
-    return clipboard.clipboard_get()
+    return get_clipboard().clipboard_get()
 
 def clipboard_append(text):
     """Append some text to the clipboard.
@@ -102,7 +115,7 @@ def clipboard_append(text):
     parameters: str
     """
 
-    clipboard.clipboard_append(text)
+    get_clipboard().clipboard_append(text)
 
 def insert(index, text, add):
     """Insert some text to a string given an index. This was originally used for
@@ -1933,6 +1946,8 @@ class Label(Widget):
 
         With no other widgets, you can draw 10,000 or more labels before the
         fps drops below 60.
+
+        Run widgets_benchmark.py to measure these on your own machine.
         """
 
         self.length = len(self.text)
@@ -4825,6 +4840,10 @@ class MyWindow(Window):
 
 
 if __name__ == "__main__":
+    # Timings hook every event of every window, so they are only enabled for
+    # the fps shown by this example
+    enable_timings()
+
     window = MyWindow(" ", 500, 400)
 
     from pyglet.app import run
@@ -0,0 +1,406 @@
+"""Benchmark of the widget toolkit. Hundreds to tens of thousands of Labels,
+Buttons, Entries and Toggles are created in a hidden window, and for each
+kind this times:
+
+    draw - drawing the container with all of its widgets
+    motion - dispatching one mouse motion event to every widget
+    text - relaying out the text of a Label when it changes
+
+The window is drawn to offscreen with OpenGL rendered in software by Mesa, so
+the numbers can be compared between machines with and without a GPU, and
+every scenario runs in a fresh process, as widgets are never freed from the
+container.
+
+The results are written as JSON, with the commit they were measured at, so
+two runs can be compared to catch regressions in the toolkit:
+
+    python widgets_benchmark.py --output before.json
+    python widgets_benchmark.py --output after.json --compare before.json
+
+Or from Python:
+
+>>> result = run_scenario(1000, "label")
+>>> result["draw_fps"] # Rendered in software by llvmpipe
+11.8
+"""
+
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from json import dump, load
+from math import ceil, sqrt
+from platform import platform, python_version
+from time import perf_counter
+
+current = os.path.dirname(os.path.realpath(__file__))
+
+sys.path.append(current)
+
+from benchmarking import get_commit, percentile, use_software_rendering
+
+WIDGET_SIZES = (100, 1000, 10000) # Widgets of one kind in a scenario
+WIDGET_KINDS = ("label", "button", "entry", "toggle")
+
+WIDGET_FRAMES = 60 # Frames drawn in each scenario
+WIDGET_EVENTS = 200 # Mouse motion events dispatched in each scenario
+WIDGET_WARMUP = 5 # Frames drawn and updated before timing starts
+
+# Label texts changed in each scenario, going through the labels in turn
+WIDGET_TEXT_UPDATES = 2000
+
+WIDGET_WINDOW_WIDTH = 1280
+WIDGET_WINDOW_HEIGHT = 720
+
+# Metrics compared between runs, all of which are worse when higher
+COMPARED = ("draw_p50", "draw_p99", "motion_p50", "motion_p99",
+            "text_update")
+
+REGRESSION_THRESHOLD = 0.1 # Relative slowdown reported as a regression
+
+
+def make_widget(kind, index, x, y):
+    """Make a widget of a kind benchmarked. The widgets module must have been
+    imported first, which needs a window.
+
+    kind - kind of the widget, one of WIDGET_KINDS
+    index - number of the widget, shown in its text
+    x - x position of the widget
+    y - y position of the widget
+
+    parameters: str, int, int, int
+    returns: Widget
+    """
+
+    from widgets import Button, Entry, Label, Toggle
+
+    if kind == "label":
+        return Label(f"Label {index}", x, y)
+    if kind == "button":
+        return Button(f"Button {index}", x, y)
+    if kind == "entry":
+        return Entry(x, y, f"Entry {index}")
+    if kind == "toggle":
+        return Toggle(f"Toggle {index}", x, y)
+
+    raise ValueError(f"Unknown widget kind \"{kind}\"")
+
+def make_positions(count, width, height):
+    """Make the positions of widgets laid out in an even grid over a window.
+    With many widgets, neighbours overlap.
+
+    count - number of widgets
+    width - width of the window
+    height - height of the window
+
+    parameters: int, int, int
+    returns: list (of (x, y) tuples)
+    """
+
+    columns = max(ceil(sqrt(count * width / height)), 1)
+    rows = max(ceil(count / columns), 1)
+
+    return [((index % columns + 0.5) * width / columns,
+             (index // columns + 0.5) * height / rows)
+            for index in range(count)]
+
+def run_scenario(count, kind, frames=WIDGET_FRAMES, events=WIDGET_EVENTS,
+                 warmup=WIDGET_WARMUP, updates=WIDGET_TEXT_UPDATES,
+                 headless=True, software=True):
+    """Create widgets and time drawing them, dispatching mouse motion to
+    them and changing the text of Labels. This is the work done by the
+    process of each scenario.
+
+    count - number of widgets
+    kind - kind of the widgets, one of WIDGET_KINDS
+    frames - number of frames drawn and timed
+    events - number of mouse motion events dispatched and timed
+    warmup - number of frames drawn and updated before timing starts
+    updates - number of Label texts changed and timed, only for Labels
+    headless - draw offscreen without a display, through EGL
+    software - render OpenGL in software instead of on the GPU
+
+    parameters: int, str, int, int, int, int, bool, bool
+    returns: dict
+    """
+
+    if software:
+        use_software_rendering()
+
+    import pyglet
+
+    if headless:
+        pyglet.options["headless"] = True
+
+    import arcade
+    from pyglet.event import EventDispatcher
+
+    window = arcade.Window(WIDGET_WINDOW_WIDTH, WIDGET_WINDOW_HEIGHT,
+                           visible=False)
+
+    # Loaded only once the window exists, as its sprite lists need one
+    from widgets import Label, container
+
+    # Widgets add themselves to the container, which needs the window
+    container.window = window
+
+    # Outside of the event loop, the window queues events instead of
+    # dispatching them, so they are dispatched to the handlers directly
+    def dispatch(*event):
+        EventDispatcher.dispatch_event(window, *event)
+
+    positions = make_positions(count, window.width, window.height)
+
+    start = perf_counter()
+
+    widgets = [make_widget(kind, index, x, y)
+               for index, (x, y) in enumerate(positions)]
+
+    create = perf_counter() - start
+
+    for frame in range(warmup):
+        dispatch("on_update", 1 / 60)
+
+        window.clear()
+        container.draw()
+
+    window.ctx.finish()
+
+    draws = []
+
+    for frame in range(frames):
+        start = perf_counter()
+
+        window.clear()
+        container.draw()
+
+        # Wait for the GPU so the time covers the drawing itself
+        window.ctx.finish()
+
+        draws.append(perf_counter() - start)
+
+    motions = []
+
+    for event in range(events):
+        # Sweep the pointer across the window, so widgets enter and leave
+        # their hover state like under a real mouse
+        x = (event + 0.5) * window.width / events
+        y = window.height / 2
+
+        start = perf_counter()
+
+        dispatch("on_mouse_motion", x, y, window.width / events, 0)
+
+        motions.append(perf_counter() - start)
+
+    text_update = 0
+
+    labels = [widget for widget in widgets if isinstance(widget, Label)]
+
+    if labels and updates:
+        start = perf_counter()
+
+        # The text property skips most changes by its update rate, so the
+        # relayout it does when it does not is forced here
+        for update in range(updates):
+            labels[update % len(labels)].force_text(f"Updated {update}")
+
+        text_update = (perf_counter() - start) / updates
+
+    renderer = window.ctx.info.RENDERER
+
+    window.close()
+
+    draws.sort()
+    motions.sort()
+
+    draw_mean = sum(draws) / len(draws) if draws else 0
+
+    return {
+        "widgets" : count,
+        "kind" : kind,
+        "renderer" : renderer,
+        "create" : create / max(count, 1),
+        "draw_mean" : draw_mean,
+        "draw_p50" : percentile(draws, 0.5),
+        "draw_p99" : percentile(draws, 0.99),
+        "draw_fps" : 1 / draw_mean if draw_mean else 0,
+        "motion_p50" : percentile(motions, 0.5),
+        "motion_p99" : percentile(motions, 0.99),
+        "motion_per_widget" : percentile(motions, 0.5) / max(count, 1),
+        "text_update" : text_update,
+        "text_updates_per_second" : 1 / text_update if text_update else 0,
+    }
+
+def run_suite(sizes=WIDGET_SIZES, kinds=WIDGET_KINDS, frames=WIDGET_FRAMES,
+              events=WIDGET_EVENTS, warmup=WIDGET_WARMUP,
+              updates=WIDGET_TEXT_UPDATES, headless=True, software=True,
+              report=None):
+    """Run every scenario, one at a time, each in a process of its own.
+
+    sizes - numbers of widgets to create
+    kinds - kinds of widgets to create
+    frames - number of frames drawn in each scenario
+    events - number of mouse motion events dispatched in each scenario
+    warmup - number of frames drawn before timing starts
+    updates - number of Label texts changed in each Label scenario
+    headless - draw offscreen without a display
+    software - render OpenGL in software
+    report - called with the result of each scenario as it finishes
+
+    parameters: iterable, iterable, int, int, int, int, bool, bool, function
+    returns: dict (the metadata of the run and its scenarios)
+    """
+
+    results = []
+
+    for count in sizes:
+        for kind in kinds:
+            # The container keeps every widget ever made, so a new process
+            # per scenario starts it empty
+            with ProcessPoolExecutor(1) as executor:
+                result = executor.submit(run_scenario, count, kind, frames,
+                                         events, warmup, updates, headless,
+                                         software).result()
+
+            results.append(result)
+
+            if report:
+                report(result)
+
+    return {
+        "commit" : get_commit(),
+        "date" : datetime.now(timezone.utc).isoformat(),
+        "python" : python_version(),
+        "platform" : platform(),
+        "cpus" : os.cpu_count(),
+        "software" : software,
+        "frames" : frames,
+        "events" : events,
+        "scenarios" : results,
+    }
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Find the scenarios that got slower since a baseline run.
+
+    results - results of this run
+    baseline - results of an earlier run
+    threshold - relative increase reported as a regression
+
+    parameters: dict, dict, float
+    returns: list (of (widgets, kind, metric, before, after) tuples)
+    """
+
+    before = {(scenario["widgets"], scenario["kind"]) : scenario
+              for scenario in baseline["scenarios"]}
+
+    regressions = []
+
+    for scenario in results["scenarios"]:
+        old = before.get((scenario["widgets"], scenario["kind"]))
+
+        if not old:
+            continue
+
+        for metric in COMPARED:
+            if old[metric] and \
+               scenario[metric] > old[metric] * (1 + threshold):
+                regressions.append((scenario["widgets"], scenario["kind"],
+                                    metric, old[metric], scenario[metric]))
+
+    return regressions
+
+def format_scenario(result):
+    """Format the result of a scenario as a line of text.
+
+    result - result of the scenario
+
+    parameters: dict
+    returns: str
+    """
+
+    text = ""
+
+    if result["text_update"]:
+        text = (f" text {result['text_update'] * 1e6:8.1f} us "
+                f"({result['text_updates_per_second']:.0f}/s)")
+
+    return (f"{result['widgets']:>6} {result['kind']:<7} "
+            f"draw p50 {result['draw_p50'] * 1000:8.2f} ms "
+            f"p99 {result['draw_p99'] * 1000:8.2f} ms "
+            f"({result['draw_fps']:7.1f} fps) "
+            f"motion p50 {result['motion_p50'] * 1000:7.3f} ms "
+            f"p99 {result['motion_p99'] * 1000:7.3f} ms{text}")
+
+def main(arguments=None):
+    """Run the widget benchmark from the command line.
+
+    arguments - command line arguments. If None, sys.argv is used.
+
+    parameters: list
+    returns: bool (whether no regressions were found)
+    """
+
+    parser = ArgumentParser(description="Benchmark the widget toolkit.")
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=WIDGET_SIZES,
+                        help="numbers of widgets to create")
+    parser.add_argument("--kinds", nargs="+", default=WIDGET_KINDS,
+                        choices=WIDGET_KINDS, help="widgets to create")
+    parser.add_argument("--frames", type=int, default=WIDGET_FRAMES,
+                        help="frames drawn in each scenario")
+    parser.add_argument("--events", type=int, default=WIDGET_EVENTS,
+                        help="mouse motion events dispatched per scenario")
+    parser.add_argument("--warmup", type=int, default=WIDGET_WARMUP,
+                        help="frames drawn before timing starts")
+    parser.add_argument("--updates", type=int, default=WIDGET_TEXT_UPDATES,
+                        help="Label texts changed per scenario")
+    parser.add_argument("--display", action="store_true",
+                        help="draw to a hidden window on the display")
+    parser.add_argument("--hardware", action="store_true",
+                        help="render OpenGL on the GPU")
+    parser.add_argument("--output", default=None,
+                        help="JSON file to write the results to")
+    parser.add_argument("--compare", default=None,
+                        help="JSON results of an earlier run to compare to")
+    parser.add_argument("--threshold", type=float,
+                        default=REGRESSION_THRESHOLD,
+                        help="relative slowdown reported as a regression")
+
+    arguments = parser.parse_args(arguments)
+
+    results = run_suite(arguments.sizes, arguments.kinds, arguments.frames,
+                        arguments.events, arguments.warmup,
+                        arguments.updates, not arguments.display,
+                        not arguments.hardware,
+                        report=lambda result: print(format_scenario(result)))
+
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            dump(results, file, indent=4)
+
+    if not arguments.compare:
+        return True
+
+    with open(arguments.compare) as file:
+        baseline = load(file)
+
+    if baseline.get("software") != results["software"]:
+        print("Warning: the baseline was rendered "
+              f"{'in software' if baseline.get('software') else 'on the GPU'}")
+
+    regressions = compare(results, baseline, arguments.threshold)
+
+    for count, kind, metric, before, after in regressions:
+        print(f"Regression: {count} {kind} {metric} "
+              f"{before:.6g} -> {after:.6g} (+{after / before - 1:.0%})")
+
+    if not regressions:
+        print(f"No regressions against {baseline.get('commit')}")
+
+    return not regressions
+
+
+if __name__ == "__main__":
+    sys.exit(not main())